@@ -1,4 +1,4 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response, stream_with_context
 from flask_cors import CORS
 import json
 import os
@@ -6,14 +6,46 @@ from datetime import datetime
 from models.dataset_manager import DatasetManager
 from models.annotation_manager import AnnotationManager
 from models.video_download_manager import VideoDownloadManager
+from models.video_streaming import StreamLimiter, build_video_response
+from models.thumbnail_service import ThumbnailService
+from werkzeug.security import safe_join
 
 app = Flask(__name__)
 CORS(app)
 
+# 数据目录、视频目录和缩略图目录，可用环境变量改到仓库之外（基准测试在临时目录中运行）；
+# 视频和缩略图目录为None时使用项目 static 下的 videos、thumbnails
+DATA_DIR = os.environ.get('ANNOTATION_DATA_DIR', 'data')
+VIDEO_DIR = os.environ.get('ANNOTATION_VIDEO_DIR')
+THUMBNAIL_DIR = os.environ.get('ANNOTATION_THUMBNAIL_DIR')
+# 存储后端：'json'（data目录下的JSON文件）或 'sqlite'（data/annotations.db，可用 migrate_storage.py 导入导出）
+STORAGE_BACKEND = 'json'
+# 标注修改由后台线程合并写盘的间隔（秒），0表示每次请求同步写入
+PERSIST_INTERVAL_SECONDS = 1.0
+# 数据集空闲多久（秒）后从内存卸载，None表示加载后常驻内存
+IDLE_DATASET_UNLOAD_SECONDS = None
+
 # 初始化管理器
-dataset_manager = DatasetManager()
+dataset_manager = DatasetManager(DATA_DIR, storage=STORAGE_BACKEND, persist_interval=PERSIST_INTERVAL_SECONDS,
+                                 idle_unload_seconds=IDLE_DATASET_UNLOAD_SECONDS)
 annotation_manager = AnnotationManager()
-video_download_manager = VideoDownloadManager(dataset_manager=dataset_manager)
+# 视频缓存磁盘预算（字节），None表示不限制；例如 50 * 1024 ** 3
+VIDEO_CACHE_BUDGET_BYTES = None
+# 多视角样本是否逐文件并发下载（先下载完的视角先可用），False时下载整个压缩包；
+# 单次下载请求可用 video_info.per_file 覆盖
+HF_PER_FILE_DOWNLOAD = False
+video_download_manager = VideoDownloadManager(
+    base_video_dir=VIDEO_DIR, dataset_manager=dataset_manager, cache_budget_bytes=VIDEO_CACHE_BUDGET_BYTES,
+    per_file_download=HF_PER_FILE_DOWNLOAD
+)
+# 视频文件的浏览器缓存时间（秒），文件重新下载后ETag变化，浏览器会重新验证
+VIDEO_CACHE_MAX_AGE_SECONDS = 24 * 60 * 60
+# 每个客户端同时进行的视频流上限（多视角样本每个视角至少一个）
+MAX_VIDEO_STREAMS_PER_CLIENT = 8
+video_stream_limiter = StreamLimiter(MAX_VIDEO_STREAMS_PER_CLIENT)
+# 缩略图和雪碧图保存在视频目录之外，视频被缓存清理后仍可使用；URL带版本参数，可长期缓存
+thumbnail_service = ThumbnailService(video_download_manager, base_dir=THUMBNAIL_DIR)
+THUMBNAIL_CACHE_MAX_AGE_SECONDS = 30 * 24 * 60 * 60
 
 @app.route('/')
 def index():
@@ -51,21 +83,90 @@ def get_datasets():
     annotator = request.args.get('annotator')
     return jsonify(dataset_manager.get_datasets_for_annotator(annotator))
 
+# 出现任一参数时列表接口返回分页结果 {'items', 'total', 'page', 'page_size'}，否则返回完整列表（兼容旧客户端）
+LIST_QUERY_PARAMS = ('page', 'page_size', 'status', 'review_status', 'min_duration', 'max_duration', 'sort')
+
+def _list_query_args(default_sort):
+    """解析分页/过滤/排序参数，参数非法时抛出 ValueError"""
+    def number(name, cast):
+        value = request.args.get(name)
+        return cast(value) if value not in (None, '') else None
+    return {
+        'annotator': request.args.get('annotator') or None,
+        'page': number('page', int) or 1,
+        'page_size': number('page_size', int),
+        'min_duration': number('min_duration', float),
+        'max_duration': number('max_duration', float),
+        'sort': request.args.get('sort') or default_sort
+    }
+
+def _with_proxy_paths(dataset_id, samples):
+    """为多视角样本附加各视角的代理视频路径（proxy_paths，未生成的视角为null），不修改数据集中的样本"""
+    return [
+        dict(sample, proxy_paths=video_download_manager.get_sample_proxy_paths(dataset_id, sample))
+        if sample.get('type') == 'multiple_videos' else sample
+        for sample in samples
+    ]
+
 @app.route('/api/dataset/<dataset_id>/samples')
 def get_dataset_samples(dataset_id):
-    """获取指定数据集的样本列表"""
+    """获取指定数据集的样本列表（支持 page、page_size、review_status、annotator、min_duration/max_duration、sort）"""
     annotator = request.args.get('annotator')
-    return jsonify(dataset_manager.get_samples_for_dataset(dataset_id, annotator))
+    if not any(name in request.args for name in LIST_QUERY_PARAMS):
+        samples = dataset_manager.get_samples_for_dataset(dataset_id, annotator)
+        return jsonify(_with_proxy_paths(dataset_id, samples))
+    try:
+        args = _list_query_args('status')
+        review_status = request.args.get('review_status') or request.args.get('status') or None
+        result = dataset_manager.query_samples(dataset_id, review_status=review_status, **args)
+        result['items'] = [
+            dict(sample, thumbnail=thumbnail_service.get_sample_thumbnail(dataset_id, sample))
+            for sample in _with_proxy_paths(dataset_id, result['items'])
+        ]
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': f'查询参数无效: {e}'}), 400
 
 @app.route('/api/dataset/<dataset_id>/segments')
 def get_dataset_segments(dataset_id):
-    """获取指定数据集的片段列表"""
-    return jsonify(dataset_manager.get_segments_for_dataset(dataset_id))
+    """获取指定数据集的片段列表（支持 page、page_size、status、annotator、min_duration/max_duration、sort）"""
+    if not any(name in request.args for name in LIST_QUERY_PARAMS + ('annotator',)):
+        return jsonify(dataset_manager.get_segments_for_dataset(dataset_id))
+    try:
+        args = _list_query_args('created')
+        return jsonify(dataset_manager.query_segments(dataset_id, status=request.args.get('status') or None, **args))
+    except ValueError as e:
+        return jsonify({'error': f'查询参数无效: {e}'}), 400
 
 @app.route('/api/sample/<sample_id>/segments')
 def get_sample_segments(sample_id):
-    """获取指定样本的片段列表"""
-    return jsonify(dataset_manager.get_segments_for_sample(sample_id))
+    """获取指定样本的片段列表，附加各视角已生成的片段剪辑（clip_paths，未生成为null）、剪辑在源视频中的实际开始时间
+    （clip_starts）、剪辑对应的片段时间（clip_range）和片段缩略图（thumbnail）；只读取剪辑和缩略图清单，
+    剪辑和缩略图在片段修改、视频下载完成和打开样本（/api/video/open）时由后台任务生成"""
+    segments = dataset_manager.get_segments_for_sample(sample_id)
+    found = dataset_manager.get_sample(sample_id)
+    if found is None:
+        return jsonify(segments)
+    dataset_id, sample = found
+    clips = video_download_manager.get_sample_clips(dataset_id, sample, segments)
+    thumbnails = thumbnail_service.get_segment_thumbnails(dataset_id, sample, segments)
+    return jsonify([
+        dict(segment,
+             clip_paths=clip_paths,
+             clip_starts=clip_starts,
+             clip_range=[segment.get('start_time'), segment.get('end_time')],
+             thumbnail=thumbnail)
+        for segment, (clip_paths, clip_starts), thumbnail in zip(segments, clips, thumbnails)
+    ])
+
+@app.route('/api/sample/<sample_id>/sprites')
+def get_sample_sprites(sample_id):
+    """获取样本各视角的时间轴雪碧图（url 为null时尚未生成，status 为 pending/failed/missing）"""
+    found = dataset_manager.get_sample(sample_id)
+    if found is None:
+        return jsonify({'error': '样本不存在'}), 404
+    dataset_id, sample = found
+    return jsonify(thumbnail_service.get_sample_sprites(dataset_id, sample))
 
 @app.route('/api/segment/<segment_id>/update', methods=['POST'])
 def update_segment(segment_id):
@@ -74,6 +175,24 @@ def update_segment(segment_id):
     success = dataset_manager.update_segment(segment_id, data)
     return jsonify({'success': success})
 
+@app.route('/api/segments/batch_update', methods=['POST'])
+def batch_update_segments():
+    """批量更新片段状态、时间和注释（每个操作单独校验，结果中逐个报告）"""
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': '请求体必须是JSON对象'}), 400
+    operations = data.get('operations', [])
+    if not isinstance(operations, list):
+        return jsonify({'error': 'operations 必须是列表'}), 400
+    if not operations:
+        return jsonify({'error': '缺少更新操作'}), 400
+    
+    results = dataset_manager.update_segments(operations)
+    return jsonify({
+        'success': all(r['success'] for r in results),
+        'results': results
+    })
+
 @app.route('/api/segment/<segment_id>/comment', methods=['POST'])
 def update_segment_comment(segment_id):
     """更新片段注释"""
@@ -97,6 +216,54 @@ def create_segment():
     success = dataset_manager.create_segment(segment_data)
     return jsonify({'success': success, 'segment': segment_data if success else None})
 
+def _segment_item_error(item):
+    """检查批量创建的单个片段的字段类型，返回错误信息（无错误返回None）"""
+    if not isinstance(item, dict):
+        return '片段格式无效'
+    for key in ('id', 'sample_id'):
+        if not isinstance(item.get(key), str) or not item.get(key):
+            return f'{key} 必须为非空字符串'
+    for key in ('start_time', 'end_time'):
+        value = item.get(key)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return f'{key} 必须为数字'
+    return None
+
+@app.route('/api/segments/batch_create', methods=['POST'])
+def batch_create_segments():
+    """批量创建片段（全部校验通过后一次性写入）"""
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': '请求体必须是JSON对象'}), 400
+    items = data.get('segments', [])
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': '缺少片段数据'}), 400
+    errors = []
+    for i, item in enumerate(items):
+        error = _segment_item_error(item)
+        if error:
+            errors.append({'index': i, 'error': error})
+    if errors:
+        return jsonify({'success': False, 'created': 0, 'errors': errors, 'segments': []}), 400
+    
+    segments_data = []
+    for item in items:
+        segment_data = {
+            'id': item.get('id'),
+            'video_path': item.get('video_path'),
+            'start_time': item.get('start_time'),
+            'end_time': item.get('end_time'),
+            'status': item.get('status', '待抉择'),
+            'sample_id': item.get('sample_id')
+        }
+        if item.get('video_paths'):
+            segment_data['video_paths'] = item.get('video_paths')
+        segments_data.append(segment_data)
+    
+    result = dataset_manager.create_segments(segments_data)
+    result['segments'] = segments_data if result['success'] else []
+    return jsonify(result)
+
 @app.route('/api/dataset/<dataset_id>/remove_rejected', methods=['POST'])
 def remove_rejected_segments(dataset_id):
     """删除所有弃用的片段"""
@@ -111,6 +278,28 @@ def select_annotator():
     annotation_manager.set_current_annotator(annotator)
     return jsonify({'success': True, 'annotator': annotator})
 
+@app.route('/static/videos/<path:filename>', methods=['GET', 'HEAD'])
+def serve_video(filename):
+    """视频文件：支持Range请求（206）、ETag/Cache-Control，并限制每个客户端的并发流数量"""
+    path = safe_join(video_download_manager.base_video_dir, filename)
+    parts = filename.split('/')
+    if path is None or any(part.startswith('.') for part in parts) or not os.path.isfile(path):
+        return jsonify({'error': '视频文件不存在'}), 404
+    
+    # <dataset>/<sample>/<文件> 形式的路径记录样本访问，避免正在观看的视频被缓存清理
+    if len(parts) >= 3:
+        video_download_manager.touch_sample(parts[0], parts[1])
+    return build_video_response(path, request, video_stream_limiter, request.remote_addr or '',
+                                VIDEO_CACHE_MAX_AGE_SECONDS)
+
+@app.route('/static/thumbnails/<path:filename>', methods=['GET', 'HEAD'])
+def serve_thumbnail(filename):
+    """缩略图和雪碧图：长期缓存（URL中的版本参数随文件重新生成而变化）"""
+    path = safe_join(thumbnail_service.base_dir, filename)
+    if path is None or any(part.startswith('.') for part in filename.split('/')) or not os.path.isfile(path):
+        return jsonify({'error': '缩略图不存在'}), 404
+    return build_video_response(path, request, max_age=THUMBNAIL_CACHE_MAX_AGE_SECONDS)
+
 @app.route('/api/video/status', methods=['GET'])
 def get_video_status():
     """获取视频状态信息"""
@@ -127,9 +316,34 @@ def get_video_status():
     
     return jsonify({'video_statuses': video_statuses})
 
+@app.route('/api/video/status/batch', methods=['POST'])
+def get_video_status_batch():
+    """批量获取一页样本的视频状态"""
+    data = request.json or {}
+    dataset_name = data.get('dataset')
+    sample_ids = data.get('samples')
+    
+    if not dataset_name or not isinstance(sample_ids, list):
+        return jsonify({'error': '缺少必要参数'}), 400
+    
+    statuses = video_download_manager.get_samples_video_status(dataset_name, sample_ids)
+    return jsonify({'statuses': statuses})
+
+@app.route('/api/video/metadata', methods=['GET'])
+def get_video_metadata():
+    """获取样本已下载视频的元数据（时长、分辨率、帧率、编码、流数量）"""
+    dataset_name = request.args.get('dataset')
+    sample_name = request.args.get('sample')
+    
+    if not dataset_name or not sample_name:
+        return jsonify({'error': '缺少必要参数'}), 400
+    
+    videos = video_download_manager.get_sample_metadata(dataset_name, sample_name)
+    return jsonify({'videos': videos})
+
 @app.route('/api/video/download', methods=['POST'])
 def download_video():
-    """下载视频"""
+    """下载视频（同步等待后台任务完成，兼容旧客户端）"""
     data = request.json
     dataset_name = data.get('dataset')
     sample_name = data.get('sample')
@@ -140,29 +354,146 @@ def download_video():
         return jsonify({'error': '缺少必要参数'}), 400
     
     try:
-        if video_type == 'youtube':
-            # YouTube视频下载
-            youtube_url = video_info.get('youtube_url')
-            video_filename = f"{sample_name}_youtube.mp4"
-            
-            result = video_download_manager.download_youtube_video(
-                youtube_url, dataset_name, sample_name, video_filename
-            )
-            
-        elif video_type in ['single_video', 'multiple_videos']:
-            # HuggingFace视频下载
-            result = video_download_manager.download_huggingface_video(
-                dataset_name, sample_name
-            )
-            
-        else:
-            return jsonify({'error': '不支持的视频类型'}), 400
-        
-        return jsonify(result)
+        job, _ = video_download_manager.submit_download(dataset_name, sample_name, video_type, video_info)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        job.wait()
+        return jsonify(job.result or {'success': False, 'message': job.error or '下载失败'})
         
     except Exception as e:
         return jsonify({'error': f'下载失败: {str(e)}'}), 500
 
+@app.route('/api/video/download/jobs', methods=['POST'])
+def submit_download_job():
+    """提交后台下载任务，立即返回任务ID"""
+    data = request.json or {}
+    dataset_name = data.get('dataset')
+    sample_name = data.get('sample')
+    video_type = data.get('type')
+    video_info = data.get('video_info')
+    
+    if not dataset_name or not sample_name or not video_type:
+        return jsonify({'error': '缺少必要参数'}), 400
+    
+    try:
+        job, created = video_download_manager.submit_download(dataset_name, sample_name, video_type, video_info)
+        return jsonify({'success': True, 'created': created, 'job': job.to_dict()}), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/video/download/jobs', methods=['GET'])
+def list_download_jobs():
+    """列出下载任务"""
+    jobs = video_download_manager.list_download_jobs(
+        request.args.get('dataset'), request.args.get('sample')
+    )
+    return jsonify({'jobs': [job.to_dict() for job in jobs]})
+
+@app.route('/api/video/download/jobs/<job_id>', methods=['GET'])
+def get_download_job(job_id):
+    """获取下载任务状态"""
+    job = video_download_manager.get_download_job(job_id)
+    if not job:
+        return jsonify({'error': '下载任务不存在'}), 404
+    return jsonify({'job': job.to_dict()})
+
+@app.route('/api/video/download/jobs/<job_id>/events')
+def stream_download_job(job_id):
+    """以Server-Sent Events推送下载任务的状态和进度，任务结束后关闭连接"""
+    job = video_download_manager.get_download_job(job_id)
+    if not job:
+        return jsonify({'error': '下载任务不存在'}), 404
+    
+    def generate():
+        version = -1
+        while True:
+            new_version = job.wait_for_change(version, timeout=15)
+            if new_version == version:
+                # 保持连接的心跳
+                yield ': keep-alive\n\n'
+                continue
+            version = new_version
+            yield f"data: {json.dumps(job.to_dict(), ensure_ascii=False)}\n\n"
+            if job.is_finished():
+                break
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/video/download/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_download_job(job_id):
+    """取消下载任务"""
+    success = video_download_manager.cancel_download_job(job_id)
+    return jsonify({'success': success})
+
+@app.route('/api/video/open', methods=['POST'])
+def open_video_sample():
+    """标记样本正在查看，可同时关闭上一个样本；并在后台补齐已下载视角的片段剪辑和片段缩略图"""
+    data = request.json or {}
+    dataset_name = data.get('dataset')
+    sample_name = data.get('sample')
+    
+    if not dataset_name or not sample_name:
+        return jsonify({'error': '缺少必要参数'}), 400
+    
+    previous = data.get('previous')
+    if previous and previous.get('dataset') and previous.get('sample'):
+        video_download_manager.close_sample(previous['dataset'], previous['sample'])
+    video_download_manager.open_sample(dataset_name, sample_name)
+    video_download_manager.schedule_sample_clips(dataset_name, sample_name)
+    thumbnail_service.schedule_segment_thumbnails(dataset_name, sample_name)
+    return jsonify({'success': True})
+
+@app.route('/api/video/close', methods=['POST'])
+def close_video_sample():
+    """取消样本的查看标记"""
+    data = request.json or {}
+    dataset_name = data.get('dataset')
+    sample_name = data.get('sample')
+    
+    if not dataset_name or not sample_name:
+        return jsonify({'error': '缺少必要参数'}), 400
+    
+    video_download_manager.close_sample(dataset_name, sample_name)
+    return jsonify({'success': True})
+
+@app.route('/api/video/prefetch', methods=['POST'])
+def prefetch_videos():
+    """在后台预取标注队列中当前样本之后的样本"""
+    data = request.json or {}
+    dataset_name = data.get('dataset')
+    annotator = data.get('annotator')
+    
+    if not dataset_name:
+        return jsonify({'error': '缺少必要参数'}), 400
+    
+    jobs = video_download_manager.prefetch_samples(
+        dataset_name, annotator, data.get('sample'), data.get('count')
+    )
+    return jsonify({'success': True, 'jobs': [job.to_dict() for job in jobs]})
+
+@app.route('/api/video/cache', methods=['GET'])
+def get_video_cache_stats():
+    """获取视频缓存使用情况"""
+    return jsonify(video_download_manager.get_cache_stats())
+
+@app.route('/api/video/cache', methods=['POST'])
+def update_video_cache():
+    """修改视频缓存磁盘预算并立即清理"""
+    data = request.json or {}
+    budget_bytes = data.get('budget_bytes')
+    if budget_bytes is not None and (not isinstance(budget_bytes, int) or budget_bytes < 0):
+        return jsonify({'error': 'budget_bytes 必须是非负整数或 null'}), 400
+    
+    evicted = video_download_manager.set_cache_budget(budget_bytes)
+    return jsonify({
+        'success': True,
+        'evicted': evicted,
+        **video_download_manager.get_cache_stats()
+    })
+
 @app.route('/api/video/delete', methods=['POST'])
 def delete_video():
     """删除视频文件"""
@@ -231,6 +562,38 @@ def get_statistics():
     except Exception as e:
         return jsonify({'error': f'获取统计数据失败: {str(e)}'}), 500
 
+@app.route('/api/statistics/check', methods=['GET'])
+def check_statistics():
+    """重算统计并与增量计数比较（只读，修复请使用 POST /api/statistics/repair）"""
+    if 'repair' in request.args:
+        return jsonify({'error': '修复统计请使用 POST /api/statistics/repair'}), 400
+    try:
+        return jsonify(dataset_manager.check_statistics_consistency())
+
+    except Exception as e:
+        return jsonify({'error': f'统计一致性检查失败: {str(e)}'}), 500
+
+@app.route('/api/statistics/repair', methods=['POST'])
+def repair_statistics():
+    """重算统计，与增量计数不一致时用重算结果修复"""
+    try:
+        return jsonify(dataset_manager.check_statistics_consistency(repair=True))
+
+    except Exception as e:
+        return jsonify({'error': f'统计修复失败: {str(e)}'}), 500
+
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """增量同步：返回版本号 since 之后修改过的样本和片段（可用 dataset 只看一个数据集）；
+    不带 since 时只返回当前版本号，reset 为 true 时客户端需重新拉取完整列表"""
+    try:
+        since = int(request.args['since']) if request.args.get('since') else None
+        limit = min(max(1, int(request.args.get('limit', 1000))), 1000)
+    except ValueError:
+        return jsonify({'error': 'since/limit 必须为整数'}), 400
+    return jsonify(dataset_manager.get_changes(
+        since, request.args.get('epoch') or None, request.args.get('dataset') or None, limit
+    ))
 
 
 if __name__ == '__main__':
@@ -0,0 +1 @@
+# Benchmarks for dataset manager and API performance
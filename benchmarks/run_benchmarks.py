@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+"""
+DatasetManager 基准测试
+在合成数据（见 benchmarks/synthetic.py）上测量数据集加载、DatasetManager 公开方法和 Flask 接口
+（通过测试客户端）的耗时，结果写入JSON文件，可与之前的结果比较
+
+用法:
+  python benchmarks/run_benchmarks.py
+  python benchmarks/run_benchmarks.py --scales small,medium --storage json,sqlite --output results.json
+  python benchmarks/run_benchmarks.py --scales large --compare baseline.json
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import ANNOTATORS, SCALES, SHAPES, generate, sample_ids, write_json, write_sqlite  # noqa: E402
+from models.dataset_manager import DatasetManager  # noqa: E402
+from models.thumbnail_service import ThumbnailService  # noqa: E402
+from models.video_download_manager import VideoDownloadManager  # noqa: E402
+
+STORAGES = ('json', 'sqlite')
+PAGE_SIZE = 50
+BATCH_SIZE = 50
+# 比较时耗时中位数超过基线的这一倍数视为变慢
+REGRESSION_RATIO = 1.2
+
+
+@contextlib.contextmanager
+def _quiet():
+    """计时期间屏蔽管理器的进度输出"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位为KB，macOS 上为字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+class BenchmarkRecorder:
+    """记录一个 (规模, 存储后端) 组合下各测试项的耗时分布"""
+
+    def __init__(self, scale: str, storage: str, sample_count: int, segment_count: int):
+        self.scale = scale
+        self.storage = storage
+        self.sample_count = sample_count
+        self.segment_count = segment_count
+        self.results: List[Dict] = []
+
+    def measure(self, group: str, name: str, func: Callable[[int], object], iterations: int,
+                check: Optional[Callable[[object], bool]] = None,
+                setup: Optional[Callable[[int], None]] = None, teardown: Optional[Callable[[int], None]] = None):
+        """调用 func(i) iterations 次并记录耗时（setup/teardown 在计时之外执行）；
+        func 抛出异常或 check 返回False的调用计为错误"""
+        durations = []
+        errors = 0
+        gc.collect()
+        with _quiet():
+            for i in range(iterations):
+                if setup is not None:
+                    setup(i)
+                started = time.perf_counter()
+                try:
+                    result = func(i)
+                except Exception:
+                    errors += 1
+                else:
+                    if check is not None and not check(result):
+                        errors += 1
+                durations.append(time.perf_counter() - started)
+                if teardown is not None:
+                    teardown(i)
+
+        durations.sort()
+        entry = {
+            'scale': self.scale,
+            'storage': self.storage,
+            'samples': self.sample_count,
+            'segments': self.segment_count,
+            'group': group,
+            'name': name,
+            'iterations': iterations,
+            'errors': errors,
+            'min_ms': round(durations[0] * 1000, 4),
+            'median_ms': round(_percentile(durations, 0.5) * 1000, 4),
+            'mean_ms': round(sum(durations) / len(durations) * 1000, 4),
+            'p95_ms': round(_percentile(durations, 0.95) * 1000, 4),
+            'max_ms': round(durations[-1] * 1000, 4),
+            'total_s': round(sum(durations), 4),
+        }
+        self.results.append(entry)
+        error_text = f"  ⚠️ {errors} 次失败" if errors else ''
+        print(f"  {group:<8} {name:<52} 中位数 {entry['median_ms']:>10.3f} ms  "
+              f"p95 {entry['p95_ms']:>10.3f} ms  ×{iterations}{error_text}")
+
+
+class SegmentPool:
+    """基准过程中仍存在的片段ID，支持随机选取、取出（用于删除）和新建"""
+
+    def __init__(self, segments: Dict, rng: random.Random):
+        self._ids = [segment['id'] for data in segments.values() for segment in data['segments']]
+        self._rng = rng
+        self._created = 0
+
+    def pick(self) -> str:
+        return self._rng.choice(self._ids)
+
+    def take(self) -> str:
+        position = self._rng.randrange(len(self._ids))
+        self._ids[position], self._ids[-1] = self._ids[-1], self._ids[position]
+        return self._ids.pop()
+
+    def new_segment(self, sample_id: str) -> Dict:
+        """与 /api/segment/create 结构相同的新片段（ID加入池中）"""
+        self._created += 1
+        segment_id = f"bench_new_{self._created:07d}"
+        self._ids.append(segment_id)
+        start_time = round(self._rng.uniform(0, 600), 2)
+        return {
+            'id': segment_id,
+            'video_path': None,
+            'start_time': start_time,
+            'end_time': round(start_time + self._rng.uniform(1, 30), 2),
+            'status': '待抉择',
+            'sample_id': sample_id,
+        }
+
+
+def bench_loading(recorder: BenchmarkRecorder, data_dir: str, storage: str, iterations: int,
+                  dataset_ids: List[str]):
+    """启动加载：无清单（完整解析）、有清单（按需加载）、关闭按需加载，以及按需加载后首次访问各数据集"""
+    manifest_path = os.path.join(data_dir, DatasetManager.MANIFEST_FILENAME)
+
+    def remove_manifest(i):
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+
+    recorder.measure('load', '_load_datasets[cold, no manifest]',
+                     lambda i: DatasetManager(data_dir, storage=storage, persist_interval=0).close(),
+                     iterations, setup=remove_manifest)
+    recorder.measure('load', '_load_datasets[manifest]',
+                     lambda i: DatasetManager(data_dir, storage=storage, persist_interval=0).close(),
+                     iterations)
+    recorder.measure('load', '_load_datasets[eager]',
+                     lambda i: DatasetManager(data_dir, storage=storage, persist_interval=0, lazy_load=False).close(),
+                     iterations)
+
+    holder = {}
+
+    def open_manager(i):
+        holder['manager'] = DatasetManager(data_dir, storage=storage, persist_interval=0)
+
+    def first_access(i):
+        for dataset_id in dataset_ids:
+            holder['manager'].get_samples_for_dataset(dataset_id, None)
+
+    recorder.measure('load', '_ensure_loaded[first access, all datasets]', first_access, iterations,
+                     setup=open_manager, teardown=lambda i: holder.pop('manager').close())
+
+
+def bench_reads(recorder: BenchmarkRecorder, manager: DatasetManager, samples: List, pool: SegmentPool,
+                rng: random.Random, iterations: int, heavy_iterations: int):
+    """只读方法"""
+    dataset_ids = sorted({dataset_id for dataset_id, _ in samples})
+    dataset = lambda i: dataset_ids[i % len(dataset_ids)]
+    annotator = lambda i: ANNOTATORS[i % len(ANNOTATORS)]
+    sample = lambda: rng.choice(samples)[1]
+    is_page = lambda result: isinstance(result, dict) and 'items' in result
+
+    def last_page(dataset_id: str, **filters) -> int:
+        total = manager.query_samples(dataset_id, page=1, page_size=PAGE_SIZE, **filters)['total']
+        return max(1, -(-total // PAGE_SIZE))
+
+    deep_pages = {dataset_id: last_page(dataset_id, review_status='未审阅') for dataset_id in dataset_ids}
+    changes_start = manager.get_changes(None)
+
+    cases = [
+        ('get_datasets_for_annotator', lambda i: manager.get_datasets_for_annotator(annotator(i)), iterations, None),
+        ('get_statistics', lambda i: manager.get_statistics('all'), iterations, None),
+        ('get_statistics[annotator]', lambda i: manager.get_statistics(annotator(i)), iterations, None),
+        ('get_sample', lambda i: manager.get_sample(sample()), iterations, lambda r: r is not None),
+        ('get_segments_for_sample', lambda i: manager.get_segments_for_sample(sample()), iterations, None),
+        ('get_sample_exception_status', lambda i: manager.get_sample_exception_status(sample()), iterations, None),
+        ('query_samples[page 1]',
+         lambda i: manager.query_samples(dataset(i), page=1, page_size=PAGE_SIZE), iterations, is_page),
+        ('query_samples[annotator, last page]',
+         lambda i: manager.query_samples(dataset(i), annotator(i), page=10 ** 6, page_size=PAGE_SIZE),
+         iterations, is_page),
+        ('query_samples[review_status, deep page]',
+         lambda i: manager.query_samples(dataset(i), page=deep_pages[dataset(i)], page_size=PAGE_SIZE,
+                                         review_status='未审阅'), iterations, is_page),
+        ('query_segments[page 1]',
+         lambda i: manager.query_segments(dataset(i), page=1, page_size=PAGE_SIZE), iterations, is_page),
+        ('query_segments[status, sort=duration]',
+         lambda i: manager.query_segments(dataset(i), page=2, page_size=PAGE_SIZE, status='选用', sort='duration'),
+         iterations, is_page),
+        ('get_changes', lambda i: manager.get_changes(changes_start['revision'], changes_start['epoch']),
+         iterations, None),
+        ('get_samples_for_dataset', lambda i: manager.get_samples_for_dataset(dataset(i), None),
+         heavy_iterations, None),
+        ('get_samples_for_dataset[annotator]', lambda i: manager.get_samples_for_dataset(dataset(i), annotator(i)),
+         heavy_iterations, None),
+        ('get_segments_for_dataset', lambda i: manager.get_segments_for_dataset(dataset(i)), heavy_iterations, None),
+        ('get_segments_for_dataset_sorted', lambda i: manager.get_segments_for_dataset_sorted(dataset(i)),
+         heavy_iterations, None),
+    ]
+    for name, func, count, check in cases:
+        recorder.measure('manager', name, func, count, check)
+
+
+def bench_writes(recorder: BenchmarkRecorder, manager: DatasetManager, samples: List, pool: SegmentPool,
+                 rng: random.Random, iterations: int):
+    """修改方法（每次修改都经过锁、索引、统计和持久化）"""
+    sample = lambda: rng.choice(samples)[1]
+    succeeded = lambda result: result is True
+    all_succeeded = lambda results: all(r['success'] for r in results)
+    statuses = ['待抉择', '选用', '弃用']
+
+    def batch_update(i):
+        return manager.update_segments([
+            {'id': pool.pick(), 'patch': {'status': statuses[(i + j) % 3]}} for j in range(BATCH_SIZE)
+        ])
+
+    def update_times(i):
+        start_time = round(rng.uniform(0, 600), 2)
+        return manager.update_segment(pool.pick(), {'start_time': start_time, 'end_time': start_time + 5})
+
+    cases = [
+        ('create_segment', lambda i: manager.create_segment(pool.new_segment(sample())), succeeded),
+        ('create_segments[50]',
+         lambda i: manager.create_segments([pool.new_segment(sample()) for _ in range(BATCH_SIZE)]),
+         lambda result: result.get('success')),
+        ('update_segment[status]', lambda i: manager.update_segment(pool.pick(), {'status': statuses[i % 3]}),
+         succeeded),
+        ('update_segment[times]', update_times, succeeded),
+        ('update_segment[comment]', lambda i: manager.update_segment(pool.pick(), {'comment': f"基准注释 {i}"}),
+         succeeded),
+        ('update_segment_status', lambda i: manager.update_segment_status(pool.pick(), statuses[i % 3]), succeeded),
+        ('update_segments[50]', batch_update, all_succeeded),
+        ('delete_segment', lambda i: manager.delete_segment(pool.take()), succeeded),
+        ('mark_sample_reviewed', lambda i: manager.mark_sample_reviewed(sample()), succeeded),
+        ('mark_sample_unreviewed', lambda i: manager.mark_sample_unreviewed(sample()), succeeded),
+        ('set_sample_exception_status',
+         lambda i: manager.set_sample_exception_status(sample(), i % 2 == 0, '基准测试'), succeeded),
+    ]
+    for name, func, check in cases:
+        recorder.measure('manager', name, func, iterations, check)
+
+    # 每次先产生一个待写修改，计时写盘本身
+    recorder.measure('manager', 'flush', lambda i: manager.flush(), max(1, iterations // 10), succeeded,
+                     setup=lambda i: manager.update_segment(pool.pick(), {'comment': f"写盘 {i}"}))
+
+
+def bench_maintenance(recorder: BenchmarkRecorder, manager: DatasetManager, dataset_ids: List[str]):
+    """全量维护操作（最后执行，remove_rejected_segments 会删除数据）"""
+    recorder.measure('manager', 'check_statistics_consistency',
+                     lambda i: manager.check_statistics_consistency(), 1, lambda result: result.get('consistent', True))
+    recorder.measure('manager', 'compact_segment_journals', lambda i: manager.compact_segment_journals(), 1)
+    recorder.measure('manager', 'remove_rejected_segments',
+                     lambda i: manager.remove_rejected_segments(dataset_ids[i]), len(dataset_ids),
+                     lambda result: result is True)
+
+
+def _load_app(manager: DatasetManager, work_dir: str, media_dir: str):
+    """导入 app 并换成基准管理器；app 的数据、视频和缩略图目录都指向 work_dir，不在仓库中创建文件"""
+    first_import = 'app' not in sys.modules
+    if first_import:
+        app_dir = os.path.join(work_dir, 'app')
+        os.environ['ANNOTATION_DATA_DIR'] = os.path.join(app_dir, 'data')
+        os.environ['ANNOTATION_VIDEO_DIR'] = os.path.join(app_dir, 'videos')
+        os.environ['ANNOTATION_THUMBNAIL_DIR'] = os.path.join(app_dir, 'thumbnails')
+    with _quiet():
+        import app as app_module
+
+        # 与 app 中的连接方式相同：视频管理器和缩略图服务使用基准管理器（并监听它的修改）
+        app_module.thumbnail_service.shutdown()
+        if first_import:
+            app_module.dataset_manager.close()
+        video_download_manager = VideoDownloadManager(
+            base_video_dir=os.path.join(media_dir, 'videos'), dataset_manager=manager
+        )
+        app_module.dataset_manager = manager
+        app_module.video_download_manager = video_download_manager
+        app_module.thumbnail_service = ThumbnailService(video_download_manager,
+                                                        base_dir=os.path.join(media_dir, 'thumbnails'))
+    return app_module
+
+
+def bench_endpoints(recorder: BenchmarkRecorder, manager: DatasetManager, samples: List, pool: SegmentPool,
+                    rng: random.Random, iterations: int, heavy_iterations: int, work_dir: str, media_dir: str):
+    """通过Flask测试客户端请求接口（包含路由、参数解析、JSON序列化）"""
+    app_module = _load_app(manager, work_dir, media_dir)
+    client = app_module.app.test_client()
+    dataset_ids = sorted({dataset_id for dataset_id, _ in samples})
+    dataset = lambda i: dataset_ids[i % len(dataset_ids)]
+    annotator = lambda i: ANNOTATORS[i % len(ANNOTATORS)]
+    sample = lambda: rng.choice(samples)[1]
+    ok = lambda response: response.status_code == 200
+    changes_start = manager.get_changes(None)
+    statuses = ['待抉择', '选用', '弃用']
+
+    def update(i):
+        start_time = round(rng.uniform(0, 600), 2)
+        return client.post(f"/api/segment/{pool.pick()}/update",
+                           json={'status': statuses[i % 3], 'start_time': start_time, 'end_time': start_time + 5})
+
+    def batch_update(i):
+        return client.post('/api/segments/batch_update', json={'operations': [
+            {'id': pool.pick(), 'patch': {'status': statuses[(i + j) % 3]}} for j in range(BATCH_SIZE)
+        ]})
+
+    cases = [
+        ('GET /api/datasets', lambda i: client.get(f"/api/datasets?annotator={annotator(i)}"), iterations),
+        ('GET /api/statistics', lambda i: client.get('/api/statistics'), iterations),
+        ('GET /api/dataset/<id>/samples?page=1',
+         lambda i: client.get(f"/api/dataset/{dataset(i)}/samples?page=1&page_size={PAGE_SIZE}"), iterations),
+        ('GET /api/dataset/<id>/samples?annotator&review_status',
+         lambda i: client.get(f"/api/dataset/{dataset(i)}/samples?page=3&page_size={PAGE_SIZE}"
+                              f"&annotator={annotator(i)}&review_status=未审阅"), iterations),
+        ('GET /api/dataset/<id>/segments?page=1',
+         lambda i: client.get(f"/api/dataset/{dataset(i)}/segments?page=1&page_size={PAGE_SIZE}"), iterations),
+        ('GET /api/sample/<id>/segments', lambda i: client.get(f"/api/sample/{sample()}/segments"), iterations),
+        ('GET /api/changes',
+         lambda i: client.get(f"/api/changes?since={changes_start['revision']}&epoch={changes_start['epoch']}"),
+         iterations),
+        ('POST /api/segment/create', lambda i: client.post('/api/segment/create', json=pool.new_segment(sample())),
+         iterations),
+        ('POST /api/segment/<id>/update', update, iterations),
+        ('POST /api/segment/<id>/comment',
+         lambda i: client.post(f"/api/segment/{pool.pick()}/comment", json={'comment': f"基准注释 {i}"}), iterations),
+        ('POST /api/segments/batch_update', batch_update, iterations),
+        ('DELETE /api/segment/<id>/delete', lambda i: client.delete(f"/api/segment/{pool.take()}/delete"), iterations),
+        ('POST /api/sample/<id>/mark_reviewed', lambda i: client.post(f"/api/sample/{sample()}/mark_reviewed"),
+         iterations),
+        ('GET /api/dataset/<id>/samples (full list)', lambda i: client.get(f"/api/dataset/{dataset(i)}/samples"),
+         heavy_iterations),
+        ('GET /api/dataset/<id>/segments (full list)', lambda i: client.get(f"/api/dataset/{dataset(i)}/segments"),
+         heavy_iterations),
+    ]
+    for name, func, count in cases:
+        recorder.measure('endpoint', name, func, count, ok)
+
+    # 停止剪辑和缩略图的后台更新，之后的维护测试和清理数据目录不受影响
+    manager.changes.remove_listener(app_module.video_download_manager.on_segment_change)
+    app_module.thumbnail_service.shutdown()
+
+
+def run_combination(scale: str, storage: str, datasets: Dict, segments: Dict, work_dir: str,
+                    args: argparse.Namespace) -> Dict:
+    """在一份新写入的数据上运行一个 (规模, 存储后端) 组合的全部测试"""
+    sample_count, segment_count = SCALES[scale]
+    recorder = BenchmarkRecorder(scale, storage, sample_count, segment_count)
+    data_dir = os.path.join(work_dir, f"{scale}-{storage}")
+    media_dir = os.path.join(work_dir, f"{scale}-{storage}-media")
+    shutil.rmtree(data_dir, ignore_errors=True)
+    shutil.rmtree(media_dir, ignore_errors=True)
+
+    print(f"\n🔧 写入 {scale}/{storage} 数据: {sample_count} 个样本，{segment_count} 个片段")
+    started = time.perf_counter()
+    with _quiet():
+        if storage == 'json':
+            write_json(data_dir, datasets, segments)
+        else:
+            write_sqlite(data_dir, datasets, segments)
+    setup_seconds = time.perf_counter() - started
+
+    rng = random.Random(args.seed + 1)
+    samples = sample_ids(datasets)
+    pool = SegmentPool(segments, rng)
+    dataset_ids = sorted(datasets)
+
+    bench_loading(recorder, data_dir, storage, args.load_iterations, dataset_ids)
+
+    with _quiet():
+        manager = DatasetManager(data_dir, storage=storage, persist_interval=args.persist_interval)
+        for dataset_id in dataset_ids:
+            manager.get_samples_for_dataset(dataset_id, None)
+    try:
+        bench_reads(recorder, manager, samples, pool, rng, args.iterations, args.heavy_iterations)
+        bench_writes(recorder, manager, samples, pool, rng, args.iterations)
+        if not args.skip_endpoints:
+            bench_endpoints(recorder, manager, samples, pool, rng, args.iterations, args.heavy_iterations,
+                            work_dir, media_dir)
+        bench_maintenance(recorder, manager, dataset_ids)
+    finally:
+        with _quiet():
+            manager.close()
+
+    if not args.keep_data:
+        shutil.rmtree(data_dir, ignore_errors=True)
+        shutil.rmtree(media_dir, ignore_errors=True)
+    return {
+        'scale': scale,
+        'storage': storage,
+        'samples': sample_count,
+        'segments': segment_count,
+        'setup_seconds': round(setup_seconds, 3),
+        'peak_rss_mb': _peak_rss_mb(),
+        'results': recorder.results,
+    }
+
+
+def compare(report: Dict, baseline_path: str):
+    """与基线结果比较各测试项的耗时中位数"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    key = lambda entry: (entry['scale'], entry['storage'], entry['group'], entry['name'])
+    baseline_entries = {key(entry): entry for run in baseline.get('runs', []) for entry in run['results']}
+
+    print(f"\n📊 与基线比较: {baseline_path}（基线提交 {baseline.get('meta', {}).get('git_commit')}）")
+    regressions = 0
+    for run in report['runs']:
+        for entry in run['results']:
+            previous = baseline_entries.get(key(entry))
+            if previous is None or not previous['median_ms']:
+                continue
+            ratio = entry['median_ms'] / previous['median_ms']
+            marker = ''
+            if ratio > REGRESSION_RATIO:
+                marker = '  ⚠️ 变慢'
+                regressions += 1
+            elif ratio < 1 / REGRESSION_RATIO:
+                marker = '  ✅ 变快'
+            print(f"  {entry['scale']}/{entry['storage']} {entry['name']:<52} "
+                  f"{previous['median_ms']:>10.3f} → {entry['median_ms']:>10.3f} ms  ×{ratio:.2f}{marker}")
+    print(f"共 {regressions} 项变慢超过 {REGRESSION_RATIO} 倍")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="DatasetManager 与 Flask 接口基准测试")
+    parser.add_argument('--scales', default='small', help=f"逗号分隔的规模: {', '.join(SCALES)}")
+    parser.add_argument('--storage', default='json,sqlite', help="逗号分隔的存储后端: json, sqlite")
+    parser.add_argument('--shapes', default=','.join(SHAPES), help="逗号分隔的数据集形状")
+    parser.add_argument('--iterations', type=int, default=200, help="每个测试项的调用次数")
+    parser.add_argument('--heavy-iterations', type=int, default=5, help="返回完整列表的测试项的调用次数")
+    parser.add_argument('--load-iterations', type=int, default=3, help="加载测试的次数")
+    parser.add_argument('--persist-interval', type=float, default=1.0,
+                        help="后台写盘间隔（秒），0表示每次修改同步写入")
+    parser.add_argument('--seed', type=int, default=0, help="合成数据的随机种子")
+    parser.add_argument('--skip-endpoints', action='store_true', help="不测试Flask接口")
+    parser.add_argument('--work-dir', default=None, help="数据目录（默认使用临时目录）")
+    parser.add_argument('--keep-data', action='store_true', help="保留写入的数据")
+    parser.add_argument('--output', default='benchmark_results.json', help="结果JSON文件")
+    parser.add_argument('--compare', default=None, help="与之前的结果JSON比较")
+    args = parser.parse_args()
+
+    scales = [scale for scale in args.scales.split(',') if scale]
+    storages = [storage for storage in args.storage.split(',') if storage]
+    shapes = tuple(shape for shape in args.shapes.split(',') if shape)
+    for scale in scales:
+        if scale not in SCALES:
+            parser.error(f"未知规模: {scale}")
+    for storage in storages:
+        if storage not in STORAGES:
+            parser.error(f"未知存储后端: {storage}")
+    for shape in shapes:
+        if shape not in SHAPES:
+            parser.error(f"未知数据集形状: {shape}")
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='annotation-bench-')
+    os.makedirs(work_dir, exist_ok=True)
+
+    report = {
+        'meta': {
+            'started_at': datetime.now().isoformat(),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args),
+        },
+        'runs': []
+    }
+    try:
+        for scale in scales:
+            print(f"🧪 生成 {scale} 规模的合成数据...")
+            datasets, segments = generate(scale, shapes, args.seed)
+            for storage in storages:
+                report['runs'].append(run_combination(scale, storage, datasets, segments, work_dir, args))
+            del datasets, segments
+    finally:
+        if args.work_dir is None and not args.keep_data:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report['meta']['finished_at'] = datetime.now().isoformat()
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 结果已写入 {args.output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
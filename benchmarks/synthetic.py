@@ -0,0 +1,134 @@
+"""
+合成基准数据
+按 egoexo4d.json（多视角）、hd-epic.json（单视频）、youtube1.json（YouTube）的结构生成指定规模的
+数据集和片段，写入JSON数据目录或SQLite数据库；相同的规模和随机种子总是生成相同的数据
+"""
+
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from models.storage import JsonStorageBackend, SqliteStorageBackend
+
+# 规模名称 -> (样本总数, 片段总数)，样本和片段平均分配到各数据集形状
+SCALES = {
+    'small': (1_000, 10_000),
+    'medium': (10_000, 100_000),
+    'large': (100_000, 1_000_000),
+}
+
+SHAPES = ('egoexo4d', 'hd-epic', 'youtube1')
+ANNOTATORS = ['annotator_1', 'annotator_2', 'annotator_3', 'annotator_4', 'annotator_5']
+REVIEW_STATUSES = (['未审阅'] * 6) + (['审阅中'] * 1) + (['已审阅'] * 3)
+SEGMENT_STATUSES = (['待抉择'] * 5) + (['选用'] * 3) + (['弃用'] * 2)
+EGOEXO_VIEWS = ['aria01_214-1.mp4', 'cam01.mp4', 'cam02.mp4', 'cam03.mp4', 'cam04.mp4']
+YOUTUBE_TOPICS = ['traffic', 'cooking', 'sports', 'indoor', 'outdoor']
+
+BASE_TIME = datetime(2025, 8, 20, 15, 0, 0)
+
+
+def _sample(shape: str, dataset_id: str, index: int, rng: random.Random) -> Dict:
+    """生成一个与对应源文件结构相同的样本"""
+    created_at = (BASE_TIME + timedelta(seconds=index)).isoformat()
+    sample = {
+        'assigned_to': rng.choice(ANNOTATORS),
+        'review_status': rng.choice(REVIEW_STATUSES),
+        'created_at': created_at,
+    }
+    if shape == 'egoexo4d':
+        sample_id = f"bench_take_{index:06d}"
+        sample.update({
+            'id': sample_id,
+            'name': sample_id,
+            'type': 'multiple_videos',
+            'video_paths': [f"/static/videos/{dataset_id}/{sample_id}/{view}" for view in EGOEXO_VIEWS],
+        })
+    elif shape == 'hd-epic':
+        sample_id = f"P{index // 100:02d}-{index % 100:02d}-{index:06d}"
+        sample.update({
+            'id': sample_id,
+            'name': sample_id,
+            'type': 'single_video',
+            'video_path': f"/static/videos/{dataset_id}/{sample_id}/{sample_id}.mp4",
+        })
+    else:
+        sample_id = f"youtube_{index:06d}"
+        sample.update({
+            'id': sample_id,
+            'name': f"{index:06d}",
+            'type': 'youtube',
+            'youtube_url': f"https://www.youtube.com/watch?v=bench{index:07d}",
+            'topic': rng.choice(YOUTUBE_TOPICS),
+            'perspective': rng.choice(['ego', 'exo']),
+            'updated_at': created_at,
+        })
+    return sample
+
+
+def _segment(dataset_id: str, sample: Dict, index: int, rng: random.Random) -> Dict:
+    """生成一个与 /api/segment/create 写入结构相同的片段"""
+    start_time = round(rng.uniform(0, 600), 2)
+    video_path = sample.get('video_path') or (sample.get('video_paths') or [None])[0]
+    return {
+        'id': f"seg_{dataset_id}_{index:07d}",
+        'video_path': video_path,
+        'start_time': start_time,
+        'end_time': round(start_time + rng.uniform(1, 30), 2),
+        'status': rng.choice(SEGMENT_STATUSES),
+        'sample_id': sample['id'],
+        'created_at': (BASE_TIME + timedelta(days=1, milliseconds=index)).isoformat(),
+    }
+
+
+def generate(scale: str, shapes: Tuple[str, ...] = SHAPES, seed: int = 0) -> Tuple[Dict, Dict]:
+    """生成 (datasets, segments)，结构与 DatasetManager.datasets / segments 相同"""
+    sample_total, segment_total = SCALES[scale]
+    rng = random.Random(seed)
+    datasets, segments = {}, {}
+    for position, shape in enumerate(shapes):
+        # 余数分给前面的数据集，保证总数与规模一致
+        sample_count = sample_total // len(shapes) + (1 if position < sample_total % len(shapes) else 0)
+        segment_count = segment_total // len(shapes) + (1 if position < segment_total % len(shapes) else 0)
+
+        samples = [_sample(shape, shape, i, rng) for i in range(sample_count)]
+        datasets[shape] = {
+            'id': shape,
+            'name': f"{shape}基准数据集",
+            'description': f"按 {shape} 结构生成的合成数据",
+            'created_at': BASE_TIME.isoformat(),
+            'sample_count': sample_count,
+            'assigned_sample_count': sample_count,
+            'samples': samples,
+        }
+        segments[shape] = {
+            'segments': [_segment(shape, rng.choice(samples), i, rng) for i in range(segment_count)]
+        }
+    return datasets, segments
+
+
+def write_json(data_dir: str, datasets: Dict, segments: Dict):
+    """写入JSON数据目录（<id>.json 与 <id>_segments.json）"""
+    os.makedirs(data_dir, exist_ok=True)
+    target = JsonStorageBackend(data_dir, use_journal=False)
+    for dataset_id, dataset in datasets.items():
+        target.save_dataset(dataset_id, dataset)
+    for dataset_id, segments_data in segments.items():
+        target.save_segments(dataset_id, segments_data)
+
+
+def write_sqlite(data_dir: str, datasets: Dict, segments: Dict) -> str:
+    """写入SQLite数据库（data_dir/annotations.db），返回数据库路径"""
+    os.makedirs(data_dir, exist_ok=True)
+    database_path = os.path.join(data_dir, 'annotations.db')
+    target = SqliteStorageBackend(database_path)
+    target.initialize()
+    target.import_data(datasets, segments)
+    target.flush()
+    target.close()
+    return database_path
+
+
+def sample_ids(datasets: Dict) -> List[Tuple[str, str]]:
+    """全部 (dataset_id, sample_id)"""
+    return [(dataset_id, sample['id']) for dataset_id, dataset in datasets.items() for sample in dataset['samples']]
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+存储迁移脚本
+在JSON数据目录与SQLite数据库之间导入/导出数据集和片段
+"""
+
+import os
+import sys
+
+from models.dataset_manager import DatasetManager
+from models.storage import JsonStorageBackend, SqliteStorageBackend
+
+
+def import_json(data_dir: str, database_path: str):
+    """把JSON数据目录（含尚未压缩的片段日志）导入SQLite数据库"""
+    # 导入需要全部数据，不能按需加载（存在清单时 manager.datasets 只包含已访问的数据集）
+    manager = DatasetManager(data_dir, lazy_load=False)
+    manager.compact_segment_journals()
+
+    target = SqliteStorageBackend(database_path)
+    target.initialize()
+    target.import_data(manager.datasets, manager.segments)
+    target.flush()
+    target.close()
+
+    segment_count = sum(len(s.get('segments', [])) for s in manager.segments.values())
+    manager.close()
+    print(f"✅ 已导入 {len(manager.datasets)} 个数据集、{segment_count} 个片段到 {database_path}")
+
+
+def export_json(database_path: str, data_dir: str):
+    """把SQLite数据库导出为JSON数据目录（<id>.json 与 <id>_segments.json）"""
+    source = SqliteStorageBackend(database_path)
+    source.initialize()
+    datasets, segments = source.load(None)
+    source.close()
+
+    os.makedirs(data_dir, exist_ok=True)
+    target = JsonStorageBackend(data_dir, use_journal=False)
+    for dataset_id, dataset in datasets.items():
+        target.save_dataset(dataset_id, dataset)
+    for dataset_id, segments_data in segments.items():
+        target.save_segments(dataset_id, segments_data)
+
+    segment_count = sum(len(s.get('segments', [])) for s in segments.values())
+    print(f"✅ 已导出 {len(datasets)} 个数据集、{segment_count} 个片段到 {data_dir}")
+
+
+def main():
+    """主函数"""
+    if len(sys.argv) != 4 or sys.argv[1] not in ('import', 'export'):
+        print("用法:")
+        print("  python migrate_storage.py import <数据目录> <数据库文件>")
+        print("  python migrate_storage.py export <数据库文件> <数据目录>")
+        print("\n示例:")
+        print("  python migrate_storage.py import data data/annotations.db")
+        print("  python migrate_storage.py export data/annotations.db data_export")
+        return
+
+    if sys.argv[1] == 'import':
+        data_dir, database_path = sys.argv[2], sys.argv[3]
+        if not os.path.isdir(data_dir):
+            print(f"❌ 错误: 数据目录不存在: {data_dir}")
+            return
+        import_json(data_dir, database_path)
+    else:
+        database_path, data_dir = sys.argv[2], sys.argv[3]
+        if not os.path.exists(database_path):
+            print(f"❌ 错误: 数据库文件不存在: {database_path}")
+            return
+        export_json(database_path, data_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import json
+import os
+import tempfile
+from typing import Optional, Union
+
+
+# mkstemp 创建的临时文件权限为0600，替换后按进程umask恢复普通文件权限
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def write_file_atomic(filepath: str, content: Union[str, bytes]):
+    """原子写入文件：先在同一目录写唯一的临时文件并fsync，再重命名覆盖（多个进程同时写同一文件时互不干扰）"""
+    directory, filename = os.path.split(os.path.abspath(filepath))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{filename}.", suffix='.tmp', dir=directory)
+    try:
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_json_atomic(filepath: str, data, indent: Optional[int] = 2):
+    """原子写入JSON文件"""
+    write_file_atomic(filepath, json.dumps(data, ensure_ascii=False, indent=indent))
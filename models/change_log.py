@@ -0,0 +1,90 @@
+import threading
+import uuid
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+
+class ChangeLog:
+    """修改日志：每次修改分配单调递增的版本号，只在内存中保留最近 capacity 条记录，
+    客户端用 since(版本号) 增量同步；epoch 在进程启动时生成，客户端的 epoch 不一致（服务重启或
+    请求落到其他worker）或版本号已被淘汰时返回 reset，客户端需重新拉取完整列表"""
+
+    def __init__(self, capacity: int = 10000):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.revision = 0
+        self._entries = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Dict], None]] = []
+
+    def record(self, record_type: str, action: str, dataset_id: str,
+               record_id: Optional[str] = None, data: Optional[Dict] = None) -> int:
+        """记录一次修改并通知监听者，返回分配的版本号
+
+        record_type 为 'sample'、'segment' 或 'dataset'；action 为 'create'、'update'、'delete'
+        或 'reload'（数据集被其他进程修改后重新加载，具体变化未知）；data 为修改后的记录副本。
+        """
+        with self._lock:
+            self.revision += 1
+            change = {
+                'rev': self.revision,
+                'type': record_type,
+                'action': action,
+                'dataset_id': dataset_id,
+                'id': record_id,
+                'data': dict(data) if data is not None else None
+            }
+            self._entries.append(change)
+            listeners = list(self._listeners)
+
+        for listener in listeners:
+            try:
+                listener(change)
+            except Exception as e:
+                print(f"⚠️ 修改监听器执行失败: {e}")
+        return change['rev']
+
+    def add_listener(self, listener: Callable[[Dict], None]):
+        """注册修改监听器（在修改线程中同步调用，且调用时仍持有数据集写锁，应尽快返回）"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Dict], None]):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def since(self, revision: Optional[int], epoch: Optional[str] = None, dataset_id: Optional[str] = None,
+              limit: int = 1000) -> Dict:
+        """获取 revision 之后的修改，同一记录只保留最后一次修改
+
+        返回 {'epoch', 'revision', 'reset', 'has_more', 'changes'}；客户端下次以返回的 revision 继续请求。
+        revision 为None时只返回当前版本号，客户端在拉取完整列表前用它初始化游标。
+        """
+        with self._lock:
+            oldest = self._entries[0]['rev'] if self._entries else self.revision + 1
+            result = {'epoch': self.epoch, 'revision': self.revision, 'reset': False,
+                      'has_more': False, 'changes': []}
+            if revision is None:
+                return result
+            if (epoch is not None and epoch != self.epoch) or revision > self.revision or revision < oldest - 1:
+                result['reset'] = True
+                return result
+
+            latest = {}
+            last_rev = revision
+            # 版本号连续，可直接定位到 revision 之后的第一条
+            start = revision - oldest + 1
+            for i in range(start, len(self._entries)):
+                change = self._entries[i]
+                if len(latest) >= limit:
+                    result['has_more'] = True
+                    break
+                last_rev = change['rev']
+                if dataset_id is not None and change['dataset_id'] != dataset_id:
+                    continue
+                key = (change['type'], change['dataset_id'], change['id'])
+                latest.pop(key, None)
+                latest[key] = change
+            result['revision'] = last_rev
+            result['changes'] = list(latest.values())
+            return result
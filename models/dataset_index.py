@@ -0,0 +1,219 @@
+import heapq
+from bisect import bisect_left
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from models.statistics_engine import ALL_ANNOTATORS
+
+
+class OrderedBuckets:
+    """按序号有序的分桶列表：插入和删除用二分查找定位，分页时直接切片"""
+
+    def __init__(self):
+        self._buckets: Dict[tuple, Tuple[List[int], List[Dict]]] = {}
+
+    def clear(self):
+        self._buckets.clear()
+
+    def add(self, key: tuple, seq: int, item: Dict):
+        seqs, items = self._buckets.setdefault(key, ([], []))
+        position = bisect_left(seqs, seq)
+        seqs.insert(position, seq)
+        items.insert(position, item)
+
+    def remove(self, key: tuple, seq: int):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return
+        seqs, items = bucket
+        position = bisect_left(seqs, seq)
+        if position < len(seqs) and seqs[position] == seq:
+            del seqs[position]
+            del items[position]
+        if not seqs:
+            del self._buckets[key]
+
+    def items(self, key: tuple) -> List[Dict]:
+        """桶内条目（按序号排列，返回内部列表，调用方不应修改）"""
+        bucket = self._buckets.get(key)
+        return bucket[1] if bucket else []
+
+    def seqs(self, key: tuple) -> List[int]:
+        bucket = self._buckets.get(key)
+        return bucket[0] if bucket else []
+
+    def keys(self, predicate: Callable[[tuple], bool]) -> List[tuple]:
+        return [key for key in self._buckets if predicate(key)]
+
+    def drop(self, predicate: Callable[[tuple], bool]):
+        for key in self.keys(predicate):
+            del self._buckets[key]
+
+    def _iter_group(self, group: List[tuple]) -> Iterator[Dict]:
+        if len(group) == 1:
+            return iter(self.items(group[0]))
+        merged = heapq.merge(*(zip(self.seqs(key), self.items(key)) for key in group), key=itemgetter(0))
+        return (item for _, item in merged)
+
+    def iter_groups(self, key_groups: List[List[tuple]]) -> Iterator[Dict]:
+        """按分组顺序依次输出各组条目，组内多个桶按序号归并"""
+        for group in key_groups:
+            yield from self._iter_group(group)
+
+    def page(self, key_groups: List[List[tuple]], offset: int, limit: Optional[int]) -> Tuple[List[Dict], int]:
+        """按 iter_groups 的顺序取第 offset 个起的至多 limit 个条目，返回 (条目, 总数)；
+        整桶跳过，只在单个桶内切片，耗时与页大小而非总数相关"""
+        sizes = [sum(len(self.seqs(key)) for key in group) for group in key_groups]
+        total = sum(sizes)
+        result = []
+        for group, size in zip(key_groups, sizes):
+            if limit is not None and len(result) >= limit:
+                break
+            if offset >= size:
+                offset -= size
+                continue
+            stop = None if limit is None else offset + limit - len(result)
+            if len(group) == 1:
+                result.extend(self.items(group[0])[offset:stop])
+            else:
+                result.extend(islice(self._iter_group(group), offset, stop))
+            offset = 0
+        return result, total
+
+
+class DatasetIndex:
+    """数据集内存索引，避免按ID查找时线性扫描所有数据集"""
+
+    def __init__(self):
+        # segment_id -> (dataset_id, 在片段列表中的位置)
+        self.segment_by_id: Dict[str, Tuple[str, int]] = {}
+        # sample_id -> (dataset_id, sample)
+        self.sample_by_id: Dict[str, Tuple[str, Dict]] = {}
+        # sample_id -> [segment, ...]，保持创建顺序
+        self.segments_by_sample: Dict[str, List[Dict]] = {}
+        # annotator -> {dataset_id: [sample, ...]}
+        self.samples_by_annotator: Dict[str, Dict[str, List[Dict]]] = {}
+        # (dataset_id, annotator 或 ALL_ANNOTATORS, review_status) -> 按数据集中顺序排列的样本，用于分页查询
+        self.sample_buckets = OrderedBuckets()
+        # (dataset_id, annotator 或 ALL_ANNOTATORS, status) -> 按创建顺序排列的片段
+        self.segment_buckets = OrderedBuckets()
+        # id(sample) -> 样本在数据集中的位置；id(segment) -> (创建序号, 标注者)
+        self._sample_seq: Dict[int, int] = {}
+        self._segment_seq: Dict[int, Tuple[int, Optional[str]]] = {}
+        self._next_segment_seq = 0
+
+    def rebuild(self, datasets: Dict, segments: Dict):
+        """根据当前数据全量重建索引"""
+        self.segment_by_id.clear()
+        self.sample_by_id.clear()
+        self.segments_by_sample.clear()
+        self.samples_by_annotator.clear()
+        self.sample_buckets.clear()
+        self.segment_buckets.clear()
+        self._sample_seq.clear()
+        self._segment_seq.clear()
+
+        for dataset_id, dataset in datasets.items():
+            self.add_samples(dataset_id, dataset.get('samples', []))
+
+        for dataset_id, dataset_segments in segments.items():
+            for position, segment in enumerate(dataset_segments.get('segments', [])):
+                self.add_segment(dataset_id, segment, position)
+
+    def add_samples(self, dataset_id: str, samples: List[Dict]):
+        """索引数据集中的样本（同一样本ID以先加载的数据集为准）"""
+        for position, sample in enumerate(samples):
+            sample_id = sample.get('id')
+            if sample_id not in self.sample_by_id:
+                self.sample_by_id[sample_id] = (dataset_id, sample)
+            annotator_datasets = self.samples_by_annotator.setdefault(sample.get('assigned_to'), {})
+            annotator_datasets.setdefault(dataset_id, []).append(sample)
+            self._sample_seq[id(sample)] = position
+            for annotator in (sample.get('assigned_to'), ALL_ANNOTATORS):
+                self.sample_buckets.add((dataset_id, annotator, sample.get('review_status')), position, sample)
+
+    def update_sample_status(self, dataset_id: str, sample: Dict, old_status: Optional[str]):
+        """样本审阅状态变化后移动到新的分桶"""
+        position = self._sample_seq.get(id(sample))
+        if position is None:
+            return
+        for annotator in (sample.get('assigned_to'), ALL_ANNOTATORS):
+            self.sample_buckets.remove((dataset_id, annotator, old_status), position)
+            self.sample_buckets.add((dataset_id, annotator, sample.get('review_status')), position, sample)
+
+    def add_segment(self, dataset_id: str, segment: Dict, position: int):
+        """索引新加入的片段"""
+        self.segment_by_id[segment.get('id')] = (dataset_id, position)
+        self.segments_by_sample.setdefault(segment.get('sample_id'), []).append(segment)
+        sample_entry = self.sample_by_id.get(segment.get('sample_id'))
+        annotator = sample_entry[1].get('assigned_to') if sample_entry else None
+        seq = self._next_segment_seq
+        self._next_segment_seq += 1
+        self._segment_seq[id(segment)] = (seq, annotator)
+        for key_annotator in (annotator, ALL_ANNOTATORS):
+            self.segment_buckets.add((dataset_id, key_annotator, segment.get('status')), seq, segment)
+
+    def update_segment_status(self, dataset_id: str, segment: Dict, old_status: Optional[str]):
+        """片段状态变化后移动到新的分桶（保持创建顺序）"""
+        entry = self._segment_seq.get(id(segment))
+        if entry is None:
+            return
+        seq, annotator = entry
+        for key_annotator in (annotator, ALL_ANNOTATORS):
+            self.segment_buckets.remove((dataset_id, key_annotator, old_status), seq)
+            self.segment_buckets.add((dataset_id, key_annotator, segment.get('status')), seq, segment)
+
+    def remove_segment(self, segment: Dict):
+        """移除片段索引（位置需由调用方通过 reindex_positions 修正）"""
+        location = self.segment_by_id.pop(segment.get('id'), None)
+        entry = self._segment_seq.pop(id(segment), None)
+        if entry is not None and location is not None:
+            seq, annotator = entry
+            for key_annotator in (annotator, ALL_ANNOTATORS):
+                self.segment_buckets.remove((location[0], key_annotator, segment.get('status')), seq)
+        sample_segments = self.segments_by_sample.get(segment.get('sample_id'))
+        if sample_segments is None:
+            return
+        for i, existing in enumerate(sample_segments):
+            if existing is segment:
+                sample_segments.pop(i)
+                break
+        if not sample_segments:
+            del self.segments_by_sample[segment.get('sample_id')]
+
+    def remove_dataset(self, dataset_id: str, dataset: Optional[Dict], segments: Optional[Dict]):
+        """移除一个数据集的全部样本和片段索引（重新加载数据集前调用）"""
+        for sample in (dataset or {}).get('samples', []):
+            entry = self.sample_by_id.get(sample.get('id'))
+            if entry and entry[0] == dataset_id:
+                del self.sample_by_id[sample.get('id')]
+        for annotator_datasets in self.samples_by_annotator.values():
+            annotator_datasets.pop(dataset_id, None)
+        for sample in (dataset or {}).get('samples', []):
+            self._sample_seq.pop(id(sample), None)
+        self.sample_buckets.drop(lambda key: key[0] == dataset_id)
+        for segment in (segments or {}).get('segments', []):
+            self.remove_segment(segment)
+        self.segment_buckets.drop(lambda key: key[0] == dataset_id)
+
+    def reindex_positions(self, dataset_id: str, segments: List[Dict], start: int = 0):
+        """修正片段列表中 start 之后各片段的位置"""
+        for position in range(start, len(segments)):
+            self.segment_by_id[segments[position].get('id')] = (dataset_id, position)
+
+    def get_sample(self, sample_id: str) -> Optional[Tuple[str, Dict]]:
+        """按ID查找样本，返回 (dataset_id, sample)"""
+        return self.sample_by_id.get(sample_id)
+
+    def get_segment_location(self, segment_id: str) -> Optional[Tuple[str, int]]:
+        """按ID查找片段位置，返回 (dataset_id, position)"""
+        return self.segment_by_id.get(segment_id)
+
+    def get_segments_for_sample(self, sample_id: str) -> List[Dict]:
+        """获取样本的片段列表（返回索引内部列表，调用方不应修改）"""
+        return self.segments_by_sample.get(sample_id, [])
+
+    def get_annotator_samples(self, annotator: str) -> Dict[str, List[Dict]]:
+        """获取标注者在各数据集中被分配的样本"""
+        return self.samples_by_annotator.get(annotator, {})
@@ -1,84 +1,502 @@
+import atexit
 import json
 import os
-from typing import List, Dict, Optional
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Iterable, List, Dict, Optional, Tuple
 from datetime import datetime
+from models.segment_journal import apply_segment_op
+from models.storage import JsonStorageBackend, SqliteStorageBackend, StorageBackend, write_json_atomic
+from models.locks import InterProcessLock, ReadWriteLock
+from models.change_log import ChangeLog
+from models.dataset_index import DatasetIndex
+from models.statistics_engine import ALL_ANNOTATORS, StatisticsEngine
 
 class DatasetManager:
     """数据集管理器，负责处理数据集、样本和片段"""
     
-    def __init__(self, data_dir: str = "data"):
+    MANIFEST_FILENAME = '.manifest.json'
+    # 分页查询的默认排序：样本 审阅中 -> 未审阅 -> 已审阅，片段 待抉择 -> 选用 -> 弃用（未知状态与第二/第一档同列）
+    SAMPLE_STATUS_ORDER = {'审阅中': 0, '未审阅': 1, '已审阅': 2}
+    SEGMENT_STATUS_ORDER = {'待抉择': 0, '选用': 1, '弃用': 2}
+    SAMPLE_SORTS = ('status', 'dataset', 'name', '-name')
+    SEGMENT_SORTS = ('status', 'created', 'start_time', 'duration', '-duration')
+    MAX_PAGE_SIZE = 500
+    MANIFEST_VERSION = 1
+    # 冷启动耗时目标（秒），超过时打印警告
+    STARTUP_TARGET_SECONDS = 2.0
+    
+    def __init__(self, data_dir: str = "data", use_journal: bool = True,
+                 journal_compact_bytes: int = 4 * 1024 * 1024, storage: str = 'json',
+                 database_path: Optional[str] = None, process_safe: bool = True,
+                 persist_interval: float = 1.0, lazy_load: bool = True,
+                 idle_unload_seconds: Optional[float] = None, change_log_size: int = 10000):
         self.data_dir = data_dir
+        # 只包含已加载的数据集；全部数据集的概要信息在 _catalog 中
         self.datasets = {}
         self.segments = {}
+        self._lock = threading.RLock()
+        
+        # 按需加载：启动时只读取数据集清单（名称、各标注者样本数、样本ID、统计计数），
+        # 首次访问时才解析完整数据；idle_unload_seconds 不为None时卸载长时间未访问的数据集
+        self.lazy_load = lazy_load
+        self.idle_unload_seconds = idle_unload_seconds
+        self._manifest_path = os.path.join(data_dir, self.MANIFEST_FILENAME)
+        self._catalog: Dict[str, Dict] = {}
+        self._loaded = set()
+        self._sample_owner: Dict[str, str] = {}
+        self._last_access: Dict[str, float] = {}
+        self.startup_seconds = None
+        
+        # 并发控制：每个数据集一把读写锁；process_safe 开启时写入还要持有跨进程文件锁，
+        # 并通过代数文件发现其他进程（如多个gunicorn worker）的修改，过期的数据集会重新加载
+        self.process_safe = process_safe
+        self._locks_dir = os.path.join(data_dir, '.locks')
+        self._dataset_locks: Dict[str, ReadWriteLock] = {}
+        self._file_locks: Dict[str, InterProcessLock] = {}
+        self._generations: Dict[str, int] = {}
+        
+        # 存储后端：'json' 为数据目录下的JSON文件（片段修改先追加到日志，超过阈值后在后台压缩进快照），
+        # 'sqlite' 为WAL模式的嵌入式数据库；也可以直接传入 StorageBackend 实例
+        if isinstance(storage, StorageBackend):
+            self.storage = storage
+        elif storage == 'sqlite':
+            self.storage = SqliteStorageBackend(database_path or os.path.join(data_dir, 'annotations.db'))
+        elif storage == 'json':
+            self.storage = JsonStorageBackend(data_dir, self._locked_if_current, use_journal, journal_compact_bytes)
+        else:
+            raise ValueError(f"不支持的存储后端: {storage}")
+        
+        # 样本/片段的主键与二级索引，所有修改都同步维护
+        self.index = DatasetIndex()
+        # 按 (数据集, 标注者) 增量维护的统计计数
+        self.statistics = StatisticsEngine()
+        # 每次修改的版本号与最近修改记录，供客户端增量同步（/api/changes）和其他模块监听
+        self.changes = ChangeLog(change_log_size)
+        
+        # 后台写入：修改只记录待写内容并标记数据集为脏，写入线程对每个脏数据集
+        # 每 persist_interval 秒最多写一次（0 表示在请求中同步写入）
+        self.persist_interval = persist_interval
+        self._pending_ops: Dict[str, List[Dict]] = {}
+        self._pending_samples: Dict[str, Dict[str, Dict]] = {}
+        self._dirty_since: Dict[str, float] = {}
+        self._writer_cond = threading.Condition()
+        self._writer_thread = None
+        self._closed = False
+        
         self._load_datasets()
+        
+        if self.persist_interval > 0:
+            self._writer_thread = threading.Thread(
+                target=self._writer_loop, name="dataset-writer", daemon=True
+            )
+            self._writer_thread.start()
+        atexit.register(self.close)
     
     def _load_datasets(self):
-        """加载所有数据集"""
-        # print(f"🔍 开始加载数据集，数据目录: {self.data_dir}")
-        
-        if not os.path.exists(self.data_dir):
-            # print(f"📁 数据目录不存在，创建目录: {self.data_dir}")
-            os.makedirs(self.data_dir)
+        """加载数据集清单；清单缺失或与存储不一致的数据集立即完整加载"""
+        started = time.monotonic()
+        if self.storage.initialize():
             self._create_sample_data()
             return
         
-        # print(f"📁 数据目录存在，开始扫描文件...")
+        manifest = self._read_manifest() if self.lazy_load else {}
+        parsed = 0
+        for dataset_id in self.storage.list_datasets():
+            entry = manifest.get(dataset_id)
+            signature = self.storage.dataset_signature(dataset_id)
+            if self.process_safe:
+                self._generations[dataset_id] = self._file_lock(dataset_id).read_generation()
+            if entry is not None and signature is not None and entry.get('signature') == signature:
+                self._catalog[dataset_id] = entry
+                if not entry.get('skipped'):
+                    self.statistics.import_dataset(dataset_id, entry.get('statistics', {}))
+                    for sample_id in entry.get('sample_ids', []):
+                        self._sample_owner.setdefault(sample_id, dataset_id)
+                continue
+            try:
+                # 持有跨进程锁回放并截断片段日志，避免与其他进程的写入交错
+                with self._locked_for_write([dataset_id]):
+                    if dataset_id not in self._loaded:
+                        self._load_dataset(dataset_id)
+                parsed += 1
+            except Exception as e:
+                print(f"❌ 加载数据集失败 {dataset_id}: {e}")
         
-        # 加载数据集文件
-        for filename in os.listdir(self.data_dir):
-            # print(f"📄 发现文件: {filename}")
-            if filename.endswith('.json') and not filename.endswith('_segments.json'):
-                # 检查文件内容，判断是否为数据集文件
-                filepath = os.path.join(self.data_dir, filename)
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        content = json.load(f)
-                        # 检查是否包含数据集必需字段
-                        if isinstance(content, dict) and 'id' in content and 'samples' in content:
-                            dataset_id = filename.replace('.json', '')
-                            self.datasets[dataset_id] = content
-                            # print(f"✅ 加载数据集文件: {filename} -> {dataset_id}")
-                        elif isinstance(content, list) and len(content) > 0:
-                            # 处理EgoExo4D格式的数据
-                            dataset_id = filename.replace('.json', '')
-                            # 转换为标准格式
-                            converted_data = self._convert_egoexo4d_format(content, dataset_id)
-                            self.datasets[dataset_id] = converted_data
-                            # print(f"✅ 转换并加载EgoExo4D数据集: {filename} -> {dataset_id}")
-                        else:
-                            print(f"⚠️ 跳过非数据集文件: {filename}")
-                except Exception as e:
-                    print(f"❌ 加载数据集失败 {filename}: {e}")
-        
-        # 加载片段文件
-        for filename in os.listdir(self.data_dir):
-            if filename.endswith('.json') and 'segments' in filename:
-                dataset_id = filename.replace('_segments.json', '')
-                filepath = os.path.join(self.data_dir, filename)
-                # print(f"✅ 加载片段文件: {filename} -> {dataset_id}")
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        self.segments[dataset_id] = json.load(f)
-                        # print(f"✅ 成功加载片段: {dataset_id}")
-                except Exception as e:
-                    print(f"❌ 加载片段失败 {dataset_id}: {e}")
+        if self.lazy_load and parsed:
+            self._save_manifest()
         
-        print(f"📊 数据集加载完成: {len(self.datasets)} 个数据集, {len(self.segments)} 个片段文件")
+        self.startup_seconds = time.monotonic() - started
+        if self.lazy_load:
+            print(f"📊 数据集加载完成: {len(self._dataset_ids())} 个数据集（解析 {parsed} 个，"
+                  f"其余按需加载），耗时 {self.startup_seconds:.2f} 秒")
+        else:
+            print(f"📊 数据集加载完成: {len(self._dataset_ids())} 个数据集，耗时 {self.startup_seconds:.2f} 秒")
+        if self.startup_seconds > self.STARTUP_TARGET_SECONDS:
+            print(f"⚠️ 启动耗时超过目标 {self.STARTUP_TARGET_SECONDS} 秒")
+    
+    def _read_manifest(self) -> Dict[str, Dict]:
+        try:
+            with open(self._manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get('version') != self.MANIFEST_VERSION:
+            return {}
+        return manifest.get('datasets', {})
+    
+    def _save_manifest(self):
+        """原子写入数据集清单（签名不一致的条目在下次启动时会被忽略）"""
+        try:
+            write_json_atomic(self._manifest_path, {
+                'version': self.MANIFEST_VERSION,
+                'datasets': dict(self._catalog)
+            }, indent=None)
+        except Exception as e:
+            print(f"⚠️ 保存数据集清单失败: {e}")
+    
+    def _summarize(self, dataset_id: str, signature: Optional[List]) -> Dict:
+        """根据已加载的数据生成清单条目"""
+        dataset = self.datasets.get(dataset_id)
+        samples = dataset.get('samples', []) if dataset else []
+        annotators = {}
+        for sample in samples:
+            if sample.get('assigned_to') is not None:
+                annotators[sample['assigned_to']] = annotators.get(sample['assigned_to'], 0) + 1
+        return {
+            'name': dataset.get('name', 'Unknown') if dataset else None,
+            'description': dataset.get('description', '') if dataset else '',
+            'has_dataset': dataset is not None,
+            'sample_count': len(samples),
+            'annotators': annotators,
+            'sample_ids': [sample.get('id') for sample in samples],
+            'statistics': self.statistics.export_dataset(dataset_id),
+            'signature': signature
+        }
+    
+    def _load_dataset(self, dataset_id: str):
+        """从存储完整加载一个数据集（调用方持有写锁及跨进程锁）"""
+        # 签名需在读取之前获取：读取期间文件若被修改，下次启动会因签名不一致而重新解析
+        signature = self.storage.dataset_signature(dataset_id)
+        dataset, segments_data = self.storage.load_dataset(dataset_id, self._convert_egoexo4d_format)
+        if dataset is None and segments_data is None:
+            print(f"⚠️ 跳过非数据集文件: {dataset_id}")
+            self._catalog[dataset_id] = {'skipped': True, 'signature': signature}
+            return
+        if segments_data is None:
+            # 为数据集确保有segment文件
+            segments_data = {'segments': []}
+            self.storage.ensure_segments(dataset_id, segments_data)
         
-        # 为所有数据集确保有segment文件
-        for dataset_id in self.datasets.keys():
-            if dataset_id not in self.segments:
-                self.segments[dataset_id] = {'segments': []}
-                # 创建空的segment文件
-                filepath = os.path.join(self.data_dir, f"{dataset_id}_segments.json")
-                try:
-                    with open(filepath, 'w', encoding='utf-8') as f:
-                        json.dump({'segments': []}, f, ensure_ascii=False, indent=2)
-                    print(f"📝 为数据集 {dataset_id} 创建空的segment文件")
-                except Exception as e:
-                    print(f"⚠️ 创建segment文件失败 {dataset_id}: {e}")
+        self.statistics.clear_dataset(dataset_id)
+        if dataset is not None:
+            self.datasets[dataset_id] = dataset
+            self._reapply_pending_samples(dataset_id)
+            self.index.add_samples(dataset_id, dataset.get('samples', []))
+            for sample in dataset.get('samples', []):
+                self.statistics.add_sample(dataset_id, sample)
+                self._sample_owner.setdefault(sample.get('id'), dataset_id)
+        else:
+            self.datasets.pop(dataset_id, None)
+        self.segments[dataset_id] = segments_data
+        for op in self._pending_ops.get(dataset_id, []):
+            apply_segment_op(segments_data, op)
+        for position, segment in enumerate(segments_data.get('segments', [])):
+            self.index.add_segment(dataset_id, segment, position)
+            self.statistics.add_segment(dataset_id, segment, self._segment_annotator(segment))
         
-        # print(f"📋 数据集ID列表: {list(self.datasets.keys())}")
+        self._loaded.add(dataset_id)
+        self._last_access[dataset_id] = time.monotonic()
+        self._catalog[dataset_id] = self._summarize(dataset_id, signature)
+        if self.process_safe:
+            self._generations[dataset_id] = self._file_lock(dataset_id).read_generation()
+        self.storage.on_dataset_loaded(dataset_id)
+    
+    def _ensure_loaded(self, dataset_id: str) -> bool:
+        """确保数据集已加载（首次访问时解析），返回数据集是否存在"""
+        entry = self._catalog.get(dataset_id)
+        if entry is None or entry.get('skipped'):
+            return False
+        if dataset_id in self._loaded:
+            self._last_access[dataset_id] = time.monotonic()
+            return True
+        with self._locked_for_write([dataset_id]):
+            if dataset_id not in self._loaded:
+                started = time.monotonic()
+                self._load_dataset(dataset_id)
+                print(f"📂 按需加载数据集 {dataset_id}，耗时 {time.monotonic() - started:.2f} 秒")
+        self.unload_idle_datasets(keep=dataset_id)
+        return dataset_id in self._loaded
+    
+    def _ensure_all_loaded(self):
+        for dataset_id in self._dataset_ids():
+            self._ensure_loaded(dataset_id)
+    
+    def unload_idle_datasets(self, keep: Optional[str] = None) -> int:
+        """卸载超过 idle_unload_seconds 未访问、且没有待写修改的数据集（keep 除外），返回卸载数量"""
+        if self.idle_unload_seconds is None:
+            return 0
+        now = time.monotonic()
+        idle = [dataset_id for dataset_id in list(self._loaded)
+                if dataset_id != keep and now - self._last_access.get(dataset_id, now) >= self.idle_unload_seconds]
+        unloaded = 0
+        for dataset_id in idle:
+            with self._locked_for_write([dataset_id]):
+                if dataset_id not in self._loaded or self._has_pending(dataset_id):
+                    continue
+                if time.monotonic() - self._last_access.get(dataset_id, now) < self.idle_unload_seconds:
+                    continue
+                self._catalog[dataset_id] = self._summarize(dataset_id, self.storage.dataset_signature(dataset_id))
+                self.index.remove_dataset(dataset_id, self.datasets.get(dataset_id), self.segments.get(dataset_id))
+                self.datasets.pop(dataset_id, None)
+                self.segments.pop(dataset_id, None)
+                self.storage.release_dataset(dataset_id)
+                self._loaded.discard(dataset_id)
+                self._last_access.pop(dataset_id, None)
+                unloaded += 1
+        if unloaded:
+            self._save_manifest()
+            print(f"💤 已卸载 {unloaded} 个空闲数据集")
+        return unloaded
+    
+    def _has_pending(self, dataset_id: str) -> bool:
+        with self._writer_cond:
+            dirty = dataset_id in self._dirty_since
+        return dirty or bool(self._pending_ops.get(dataset_id)) or bool(self._pending_samples.get(dataset_id))
+    
+    def _dataset_ids(self) -> List[str]:
+        return [dataset_id for dataset_id, entry in self._catalog.items() if not entry.get('skipped')]
+    
+    def _rw_lock(self, dataset_id: str) -> ReadWriteLock:
+        with self._lock:
+            if dataset_id not in self._dataset_locks:
+                self._dataset_locks[dataset_id] = ReadWriteLock()
+            return self._dataset_locks[dataset_id]
+    
+    def _file_lock(self, dataset_id: str) -> InterProcessLock:
+        with self._lock:
+            if dataset_id not in self._file_locks:
+                os.makedirs(self._locks_dir, exist_ok=True)
+                self._file_locks[dataset_id] = InterProcessLock(
+                    os.path.join(self._locks_dir, f"{dataset_id}.lock"),
+                    os.path.join(self._locks_dir, f"{dataset_id}.generation")
+                )
+            return self._file_locks[dataset_id]
+    
+    @contextmanager
+    def _locked_for_write(self, dataset_ids: Iterable[str]):
+        """按ID顺序获取数据集写锁（及跨进程锁），并在修改前加载其他进程的修改"""
+        with ExitStack() as stack:
+            for dataset_id in sorted(set(dataset_ids)):
+                stack.enter_context(self._rw_lock(dataset_id).write_locked())
+                if self.process_safe:
+                    stack.enter_context(self._file_lock(dataset_id).locked())
+                    self._reload_if_stale(dataset_id)
+            yield
+    
+    @contextmanager
+    def _locked_for_read(self, dataset_ids: Iterable[str]):
+        """获取数据集读锁，读取前先同步其他进程的修改"""
+        dataset_ids = sorted(set(dataset_ids))
+        self._sync(dataset_ids)
+        with ExitStack() as stack:
+            for dataset_id in dataset_ids:
+                stack.enter_context(self._rw_lock(dataset_id).read_locked())
+            yield
+    
+    @contextmanager
+    def _locked_if_current(self, dataset_id: str):
+        """持有写锁（及跨进程锁）但不重新加载，返回内存中的数据是否已加载且为最新；
+        供存储后端压缩日志（过期时由最新的进程压缩）和退出时更新清单使用"""
+        with self._rw_lock(dataset_id).write_locked():
+            if not self.process_safe:
+                yield dataset_id in self._loaded
+                return
+            file_lock = self._file_lock(dataset_id)
+            with file_lock.locked():
+                yield (dataset_id in self._loaded
+                       and file_lock.read_generation() == self._generations.get(dataset_id, 0))
+    
+    def _sync(self, dataset_ids: Optional[Iterable[str]] = None):
+        """检查其他进程是否修改过数据集，过期的重新加载"""
+        if not self.process_safe:
+            return
+        for dataset_id in (self._dataset_ids() if dataset_ids is None else dataset_ids):
+            if self._file_lock(dataset_id).read_generation() != self._generations.get(dataset_id, 0):
+                with self._locked_for_write([dataset_id]):
+                    pass
+    
+    def _reload_if_stale(self, dataset_id: str):
+        """在持有写锁和跨进程锁时调用：代数变化说明其他进程修改过，从存储重新加载该数据集"""
+        generation = self._file_lock(dataset_id).read_generation()
+        if generation == self._generations.get(dataset_id, 0):
+            return
+        
+        if dataset_id in self._loaded:
+            # JSON后端与管理器共享片段字典，需在加载覆盖之前移除旧索引
+            self.index.remove_dataset(dataset_id, self.datasets.get(dataset_id), self.segments.get(dataset_id))
+        # 未加载的数据集清单中的计数也已过期，同样需要完整加载
+        self._load_dataset(dataset_id)
+        self._generations[dataset_id] = generation
+        self.changes.record('dataset', 'reload', dataset_id)
+        print(f"🔄 数据集 {dataset_id} 已被其他进程修改，已重新加载")
+    
+    def _reapply_pending_samples(self, dataset_id: str):
+        """重新加载后，把本进程尚未写入的样本修改覆盖到新加载的样本上"""
+        pending = self._pending_samples.get(dataset_id)
+        if not pending:
+            return
+        for sample in self.datasets[dataset_id].get('samples', []):
+            changed = pending.get(sample.get('id'))
+            if changed is not None and changed is not sample:
+                sample.clear()
+                sample.update(changed)
+                pending[sample.get('id')] = sample
+    
+    def _mark_changed(self, dataset_id: str):
+        """修改已持久化，递增代数通知其他进程（调用方持有跨进程锁）"""
+        if self.process_safe:
+            self._generations[dataset_id] = self._file_lock(dataset_id).bump_generation()
+    
+    def _dataset_of_sample(self, sample_id: str) -> Optional[str]:
+        """查找样本所在数据集并确保其已加载；只同步所在数据集，未知样本才同步全部数据集"""
+        dataset_id = self._sample_owner.get(sample_id)
+        if dataset_id is None:
+            # 可能是其他进程新建的样本
+            self._sync()
+            dataset_id = self._sample_owner.get(sample_id)
+        else:
+            self._sync([dataset_id])
+        if dataset_id is None or not self._ensure_loaded(dataset_id):
+            return None
+        sample_entry = self.index.get_sample(sample_id)
+        return sample_entry[0] if sample_entry else None
+    
+    def _dataset_of_segment(self, segment_id: str, load_all: bool = True) -> Optional[str]:
+        """查找片段所在数据集；清单中不含片段ID，未找到时逐个加载尚未加载的数据集
+        （load_all=False 时只在已加载的数据集中查找）；只同步所在数据集，未找到时才同步其余数据集"""
+        location = self.index.get_segment_location(segment_id)
+        if location:
+            self._sync([location[0]])
+            # 重新加载后片段可能已被其他进程删除
+            location = self.index.get_segment_location(segment_id)
+        if not location:
+            self._sync(None if load_all else list(self._loaded))
+            location = self.index.get_segment_location(segment_id)
+        if location:
+            self._ensure_loaded(location[0])
+            return location[0]
+        if not load_all:
+            return None
+        for dataset_id in self._dataset_ids():
+            if dataset_id in self._loaded:
+                continue
+            self._ensure_loaded(dataset_id)
+            location = self.index.get_segment_location(segment_id)
+            if location:
+                return location[0]
+        return None
+    
+    def get_sample(self, sample_id: str) -> Optional[Tuple[str, Dict]]:
+        """按ID查找样本，返回 (dataset_id, sample)，所在数据集未加载时先加载"""
+        dataset_id = self._dataset_of_sample(sample_id)
+        if not dataset_id:
+            return None
+        return self.index.get_sample(sample_id)
+    
+    def _persist_segments(self, dataset_id: str, op: Dict):
+        """持久化一次片段修改（开启后台写入时只记录，由写入线程合并写入）"""
+        if self.persist_interval > 0 and not self._closed:
+            self._pending_ops.setdefault(dataset_id, []).append(op)
+            self._mark_dirty(dataset_id)
+            return
+        self.storage.save_segment_op(dataset_id, op)
+        self._mark_changed(dataset_id)
+    
+    def _mark_dirty(self, dataset_id: str):
+        with self._writer_cond:
+            self._dirty_since.setdefault(dataset_id, time.monotonic())
+            self._writer_cond.notify()
+    
+    def _writer_loop(self):
+        """后台写入线程：数据集变脏 persist_interval 秒后写入，期间的修改合并为一次写入"""
+        while True:
+            with self._writer_cond:
+                due = []
+                while not self._closed:
+                    now = time.monotonic()
+                    due = [dataset_id for dataset_id, since in self._dirty_since.items()
+                           if now - since >= self.persist_interval]
+                    if due:
+                        break
+                    timeout = None
+                    if self._dirty_since:
+                        timeout = min(self._dirty_since.values()) + self.persist_interval - now
+                    self._writer_cond.wait(timeout)
+                if self._closed:
+                    return
+                for dataset_id in due:
+                    del self._dirty_since[dataset_id]
+            
+            for dataset_id in due:
+                self._flush_dataset(dataset_id)
+    
+    def _flush_dataset(self, dataset_id: str) -> bool:
+        """写入一个数据集积累的修改，失败时保留待写内容等待下次重试"""
+        with self._locked_for_write([dataset_id]):
+            ops = self._pending_ops.pop(dataset_id, [])
+            samples = self._pending_samples.pop(dataset_id, {})
+            if not ops and not samples:
+                return True
+            try:
+                if ops:
+                    self.storage.save_segment_ops(dataset_id, ops)
+                if samples:
+                    self.storage.save_dataset(dataset_id, self.datasets[dataset_id], list(samples.values()))
+                self._mark_changed(dataset_id)
+                return True
+            except Exception as e:
+                print(f"❌ 保存数据集失败 {dataset_id}: {e}")
+                self._pending_ops[dataset_id] = ops + self._pending_ops.get(dataset_id, [])
+                self._pending_samples[dataset_id] = {**samples, **self._pending_samples.get(dataset_id, {})}
+                self._mark_dirty(dataset_id)
+                return False
+    
+    def flush(self) -> bool:
+        """立即写入所有尚未写入的修改"""
+        with self._writer_cond:
+            dataset_ids = list(self._dirty_since)
+            self._dirty_since.clear()
+        success = True
+        for dataset_id in dataset_ids:
+            success = self._flush_dataset(dataset_id) and success
+        return success
+    
+    def close(self):
+        """停止后台写入线程，写入剩余修改并更新数据集清单（进程退出时自动调用）"""
+        with self._writer_cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._writer_cond.notify()
+        if self._writer_thread is not None:
+            self._writer_thread.join()
+        self.flush()
+        if self.lazy_load:
+            for dataset_id in list(self._loaded):
+                with self._locked_if_current(dataset_id) as is_current:
+                    if is_current:
+                        self._catalog[dataset_id] = self._summarize(
+                            dataset_id, self.storage.dataset_signature(dataset_id)
+                        )
+            self._save_manifest()
+        self.storage.close()
+    
+    def compact_segment_journals(self):
+        """把尚未合并的修改写入主存储（JSON后端压缩片段日志，例如在退出前调用）"""
+        self.flush()
+        self.storage.flush()
     
     def _convert_egoexo4d_format(self, egoexo4d_data: List[Dict], dataset_id: str) -> Dict:
         """将EgoExo4D格式转换为标准数据集格式"""
@@ -209,11 +627,8 @@ class DatasetManager:
         }
         
         # 保存示例数据
-        with open(os.path.join(self.data_dir, "test_dataset.json"), 'w', encoding='utf-8') as f:
-            json.dump(sample_dataset, f, ensure_ascii=False, indent=2)
-        
-        with open(os.path.join(self.data_dir, "test_dataset_segments.json"), 'w', encoding='utf-8') as f:
-            json.dump(sample_segments, f, ensure_ascii=False, indent=2)
+        self.storage.save_dataset("test_dataset", sample_dataset)
+        self.storage.save_segments("test_dataset", sample_segments)
         
         # 重新加载数据
         self._load_datasets()
@@ -223,77 +638,201 @@ class DatasetManager:
         if not annotator:
             return []
         
+        with self._locked_for_read(self._dataset_ids()):
+            return self._collect_annotator_datasets(annotator)
+    
+    def _collect_annotator_datasets(self, annotator: str) -> List[Dict]:
         result = []
-        for dataset_id, dataset in self.datasets.items():
-            # 检查是否有分配给该标注者的样本
-            has_assigned_samples = any(
-                sample.get('assigned_to') == annotator 
-                for sample in dataset.get('samples', [])
-            )
+        annotator_samples = self.index.get_annotator_samples(annotator)
+        for dataset_id in self._dataset_ids():
+            if dataset_id in self.datasets:
+                dataset = self.datasets[dataset_id]
+                name = dataset.get('name', 'Unknown')
+                description = dataset.get('description', '')
+                sample_count = len(dataset.get('samples', []))
+                assigned_count = len(annotator_samples.get(dataset_id, []))
+            else:
+                # 未加载的数据集使用清单中的概要信息
+                entry = self._catalog[dataset_id]
+                if not entry.get('has_dataset'):
+                    continue
+                name = entry.get('name', 'Unknown')
+                description = entry.get('description', '')
+                sample_count = entry.get('sample_count', 0)
+                assigned_count = entry.get('annotators', {}).get(annotator, 0)
             
-            if has_assigned_samples:
+            # 检查是否有分配给该标注者的样本
+            if assigned_count:
                 result.append({
                     'id': dataset_id,
-                    'name': dataset.get('name', 'Unknown'),
-                    'description': dataset.get('description', ''),
-                    'sample_count': len(dataset.get('samples', [])),
-                    'assigned_sample_count': len([
-                        s for s in dataset.get('samples', [])
-                        if s.get('assigned_to') == annotator
-                    ])
+                    'name': name,
+                    'description': description,
+                    'sample_count': sample_count,
+                    'assigned_sample_count': assigned_count
                 })
         
         return result
     
     def get_samples_for_dataset(self, dataset_id: str, annotator: str) -> List[Dict]:
-        """获取指定数据集的样本列表，按审阅状态排序"""
-        if dataset_id not in self.datasets:
+        """获取指定数据集的样本列表，按审阅状态排序（返回新列表，不改变数据集中的顺序）"""
+        if not self._ensure_loaded(dataset_id):
             return []
         
-        dataset = self.datasets[dataset_id]
-        samples = dataset.get('samples', [])
+        with self._locked_for_read([dataset_id]):
+            dataset = self.datasets.get(dataset_id)
+            if dataset is None:
+                return []
+            samples = dataset.get('samples', [])
+            
+            # 过滤指定标注者的样本
+            if annotator:
+                samples = self.index.get_annotator_samples(annotator).get(dataset_id, [])
+            
+            # 按审阅状态排序：审阅中 -> 未审阅 -> 已审阅
+            status_order = {'审阅中': 0, '未审阅': 1, '已审阅': 2}
+            return sorted(samples, key=lambda x: status_order.get(x.get('review_status', '未审阅'), 1))
+    
+    def _status_groups(self, buckets, dataset_id: str, annotator: Optional[str], status: Optional[str],
+                       status_order: Dict[str, int], default_status: str, by_status: bool) -> List[List[tuple]]:
+        """选出数据集/标注者/状态匹配的分桶；by_status 时按状态排序分组，否则全部归为一组按原顺序归并"""
+        annotator_key = annotator or ALL_ANNOTATORS
+        default_rank = status_order.get(default_status, 0)
+        keys = buckets.keys(lambda key: key[0] == dataset_id and key[1] == annotator_key and (
+            status is None or (key[2] if key[2] is not None else default_status) == status))
+        if not by_status:
+            return [keys] if keys else []
+        groups = {}
+        for key in keys:
+            groups.setdefault(status_order.get(key[2], default_rank), []).append(key)
+        return [groups[rank] for rank in sorted(groups)]
+    
+    @staticmethod
+    def _page_bounds(page: int, page_size: Optional[int]) -> Tuple[int, int, Optional[int]]:
+        """规范化页码与页大小，返回 (page, offset, page_size)；page_size 为None表示不分页"""
+        page = max(1, int(page or 1))
+        if page_size is None:
+            return 1, 0, None
+        page_size = min(max(1, int(page_size)), DatasetManager.MAX_PAGE_SIZE)
+        return page, (page - 1) * page_size, page_size
+    
+    @staticmethod
+    def _in_duration(duration, min_duration: Optional[float], max_duration: Optional[float]) -> bool:
+        if not isinstance(duration, (int, float)):
+            return False
+        if min_duration is not None and duration < min_duration:
+            return False
+        if max_duration is not None and duration > max_duration:
+            return False
+        return True
+    
+    def _paginate(self, buckets, groups: List[List[tuple]], offset: int, page_size: Optional[int],
+                  matches=None, sort_key=None, reverse: bool = False) -> Tuple[List[Dict], int]:
+        """从分桶中取一页；有额外过滤条件或非索引排序时退化为扫描候选集"""
+        if matches is None and sort_key is None:
+            return buckets.page(groups, offset, page_size)
+        candidates = buckets.iter_groups(groups)
+        if matches is not None:
+            candidates = (item for item in candidates if matches(item))
+        candidates = list(candidates)
+        if sort_key is not None:
+            candidates.sort(key=sort_key, reverse=reverse)
+        stop = None if page_size is None else offset + page_size
+        return candidates[offset:stop], len(candidates)
+    
+    def query_samples(self, dataset_id: str, annotator: Optional[str] = None, page: int = 1,
+                      page_size: Optional[int] = None, review_status: Optional[str] = None,
+                      min_duration: Optional[float] = None, max_duration: Optional[float] = None,
+                      sort: str = 'status') -> Dict:
+        """分页查询样本，返回 {'items', 'total', 'page', 'page_size'}
+        
+        默认按审阅状态排序（与 get_samples_for_dataset 一致），sort='dataset' 保持数据集中的顺序，
+        'name'/'-name' 按名称排序；时长过滤使用样本的 duration 字段，没有该字段的样本不会匹配。
+        """
+        if sort not in self.SAMPLE_SORTS:
+            raise ValueError(f"不支持的排序方式: {sort}")
+        page, offset, page_size = self._page_bounds(page, page_size)
+        result = {'items': [], 'total': 0, 'page': page, 'page_size': page_size}
+        if not self._ensure_loaded(dataset_id):
+            return result
         
-        # 过滤指定标注者的样本
-        if annotator:
-            samples = [s for s in samples if s.get('assigned_to') == annotator]
+        matches = None
+        if min_duration is not None or max_duration is not None:
+            matches = lambda sample: self._in_duration(sample.get('duration'), min_duration, max_duration)
+        sort_key = None
+        if sort in ('name', '-name'):
+            sort_key = lambda sample: str(sample.get('name', ''))
+        
+        with self._locked_for_read([dataset_id]):
+            groups = self._status_groups(self.index.sample_buckets, dataset_id, annotator, review_status,
+                                         self.SAMPLE_STATUS_ORDER, '未审阅', sort == 'status')
+            items, total = self._paginate(self.index.sample_buckets, groups, offset, page_size,
+                                          matches, sort_key, sort == '-name')
+        result.update(items=items, total=total)
+        return result
+    
+    def query_segments(self, dataset_id: str, annotator: Optional[str] = None, page: int = 1,
+                       page_size: Optional[int] = None, status: Optional[str] = None,
+                       min_duration: Optional[float] = None, max_duration: Optional[float] = None,
+                       sort: str = 'status') -> Dict:
+        """分页查询片段，返回 {'items', 'total', 'page', 'page_size'}
         
-        # 按审阅状态排序：审阅中 -> 未审阅 -> 已审阅
-        status_order = {'审阅中': 0, '未审阅': 1, '已审阅': 2}
-        samples.sort(key=lambda x: status_order.get(x.get('review_status', '未审阅'), 1))
+        默认按状态排序（与 get_segments_for_dataset_sorted 一致），sort='created' 保持创建顺序，
+        'start_time' 按开始时间，'duration'/'-duration' 按时长排序；annotator 按片段所属样本的标注者过滤。
+        """
+        if sort not in self.SEGMENT_SORTS:
+            raise ValueError(f"不支持的排序方式: {sort}")
+        page, offset, page_size = self._page_bounds(page, page_size)
+        result = {'items': [], 'total': 0, 'page': page, 'page_size': page_size}
+        if not self._ensure_loaded(dataset_id):
+            return result
         
-        return samples
+        duration = lambda segment: (segment.get('end_time') or 0) - (segment.get('start_time') or 0)
+        matches = None
+        if min_duration is not None or max_duration is not None:
+            matches = lambda segment: self._in_duration(duration(segment), min_duration, max_duration)
+        sort_key = None
+        if sort == 'start_time':
+            sort_key = lambda segment: segment.get('start_time') or 0
+        elif sort in ('duration', '-duration'):
+            sort_key = duration
+        
+        with self._locked_for_read([dataset_id]):
+            groups = self._status_groups(self.index.segment_buckets, dataset_id, annotator, status,
+                                         self.SEGMENT_STATUS_ORDER, '待抉择', sort == 'status')
+            items, total = self._paginate(self.index.segment_buckets, groups, offset, page_size,
+                                          matches, sort_key, sort == '-duration')
+        result.update(items=items, total=total)
+        return result
     
     def get_segments_for_dataset(self, dataset_id: str) -> List[Dict]:
         """获取指定数据集的片段列表（不自动排序）"""
-        if dataset_id not in self.segments:
+        if not self._ensure_loaded(dataset_id):
             return []
         
-        segments = self.segments[dataset_id].get('segments', [])
-        return segments.copy()  # 返回副本，不修改原数据
+        with self._locked_for_read([dataset_id]):
+            segments = self.segments.get(dataset_id, {}).get('segments', [])
+            return segments.copy()  # 返回副本，不修改原数据
     
     def get_segments_for_dataset_sorted(self, dataset_id: str) -> List[Dict]:
         """获取指定数据集的片段列表（按状态排序）"""
-        if dataset_id not in self.segments:
+        if not self._ensure_loaded(dataset_id):
             return []
         
-        segments = self.segments[dataset_id].get('segments', [])
-        
-        # 按状态排序：待抉择 -> 选用 -> 弃用
-        status_order = {'待抉择': 0, '选用': 1, '弃用': 2}
-        sorted_segments = segments.copy()
+        with self._locked_for_read([dataset_id]):
+            segments = self.segments.get(dataset_id, {}).get('segments', [])
+            
+            # 按状态排序：待抉择 -> 选用 -> 弃用
+            status_order = {'待抉择': 0, '选用': 1, '弃用': 2}
+            sorted_segments = segments.copy()
         sorted_segments.sort(key=lambda x: status_order.get(x.get('status', '待抉择'), 0))
         
         return sorted_segments
     
     def get_segments_for_sample(self, sample_id: str) -> List[Dict]:
         """获取指定样本的片段列表"""
-        result = []
-        for dataset_segments in self.segments.values():
-            sample_segments = [
-                s for s in dataset_segments.get('segments', [])
-                if s.get('sample_id') == sample_id
-            ]
-            result.extend(sample_segments)
+        dataset_id = self._dataset_of_sample(sample_id)
+        with self._locked_for_read([dataset_id] if dataset_id else []):
+            result = list(self.index.get_segments_for_sample(sample_id))
         
         # 按状态排序
         status_order = {'待抉择': 0, '选用': 1, '弃用': 2}
@@ -301,6 +840,14 @@ class DatasetManager:
         
         return result
     
+    def _find_segment(self, segment_id: str):
+        """通过索引查找片段，返回 (dataset_id, position, segment)"""
+        location = self.index.get_segment_location(segment_id)
+        if location is None:
+            return None
+        dataset_id, position = location
+        return dataset_id, position, self.segments[dataset_id]['segments'][position]
+    
     def create_segment(self, segment_data: Dict) -> bool:
         """创建新片段"""
         try:
@@ -308,64 +855,236 @@ class DatasetManager:
             if not sample_id:
                 return False
             
-            # 找到对应的数据集
-            dataset_id = None
-            for ds_id, dataset in self.datasets.items():
-                if any(s.get('id') == sample_id for s in dataset.get('samples', [])):
-                    dataset_id = ds_id
-                    break
-            
+            dataset_id = self._dataset_of_sample(sample_id)
             if not dataset_id:
                 return False
             
-            # 添加创建时间
-            segment_data['created_at'] = datetime.now().isoformat()
-            
-            # 确保数据集有片段数据结构
-            if dataset_id not in self.segments:
-                self.segments[dataset_id] = {'segments': []}
-            
-            # 添加新片段
-            self.segments[dataset_id]['segments'].append(segment_data)
-            
-            # 保存到文件
-            filepath = os.path.join(self.data_dir, f"{dataset_id}_segments.json")
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(self.segments[dataset_id], f, ensure_ascii=False, indent=2)
+            with self._locked_for_write([dataset_id]):
+                # 找到对应的数据集
+                sample_entry = self.index.get_sample(sample_id)
+                if not sample_entry:
+                    return False
+                dataset_id = sample_entry[0]
+                
+                # 添加创建时间
+                segment_data['created_at'] = datetime.now().isoformat()
+                
+                # 确保数据集有片段数据结构
+                if dataset_id not in self.segments:
+                    self.segments[dataset_id] = {'segments': []}
+                
+                # 添加新片段
+                dataset_segments = self.segments[dataset_id]['segments']
+                dataset_segments.append(segment_data)
+                self.index.add_segment(dataset_id, segment_data, len(dataset_segments) - 1)
+                self.statistics.add_segment(dataset_id, segment_data, self._segment_annotator(segment_data))
+                
+                # 保存修改
+                self._persist_segments(dataset_id, {'op': 'create', 'segment': segment_data})
+                self.changes.record('segment', 'create', dataset_id, segment_data.get('id'), segment_data)
             
             return True
         except Exception as e:
             print(f"Error creating segment: {e}")
             return False
     
+    def _validate_new_segment(self, segment_data: Dict, pending_ids: set) -> Optional[str]:
+        """校验待创建片段，返回错误信息（无错误返回None）"""
+        segment_id = segment_data.get('id')
+        if not segment_id:
+            return '缺少片段ID'
+        if segment_id in pending_ids or self.index.get_segment_location(segment_id):
+            return f'片段ID重复: {segment_id}'
+        if not self.index.get_sample(segment_data.get('sample_id')):
+            return f'样本不存在: {segment_data.get("sample_id")}'
+        start_time = segment_data.get('start_time')
+        end_time = segment_data.get('end_time')
+        if not isinstance(start_time, (int, float)) or not isinstance(end_time, (int, float)):
+            return '开始/结束时间必须为数字'
+        if start_time < 0 or end_time <= start_time:
+            return '时间范围无效'
+        return None
+    
+    def create_segments(self, segments_data: List[Dict]) -> Dict:
+        """批量创建片段：全部校验通过后一次性插入，每个数据集只持久化一次"""
+        try:
+            dataset_ids = set()
+            for segment_data in segments_data:
+                dataset_id = self._dataset_of_sample(segment_data.get('sample_id'))
+                if dataset_id:
+                    dataset_ids.add(dataset_id)
+            
+            with self._locked_for_write(dataset_ids):
+                # 先校验全部片段，任何一个失败则不插入
+                errors = []
+                pending_ids = set()
+                for i, segment_data in enumerate(segments_data):
+                    error = self._validate_new_segment(segment_data, pending_ids)
+                    if error:
+                        errors.append({'index': i, 'id': segment_data.get('id'), 'error': error})
+                    pending_ids.add(segment_data.get('id'))
+                
+                if errors:
+                    return {'success': False, 'created': 0, 'errors': errors}
+                
+                # 按数据集分组插入
+                created_at = datetime.now().isoformat()
+                created_by_dataset = {}
+                for segment_data in segments_data:
+                    dataset_id = self.index.get_sample(segment_data['sample_id'])[0]
+                    if dataset_id not in dataset_ids:
+                        # 加锁前样本所在数据集被其他进程修改，放弃本次批量创建
+                        return {'success': False, 'created': 0, 'errors': [{'error': '数据已被修改，请重试'}]}
+                    segment_data['created_at'] = created_at
+                    
+                    dataset_segments = self.segments.setdefault(dataset_id, {'segments': []})['segments']
+                    dataset_segments.append(segment_data)
+                    self.index.add_segment(dataset_id, segment_data, len(dataset_segments) - 1)
+                    self.statistics.add_segment(dataset_id, segment_data, self._segment_annotator(segment_data))
+                    created_by_dataset.setdefault(dataset_id, []).append(segment_data)
+                
+                # 每个数据集只保存一次
+                for dataset_id, created in created_by_dataset.items():
+                    self._persist_segments(dataset_id, {'op': 'create_many', 'segments': created})
+                    for segment_data in created:
+                        self.changes.record('segment', 'create', dataset_id, segment_data.get('id'), segment_data)
+            
+            return {'success': True, 'created': len(segments_data), 'errors': []}
+        except Exception as e:
+            print(f"Error creating segments: {e}")
+            return {'success': False, 'created': 0, 'errors': [{'error': str(e)}]}
+    
+    def _validate_segment_update(self, segment: Dict, update_data: Dict) -> Optional[str]:
+        """校验片段更新内容（与创建片段相同的状态和时间规则），返回错误信息（无错误返回None）"""
+        if 'status' in update_data and update_data['status'] not in self.SEGMENT_STATUS_ORDER:
+            return f'片段状态无效: {update_data["status"]}'
+        if 'comment' in update_data and not isinstance(update_data['comment'], str):
+            return '注释必须为字符串'
+        for key in ('start_time', 'end_time'):
+            value = update_data.get(key)
+            if key in update_data and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                return '开始/结束时间必须为数字'
+        if 'start_time' in update_data or 'end_time' in update_data:
+            start_time = update_data.get('start_time', segment.get('start_time'))
+            end_time = update_data.get('end_time', segment.get('end_time'))
+            if start_time < 0 or end_time <= start_time:
+                return '时间范围无效'
+        return None
+    
+    def _apply_segment_update(self, dataset_id: str, segment: Dict, update_data: Dict) -> Dict:
+        """在内存中更新片段并维护统计，返回实际更新的字段"""
+        # 只允许更新状态、时间和注释
+        fields = {
+            key: update_data[key]
+            for key in ('status', 'start_time', 'end_time', 'comment')
+            if key in update_data
+        }
+        annotator = self._segment_annotator(segment)
+        old_status = segment.get('status')
+        self.statistics.remove_segment(dataset_id, segment, annotator)
+        segment.update(fields)
+        self.statistics.add_segment(dataset_id, segment, annotator)
+        if segment.get('status') != old_status:
+            self.index.update_segment_status(dataset_id, segment, old_status)
+        self.changes.record('segment', 'update', dataset_id, segment.get('id'), segment)
+        return fields
+    
     def update_segment(self, segment_id: str, update_data: Dict) -> bool:
         """更新片段信息（状态、时间、注释等）"""
         try:
-            for dataset_id, dataset_segments in self.segments.items():
-                for segment in dataset_segments.get('segments', []):
-                    if segment.get('id') == segment_id:
-                        # 更新状态
-                        if 'status' in update_data:
-                            segment['status'] = update_data['status']
-                        # 更新时间
-                        if 'start_time' in update_data:
-                            segment['start_time'] = update_data['start_time']
-                        if 'end_time' in update_data:
-                            segment['end_time'] = update_data['end_time']
-                        # 更新注释
-                        if 'comment' in update_data:
-                            segment['comment'] = update_data['comment']
-                        
-                        # 保存到文件
-                        filepath = os.path.join(self.data_dir, f"{dataset_id}_segments.json")
-                        with open(filepath, 'w', encoding='utf-8') as f:
-                            json.dump(dataset_segments, f, ensure_ascii=False, indent=2)
-                        return True
-            return False
+            dataset_id = self._dataset_of_segment(segment_id)
+            if not dataset_id:
+                return False
+            
+            with self._locked_for_write([dataset_id]):
+                found = self._find_segment(segment_id)
+                if not found:
+                    return False
+                dataset_id, _, segment = found
+                error = self._validate_segment_update(segment, update_data)
+                if error:
+                    print(f"Error updating segment {segment_id}: {error}")
+                    return False
+                fields = self._apply_segment_update(dataset_id, segment, update_data)
+                
+                # 保存修改
+                self._persist_segments(dataset_id, {'op': 'update', 'id': segment_id, 'fields': fields})
+                return True
         except Exception as e:
             print(f"Error updating segment: {e}")
             return False
     
+    @staticmethod
+    def _valid_update_operation(operation) -> bool:
+        return (isinstance(operation, dict) and isinstance(operation.get('id'), str) and bool(operation['id'])
+                and isinstance(operation.get('patch'), dict))
+    
+    def update_segments(self, operations: List[Dict]) -> List[Dict]:
+        """批量更新片段：在同一把锁内应用全部修改，每个受影响的数据集只持久化一次
+        
+        片段先在已加载的数据集中查找，操作可附带 sample_id 指明所在样本（按需加载其数据集）；
+        仍未找到的片段与 update_segment 一样逐个加载其余数据集查找。
+        每个操作的片段ID和更新内容单独校验，失败的操作在结果中报告，不影响其他操作
+        """
+        results = []
+        updates_by_dataset = {}
+        dataset_ids = set()
+        missing = []
+        for operation in operations:
+            if not self._valid_update_operation(operation):
+                continue
+            dataset_id = self._dataset_of_segment(operation['id'], load_all=False)
+            if not dataset_id and isinstance(operation.get('sample_id'), str):
+                dataset_id = self._dataset_of_sample(operation['sample_id'])
+            if dataset_id:
+                dataset_ids.add(dataset_id)
+            else:
+                missing.append(operation['id'])
+        for segment_id in missing:
+            dataset_id = self._dataset_of_segment(segment_id)
+            if dataset_id:
+                dataset_ids.add(dataset_id)
+        with self._locked_for_write(dataset_ids):
+            for operation in operations:
+                if not isinstance(operation, dict):
+                    results.append({'id': None, 'success': False, 'error': '操作格式无效'})
+                    continue
+                segment_id = operation.get('id')
+                if not isinstance(segment_id, str) or not segment_id:
+                    results.append({'id': None, 'success': False, 'error': '片段ID必须为非空字符串'})
+                    continue
+                patch = operation.get('patch')
+                if not isinstance(patch, dict):
+                    results.append({'id': segment_id, 'success': False, 'error': '缺少更新内容'})
+                    continue
+                
+                found = self._find_segment(segment_id)
+                if not found or found[0] not in dataset_ids:
+                    results.append({'id': segment_id, 'success': False, 'error': '片段不存在'})
+                    continue
+                dataset_id, _, segment = found
+                error = self._validate_segment_update(segment, patch)
+                if error:
+                    results.append({'id': segment_id, 'success': False, 'error': error})
+                    continue
+                
+                fields = self._apply_segment_update(dataset_id, segment, patch)
+                updates_by_dataset.setdefault(dataset_id, []).append({'id': segment_id, 'fields': fields})
+                results.append({'id': segment_id, 'success': True})
+            
+            # 按数据集合并保存
+            for dataset_id, updates in updates_by_dataset.items():
+                try:
+                    self._persist_segments(dataset_id, {'op': 'update_many', 'updates': updates})
+                except Exception as e:
+                    print(f"Error saving segment updates for {dataset_id}: {e}")
+                    failed_ids = {update['id'] for update in updates}
+                    for result in results:
+                        if result['id'] in failed_ids and result['success']:
+                            result.update({'success': False, 'error': f'保存失败: {e}'})
+        
+        return results
+    
     def update_segment_status(self, segment_id: str, status: str) -> bool:
         """更新片段状态（保持向后兼容）"""
         return self.update_segment(segment_id, {'status': status})
@@ -373,20 +1092,31 @@ class DatasetManager:
     def remove_rejected_segments(self, dataset_id: str) -> bool:
         """删除所有弃用的片段"""
         try:
-            if dataset_id not in self.segments:
+            if not self._ensure_loaded(dataset_id):
                 return False
             
-            dataset_segments = self.segments[dataset_id]
-            # 过滤掉弃用的片段
-            dataset_segments['segments'] = [
-                s for s in dataset_segments.get('segments', [])
-                if s.get('status') != '弃用'
-            ]
-            
-            # 保存到文件
-            filepath = os.path.join(self.data_dir, f"{dataset_id}_segments.json")
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(dataset_segments, f, ensure_ascii=False, indent=2)
+            with self._locked_for_write([dataset_id]):
+                dataset_segments = self.segments[dataset_id]
+                # 过滤掉弃用的片段，日志中记录具体ID以保证回放幂等
+                removed = [
+                    s for s in dataset_segments.get('segments', [])
+                    if s.get('status') == '弃用'
+                ]
+                dataset_segments['segments'] = [
+                    s for s in dataset_segments.get('segments', [])
+                    if s.get('status') != '弃用'
+                ]
+                
+                # 更新索引
+                for segment in removed:
+                    self.statistics.remove_segment(dataset_id, segment, self._segment_annotator(segment))
+                    self.index.remove_segment(segment)
+                self.index.reindex_positions(dataset_id, dataset_segments['segments'])
+                
+                # 保存修改
+                self._persist_segments(dataset_id, {'op': 'delete_many', 'ids': [s.get('id') for s in removed]})
+                for segment in removed:
+                    self.changes.record('segment', 'delete', dataset_id, segment.get('id'), segment)
             
             return True
         except Exception as e:
@@ -396,37 +1126,69 @@ class DatasetManager:
     def delete_segment(self, segment_id: str) -> bool:
         """删除指定片段"""
         try:
-            for dataset_id, dataset_segments in self.segments.items():
-                for i, segment in enumerate(dataset_segments.get('segments', [])):
-                    if segment.get('id') == segment_id:
-                        # 删除片段
-                        dataset_segments['segments'].pop(i)
-                        
-                        # 保存到文件
-                        filepath = os.path.join(self.data_dir, f"{dataset_id}_segments.json")
-                        with open(filepath, 'w', encoding='utf-8') as f:
-                            json.dump(dataset_segments, f, ensure_ascii=False, indent=2)
-                        return True
-            return False
+            dataset_id = self._dataset_of_segment(segment_id)
+            if not dataset_id:
+                return False
+            
+            with self._locked_for_write([dataset_id]):
+                found = self._find_segment(segment_id)
+                if not found:
+                    return False
+                dataset_id, position, segment = found
+                
+                # 删除片段并修正其后片段的位置
+                dataset_segments = self.segments[dataset_id]['segments']
+                dataset_segments.pop(position)
+                self.statistics.remove_segment(dataset_id, segment, self._segment_annotator(segment))
+                self.index.remove_segment(segment)
+                self.index.reindex_positions(dataset_id, dataset_segments, position)
+                
+                # 保存修改
+                self._persist_segments(dataset_id, {'op': 'delete', 'id': segment_id})
+                self.changes.record('segment', 'delete', dataset_id, segment_id, segment)
+                return True
         except Exception as e:
             print(f"Error deleting segment: {e}")
             return False
     
+    def _persist_dataset(self, dataset_id: str, changed_sample: Optional[Dict] = None):
+        """保存数据集（样本信息），changed_sample 为本次修改的样本（开启后台写入时只记录）"""
+        if self.persist_interval > 0 and not self._closed and changed_sample is not None:
+            self._pending_samples.setdefault(dataset_id, {})[changed_sample.get('id')] = changed_sample
+            self._mark_dirty(dataset_id)
+            return
+        self.storage.save_dataset(dataset_id, self.datasets[dataset_id],
+                                  [changed_sample] if changed_sample is not None else None)
+        self._mark_changed(dataset_id)
+    
+    def _set_review_status(self, sample_id: str, review_status: str) -> bool:
+        """设置样本审阅状态并保存"""
+        dataset_id = self._dataset_of_sample(sample_id)
+        if not dataset_id:
+            return False
+        
+        with self._locked_for_write([dataset_id]):
+            sample_entry = self.index.get_sample(sample_id)
+            if not sample_entry:
+                return False
+            dataset_id, sample = sample_entry
+            
+            # 更新审阅状态
+            self.statistics.remove_sample(dataset_id, sample)
+            old_status = sample.get('review_status')
+            sample['review_status'] = review_status
+            self.statistics.add_sample(dataset_id, sample)
+            self.index.update_sample_status(dataset_id, sample, old_status)
+            
+            # 保存到文件
+            self._persist_dataset(dataset_id, sample)
+            self.changes.record('sample', 'update', dataset_id, sample_id, sample)
+            return True
+    
     def mark_sample_reviewed(self, sample_id: str) -> bool:
         """标记样本为已审阅"""
         try:
-            for dataset_id, dataset in self.datasets.items():
-                for sample in dataset.get('samples', []):
-                    if sample.get('id') == sample_id:
-                        # 更新审阅状态
-                        sample['review_status'] = '已审阅'
-                        
-                        # 保存到文件
-                        filepath = os.path.join(self.data_dir, f"{dataset_id}.json")
-                        with open(filepath, 'w', encoding='utf-8') as f:
-                            json.dump(dataset, f, ensure_ascii=False, indent=2)
-                        return True
-            return False
+            return self._set_review_status(sample_id, '已审阅')
         except Exception as e:
             print(f"Error marking sample as reviewed: {e}")
             return False
@@ -434,18 +1196,7 @@ class DatasetManager:
     def mark_sample_unreviewed(self, sample_id: str) -> bool:
         """标记样本为未审阅"""
         try:
-            for dataset_id, dataset in self.datasets.items():
-                for sample in dataset.get('samples', []):
-                    if sample.get('id') == sample_id:
-                        # 更新审阅状态
-                        sample['review_status'] = '未审阅'
-                        
-                        # 保存到文件
-                        filepath = os.path.join(self.data_dir, f"{dataset_id}.json")
-                        with open(filepath, 'w', encoding='utf-8') as f:
-                            json.dump(dataset, f, ensure_ascii=False, indent=2)
-                        return True
-            return False
+            return self._set_review_status(sample_id, '未审阅')
         except Exception as e:
             print(f"Error marking sample as unreviewed: {e}")
             return False
@@ -458,27 +1209,34 @@ class DatasetManager:
     def set_sample_exception_status(self, sample_id: str, is_exception: bool, reason: str = "") -> bool:
         """设置样本的异常状态（独立于审阅状态）"""
         try:
-            for dataset_id, dataset in self.datasets.items():
-                for sample in dataset.get('samples', []):
-                    if sample.get('id') == sample_id:
-                        # 设置异常状态（独立于审阅状态）
-                        if is_exception:
-                            sample['exception_status'] = {
-                                'is_exception': True,
-                                'reason': reason,
-                                'timestamp': datetime.now().isoformat()
-                            }
-                        else:
-                            # 清除异常状态
-                            if 'exception_status' in sample:
-                                del sample['exception_status']
-                        
-                        # 保存到文件
-                        filepath = os.path.join(self.data_dir, f"{dataset_id}.json")
-                        with open(filepath, 'w', encoding='utf-8') as f:
-                            json.dump(dataset, f, ensure_ascii=False, indent=2)
-                        return True
-            return False
+            dataset_id = self._dataset_of_sample(sample_id)
+            if not dataset_id:
+                return False
+            
+            with self._locked_for_write([dataset_id]):
+                sample_entry = self.index.get_sample(sample_id)
+                if not sample_entry:
+                    return False
+                dataset_id, sample = sample_entry
+                
+                # 设置异常状态（独立于审阅状态）
+                self.statistics.remove_sample(dataset_id, sample)
+                if is_exception:
+                    sample['exception_status'] = {
+                        'is_exception': True,
+                        'reason': reason,
+                        'timestamp': datetime.now().isoformat()
+                    }
+                else:
+                    # 清除异常状态
+                    if 'exception_status' in sample:
+                        del sample['exception_status']
+                self.statistics.add_sample(dataset_id, sample)
+                
+                # 保存到文件
+                self._persist_dataset(dataset_id, sample)
+                self.changes.record('sample', 'update', dataset_id, sample_id, sample)
+                return True
         except Exception as e:
             print(f"Error setting sample exception status: {e}")
             return False
@@ -486,150 +1244,42 @@ class DatasetManager:
     def get_sample_exception_status(self, sample_id: str) -> Optional[Dict]:
         """获取样本的异常状态"""
         try:
-            for dataset_id, dataset in self.datasets.items():
-                for sample in dataset.get('samples', []):
-                    if sample.get('id') == sample_id:
-                        return sample.get('exception_status')
-            return None
+            dataset_id = self._dataset_of_sample(sample_id)
+            if not dataset_id:
+                return None
+            with self._locked_for_read([dataset_id]):
+                sample_entry = self.index.get_sample(sample_id)
+                if not sample_entry:
+                    return None
+                return sample_entry[1].get('exception_status')
         except Exception as e:
             print(f"Error getting sample exception status: {e}")
             return None
     
+    def get_changes(self, since: Optional[int], epoch: Optional[str] = None, dataset_id: Optional[str] = None,
+                    limit: int = 1000) -> Dict:
+        """获取版本号 since 之后的修改（同一记录只返回最后一次），格式见 ChangeLog.since"""
+        if dataset_id is not None and dataset_id in self._loaded:
+            # 先发现其他进程的修改，使其以 'reload' 记录出现在结果中
+            self._sync([dataset_id])
+        return self.changes.since(since, epoch, dataset_id, limit)
+    
+    def _segment_annotator(self, segment: Dict) -> Optional[str]:
+        """片段所属样本的标注者（样本不存在或属于test_dataset时返回None）"""
+        sample_entry = self.index.get_sample(segment.get('sample_id'))
+        if not sample_entry or sample_entry[0] == 'test_dataset':
+            return None
+        return sample_entry[1].get('assigned_to')
+    
     def get_statistics(self, annotator: str = 'all') -> Dict:
-        """获取标注统计信息"""
+        """获取标注统计信息（由增量维护的计数汇总，与数据量无关）"""
         try:
-            statistics = {
-                'datasets': {},
-                'segments': {},
-                'totalSelected': 0
-            }
-            
-            # 统计数据集级别的信息
-            for dataset_id, dataset in self.datasets.items():
-                # 忽略test_dataset
-                if dataset_id == 'test_dataset':
-                    continue
-                    
-                samples = dataset.get('samples', [])
-                
-                # 过滤指定标注者的样本
-                if annotator and annotator != 'all':
-                    samples = [s for s in samples if s.get('assigned_to') == annotator]
-                
-                # 统计审阅状态
-                reviewed = len([s for s in samples if s.get('review_status') == '已审阅'])
-                unreviewed = len([s for s in samples if s.get('review_status') == '未审阅'])
-                
-                # 统计异常状态
-                exception = len([s for s in samples if s.get('exception_status', {}).get('is_exception', False)])
-                
-                statistics['datasets'][dataset_id] = {
-                    'reviewed': reviewed,
-                    'unreviewed': unreviewed,
-                    'exception': exception
-                }
-            
-            # 统计片段级别的信息
-            all_segments = []
-            for dataset_id, dataset_segments in self.segments.items():
-                # 忽略test_dataset的片段
-                if dataset_id == 'test_dataset':
-                    continue
-                    
-                segments = dataset_segments.get('segments', [])
-                
-                # 过滤指定标注者的片段（通过sample_id关联）
-                if annotator and annotator != 'all':
-                    filtered_segments = []
-                    for segment in segments:
-                        sample_id = segment.get('sample_id')
-                        # 查找对应的样本
-                        for dataset in self.datasets.values():
-                            # 忽略test_dataset
-                            if dataset.get('id') == 'test_dataset':
-                                continue
-                            for sample in dataset.get('samples', []):
-                                if sample.get('id') == sample_id and sample.get('assigned_to') == annotator:
-                                    filtered_segments.append(segment)
-                                    break
-                    segments = filtered_segments
-                
-                all_segments.extend(segments)
-            
-            # 统计片段状态
-            selected = len([s for s in all_segments if s.get('status') == '选用'])
-            pending = len([s for s in all_segments if s.get('status') == '待抉择'])
-            rejected = len([s for s in all_segments if s.get('status') == '弃用'])
-            
-            statistics['segments'] = {
-                'selected': selected,
-                'pending': pending,
-                'rejected': rejected
-            }
-            
-            # 按长度和状态统计片段
-            length_status_stats = {
-                'short': {'selected': 0, 'pending': 0, 'rejected': 0},      # ≤5秒
-                'medium': {'selected': 0, 'pending': 0, 'rejected': 0},     # (5-13秒]
-                'long': {'selected': 0, 'pending': 0, 'rejected': 0},       # (13-30秒]
-                'extraLong': {'selected': 0, 'pending': 0, 'rejected': 0},  # >30秒
-                'all': {'selected': 0, 'pending': 0, 'rejected': 0}         # 所有长度
-            }
-            
-            for segment in all_segments:
-                start_time = segment.get('start_time', 0)
-                end_time = segment.get('end_time', 0)
-                duration = end_time - start_time
-                status = segment.get('status', '待抉择')
-                
-                # 更新所有长度的统计
-                if status == '选用':
-                    length_status_stats['all']['selected'] += 1
-                elif status == '待抉择':
-                    length_status_stats['all']['pending'] += 1
-                elif status == '弃用':
-                    length_status_stats['all']['rejected'] += 1
-                
-                # 按长度分类统计
-                if duration <= 5:
-                    if status == '选用':
-                        length_status_stats['short']['selected'] += 1
-                    elif status == '待抉择':
-                        length_status_stats['short']['pending'] += 1
-                    elif status == '弃用':
-                        length_status_stats['short']['rejected'] += 1
-                elif duration <= 13:
-                    if status == '选用':
-                        length_status_stats['medium']['selected'] += 1
-                    elif status == '待抉择':
-                        length_status_stats['medium']['pending'] += 1
-                    elif status == '弃用':
-                        length_status_stats['medium']['rejected'] += 1
-                elif duration <= 30:
-                    if status == '选用':
-                        length_status_stats['long']['selected'] += 1
-                    elif status == '待抉择':
-                        length_status_stats['long']['pending'] += 1
-                    elif status == '弃用':
-                        length_status_stats['long']['rejected'] += 1
-                else:
-                    if status == '选用':
-                        length_status_stats['extraLong']['selected'] += 1
-                    elif status == '待抉择':
-                        length_status_stats['extraLong']['pending'] += 1
-                    elif status == '弃用':
-                        length_status_stats['extraLong']['rejected'] += 1
-            
-            # 更新统计信息
-            statistics['segments'].update({
-                'lengthStatus': length_status_stats
-            })
-            
-            # 总选用片段数
-            statistics['totalSelected'] = length_status_stats['all']['selected']
-            
-            return statistics
-            
+            with self._locked_for_read(self._dataset_ids()):
+                # 忽略test_dataset；未加载的数据集使用清单中的计数
+                segment_dataset_ids = [ds_id for ds_id in self._dataset_ids() if ds_id != 'test_dataset']
+                dataset_ids = [ds_id for ds_id in segment_dataset_ids
+                               if ds_id in self.datasets or self._catalog[ds_id].get('has_dataset')]
+                return self.statistics.get_statistics(dataset_ids, segment_dataset_ids, annotator)
         except Exception as e:
             print(f"Error getting statistics: {e}")
             return {
@@ -637,3 +1287,20 @@ class DatasetManager:
                 'segments': {},
                 'totalSelected': 0
             }
+    
+    def check_statistics_consistency(self, repair: bool = False) -> Dict:
+        """从头重算统计并与增量计数比较，可选择用重算结果修复（会加载全部数据集）"""
+        self._ensure_all_loaded()
+        # 只检查时持有读锁，不阻塞其他读取
+        locked = self._locked_for_write if repair else self._locked_for_read
+        with locked(self._dataset_ids()):
+            differences = self.statistics.verify(self.datasets, self.segments, self._segment_annotator)
+            if differences and repair:
+                self.statistics.rebuild(self.datasets, self.segments, self._segment_annotator)
+        if differences:
+            print(f"⚠️ 统计计数不一致: {len(differences)} 项")
+        return {
+            'consistent': not differences,
+            'differences': differences,
+            'repaired': bool(differences) and repair
+        }
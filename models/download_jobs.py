@@ -0,0 +1,304 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+ACTIVE_STATES = (JOB_QUEUED, JOB_RUNNING)
+
+# 下载阶段
+PHASE_QUEUED = 'queued'
+PHASE_DOWNLOAD = 'download'
+PHASE_MERGE = 'merge'
+PHASE_EXTRACT = 'extract'
+PHASE_VALIDATE = 'validate'
+PHASE_DONE = 'done'
+
+# 优先级：数字越小越先执行
+PRIORITY_USER = 0
+PRIORITY_PREFETCH = 10
+
+
+class DownloadJob:
+    """单个下载任务，同一样本同时只存在一个活动任务"""
+
+    def __init__(self, dataset_name: str, sample_name: str, video_type: str,
+                 video_info: Optional[Dict], source: str, priority: int):
+        self.id = uuid.uuid4().hex
+        self.dataset_name = dataset_name
+        self.sample_name = sample_name
+        self.video_type = video_type
+        self.video_info = video_info or {}
+        self.source = source
+        self.priority = priority
+        self.status = JOB_QUEUED
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.progress = {
+            'phase': PHASE_QUEUED,
+            'downloaded_bytes': 0,
+            'total_bytes': None,
+            'speed': None,
+            'eta': None,
+            'percent': None
+        }
+        # 每次状态或进度变化时递增，供SSE推送判断是否有更新
+        self.version = 0
+
+        self._changed = threading.Condition()
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+        self._process = None
+        self._lock = threading.Lock()
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return (self.dataset_name, self.sample_name)
+
+    def update_progress(self, **fields):
+        """更新下载进度（字节数、速度、剩余时间、阶段）并通知等待者"""
+        with self._changed:
+            self.progress.update(fields)
+            downloaded = self.progress.get('downloaded_bytes')
+            total = self.progress.get('total_bytes')
+            if total and downloaded is not None:
+                self.progress['percent'] = round(min(downloaded / total, 1.0) * 100, 1)
+            self.version += 1
+            self._changed.notify_all()
+
+    def update_file_progress(self, filename: str, **fields):
+        """按文件更新进度（逐文件下载模式），汇总字节数写入整体进度"""
+        with self._changed:
+            files = self.progress.setdefault('files', {})
+            files.setdefault(filename, {'status': 'queued', 'downloaded_bytes': 0, 'total_bytes': None})
+            files[filename].update(fields)
+            totals = [f.get('total_bytes') for f in files.values()]
+            self.progress['downloaded_bytes'] = sum(f.get('downloaded_bytes') or 0 for f in files.values())
+            self.progress['total_bytes'] = sum(totals) if all(totals) else None
+            if self.progress['total_bytes']:
+                self.progress['percent'] = round(
+                    min(self.progress['downloaded_bytes'] / self.progress['total_bytes'], 1.0) * 100, 1
+                )
+            self.version += 1
+            self._changed.notify_all()
+
+    def get_file_status(self, filename: str) -> Optional[Dict]:
+        """获取单个文件的下载状态（仅逐文件下载模式）"""
+        with self._changed:
+            status = self.progress.get('files', {}).get(filename)
+            return dict(status) if status else None
+
+    def notify_changed(self):
+        """任务状态变化后通知等待者"""
+        with self._changed:
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, version: int, timeout: float) -> int:
+        """阻塞直到任务版本号超过 version 或超时，返回最新版本号"""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while self.version <= version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            return self.version
+
+    def is_finished(self) -> bool:
+        return self._done_event.is_set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def attach_process(self, process):
+        """登记正在运行的子进程，取消时终止它"""
+        with self._lock:
+            self._process = process
+            if self.is_cancelled():
+                process.terminate()
+
+    def detach_process(self):
+        with self._lock:
+            self._process = None
+
+    def cancel(self):
+        """请求取消任务：排队中的任务直接跳过，运行中的任务终止子进程并在下一阶段前退出"""
+        self._cancel_event.set()
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                self._process.terminate()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待任务结束"""
+        return self._done_event.wait(timeout)
+
+    def _progress_snapshot(self) -> Dict:
+        with self._changed:
+            progress = dict(self.progress)
+            if 'files' in progress:
+                progress['files'] = {name: dict(status) for name, status in progress['files'].items()}
+            return progress
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'dataset': self.dataset_name,
+            'sample': self.sample_name,
+            'type': self.video_type,
+            'source': self.source,
+            'priority': self.priority,
+            'status': self.status,
+            'progress': self._progress_snapshot(),
+            'version': self.version,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class DownloadJobQueue:
+    """下载任务队列：每个来源一个优先级队列和固定数量的工作线程，限制各来源的并发数"""
+
+    def __init__(self, runner: Callable[[DownloadJob], Dict], source_limits: Dict[str, int],
+                 max_finished_jobs: int = 200):
+        self.runner = runner
+        self.source_limits = source_limits
+        self.max_finished_jobs = max_finished_jobs
+
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, DownloadJob] = {}
+        self._active_by_key: Dict[Tuple[str, str], DownloadJob] = {}
+        self._finished: OrderedDict = OrderedDict()
+        self._sequence = itertools.count()
+        self._queues: Dict[str, queue.PriorityQueue] = {}
+        self._workers: List[threading.Thread] = []
+
+        for source, limit in source_limits.items():
+            self._queues[source] = queue.PriorityQueue()
+            for i in range(limit):
+                worker = threading.Thread(
+                    target=self._worker_loop, args=(source,),
+                    name=f"download-{source}-{i}", daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, dataset_name: str, sample_name: str, video_type: str,
+               video_info: Optional[Dict], source: str,
+               priority: int = PRIORITY_USER) -> Tuple[DownloadJob, bool]:
+        """提交下载任务，同一样本已有活动任务时直接复用，返回 (任务, 是否新建)"""
+        if source not in self._queues:
+            raise ValueError(f"不支持的下载来源: {source}")
+
+        with self._lock:
+            existing = self._active_by_key.get((dataset_name, sample_name))
+            if existing is not None:
+                # 更高优先级的请求提前排队中的任务
+                if existing.status == JOB_QUEUED and priority < existing.priority:
+                    existing.priority = priority
+                    self._queues[existing.source].put((priority, next(self._sequence), existing))
+                return existing, False
+
+            job = DownloadJob(dataset_name, sample_name, video_type, video_info, source, priority)
+            self._jobs[job.id] = job
+            self._active_by_key[job.key] = job
+            self._queues[source].put((priority, next(self._sequence), job))
+
+        logger.info(f"下载任务已提交: {job.id} ({dataset_name}/{sample_name}, {source})")
+        return job, True
+
+    def get(self, job_id: str) -> Optional[DownloadJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_active(self, dataset_name: str, sample_name: str) -> Optional[DownloadJob]:
+        """获取样本当前的活动任务"""
+        with self._lock:
+            return self._active_by_key.get((dataset_name, sample_name))
+
+    def list_jobs(self, dataset_name: Optional[str] = None, sample_name: Optional[str] = None) -> List[DownloadJob]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [
+            job for job in jobs
+            if (dataset_name is None or job.dataset_name == dataset_name)
+            and (sample_name is None or job.sample_name == sample_name)
+        ]
+
+    def cancel(self, job_id: str) -> bool:
+        """取消任务，任务不存在或已结束时返回False"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in ACTIVE_STATES:
+                return False
+            job.cancel()
+            if job.status == JOB_QUEUED:
+                self._finish(job, JOB_CANCELLED)
+        logger.info(f"下载任务已取消: {job_id}")
+        return True
+
+    def _finish(self, job: DownloadJob, status: str):
+        """标记任务结束（调用方需持有锁）"""
+        job.status = status
+        job.finished_at = datetime.now().isoformat()
+        if self._active_by_key.get(job.key) is job:
+            del self._active_by_key[job.key]
+
+        # 只保留最近结束的任务记录
+        self._finished[job.id] = job
+        while len(self._finished) > self.max_finished_jobs:
+            old_id, _ = self._finished.popitem(last=False)
+            self._jobs.pop(old_id, None)
+        if status == JOB_SUCCEEDED:
+            job.progress['phase'] = PHASE_DONE
+        job._done_event.set()
+        job.notify_changed()
+
+    def _worker_loop(self, source: str):
+        job_queue = self._queues[source]
+        while True:
+            _, _, job = job_queue.get()
+            with self._lock:
+                # 已取消或因提升优先级而重复入队的任务直接跳过
+                if job.status != JOB_QUEUED:
+                    continue
+                job.status = JOB_RUNNING
+                job.started_at = datetime.now().isoformat()
+            job.update_progress(phase=PHASE_DOWNLOAD)
+
+            status = JOB_FAILED
+            try:
+                result = self.runner(job)
+                job.result = result
+                if job.is_cancelled():
+                    status = JOB_CANCELLED
+                elif result.get('success'):
+                    status = JOB_SUCCEEDED
+                else:
+                    job.error = result.get('message')
+            except Exception as e:
+                logger.error(f"下载任务执行异常 {job.id}: {str(e)}")
+                job.error = str(e)
+
+            with self._lock:
+                self._finish(job, status)
+            logger.info(f"下载任务结束: {job.id} -> {status}")
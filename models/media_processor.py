@@ -0,0 +1,137 @@
+import logging
+import os
+import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+MEDIA_READY = 'ready'
+MEDIA_PENDING = 'pending'
+MEDIA_FAILED = 'failed'
+MEDIA_MISSING = 'missing'
+
+
+def is_up_to_date(output_path: str, source_paths: List[str]) -> bool:
+    """输出文件存在且不早于所有源文件（源文件重新下载后需要重新生成）"""
+    try:
+        output_mtime = os.path.getmtime(output_path)
+        return all(os.path.getmtime(source) <= output_mtime for source in source_paths)
+    except OSError:
+        return False
+
+
+class MediaProcessor:
+    """有界的ffmpeg后台任务池：同一输出文件同时只处理一次，先写临时文件再原子替换，
+    因此读者看到的输出文件总是完整的"""
+
+    def __init__(self, workers: int = 2, timeout: float = 30 * 60, ffmpeg_binary: str = 'ffmpeg',
+                 name: str = 'media'):
+        self.timeout = timeout
+        self.ffmpeg_binary = ffmpeg_binary
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-ffmpeg")
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+        self._failed: Dict[str, str] = {}
+        self._ffmpeg_missing = False
+
+    @property
+    def ffmpeg_missing(self) -> bool:
+        return self._ffmpeg_missing
+
+    def submit(self, output_path: str, args: List[str], sources: Optional[List[str]] = None,
+               on_done: Optional[Callable[[str, bool], None]] = None, retry: bool = False) -> Optional[Future]:
+        """提交一个ffmpeg任务（args 不含输出路径），输出已是最新、正在处理或ffmpeg不存在时不重复提交，
+        之前失败过的输出只在 retry 为True时重试；返回任务的 Future（无需处理时为None）"""
+        if self._ffmpeg_missing:
+            return None
+        if sources is not None and is_up_to_date(output_path, sources):
+            return None
+        with self._lock:
+            future = self._pending.get(output_path)
+            if future is not None:
+                return future
+            if output_path in self._failed and not retry:
+                return None
+            self._failed.pop(output_path, None)
+            future = self._pool.submit(self._run, output_path, args, on_done)
+            self._pending[output_path] = future
+            return future
+
+    def run(self, output_path: str, args: List[str], sources: Optional[List[str]] = None,
+            timeout: Optional[float] = None) -> bool:
+        """同步生成输出文件（与后台任务共享去重），返回是否成功"""
+        if sources is not None and is_up_to_date(output_path, sources):
+            return True
+        future = self.submit(output_path, args, sources, retry=True)
+        if future is None:
+            return os.path.exists(output_path) and not self._ffmpeg_missing
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            return False
+
+    def status(self, output_path: str) -> str:
+        with self._lock:
+            if output_path in self._pending:
+                return MEDIA_PENDING
+            if output_path in self._failed:
+                return MEDIA_FAILED
+        return MEDIA_READY if os.path.exists(output_path) else MEDIA_MISSING
+
+    def error(self, output_path: str) -> Optional[str]:
+        with self._lock:
+            return self._failed.get(output_path)
+
+    def _run(self, output_path: str, args: List[str], on_done: Optional[Callable[[str, bool], None]]) -> bool:
+        root, ext = os.path.splitext(output_path)
+        # 临时文件保留扩展名，ffmpeg据此选择封装格式
+        tmp_path = f"{root}.{threading.get_ident()}.tmp{ext}"
+        success = False
+        error = None
+        try:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            cmd = [self.ffmpeg_binary, '-y', '-hide_banner', '-loglevel', 'error', *args, tmp_path]
+            try:
+                result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+            except FileNotFoundError:
+                if not self._ffmpeg_missing:
+                    logger.warning("未找到ffmpeg，停止后台视频处理任务")
+                self._ffmpeg_missing = True
+                result = None
+                error = "未找到ffmpeg"
+            if result is not None and result.returncode != 0:
+                error = result.stderr.strip()[-500:] or f"ffmpeg退出码 {result.returncode}"
+            elif result is not None:
+                # 源文件在处理过程中被删除时ffmpeg可能没有写出文件，os.replace 抛出的异常按普通失败处理
+                os.replace(tmp_path, output_path)
+                success = True
+        except subprocess.TimeoutExpired:
+            error = f"ffmpeg处理超时（{self.timeout}秒）"
+        except Exception as e:
+            error = str(e)
+        finally:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            with self._lock:
+                self._pending.pop(output_path, None)
+                if error is not None:
+                    self._failed[output_path] = error
+            if error is not None and not self._ffmpeg_missing:
+                logger.warning(f"ffmpeg处理失败 {output_path}: {error}")
+
+        if on_done is not None:
+            try:
+                on_done(output_path, success)
+            except Exception as e:
+                logger.warning(f"ffmpeg任务回调失败 {output_path}: {str(e)}")
+        return success
+
+    def shutdown(self, wait: bool = False):
+        """停止接受新任务（wait 为True时等待进行中的任务完成）"""
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+from typing import Dict, List
+
+from models.atomic_file import write_file_atomic
+
+
+def _upsert_segment(segments: List[Dict], segment: Dict):
+    # 已存在同ID片段时覆盖，保证重复回放结果一致
+    for i, existing in enumerate(segments):
+        if existing.get('id') == segment.get('id'):
+            segments[i] = segment
+            return
+    segments.append(segment)
+
+
+def apply_segment_op(segments_data: Dict, op: Dict):
+    """将一条日志操作应用到片段数据上（幂等，可重复回放）"""
+    segments = segments_data.setdefault('segments', [])
+    op_type = op.get('op')
+
+    if op_type == 'create':
+        _upsert_segment(segments, op.get('segment', {}))
+    elif op_type == 'create_many':
+        for segment in op.get('segments', []):
+            _upsert_segment(segments, segment)
+    elif op_type == 'update':
+        for segment in segments:
+            if segment.get('id') == op.get('id'):
+                segment.update(op.get('fields', {}))
+                return
+    elif op_type == 'update_many':
+        fields_by_id = {}
+        for update in op.get('updates', []):
+            fields_by_id.setdefault(update.get('id'), {}).update(update.get('fields', {}))
+        for segment in segments:
+            if segment.get('id') in fields_by_id:
+                segment.update(fields_by_id[segment.get('id')])
+    elif op_type == 'delete':
+        segments_data['segments'] = [s for s in segments if s.get('id') != op.get('id')]
+    elif op_type == 'delete_many':
+        ids = set(op.get('ids', []))
+        segments_data['segments'] = [s for s in segments if s.get('id') not in ids]
+    else:
+        print(f"⚠️ 未知的片段日志操作: {op_type}")
+
+
+class SegmentJournal:
+    """片段预写日志，每个数据集一个追加写入的日志文件，每次修改写入一行并fsync"""
+
+    SUFFIX = '_segments.journal'
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def journal_path(self, dataset_id: str) -> str:
+        """获取数据集日志文件路径"""
+        return os.path.join(self.data_dir, f"{dataset_id}{self.SUFFIX}")
+
+    def list_datasets(self) -> List[str]:
+        """列出存在日志文件的数据集ID"""
+        if not os.path.exists(self.data_dir):
+            return []
+        return [
+            filename[:-len(self.SUFFIX)]
+            for filename in os.listdir(self.data_dir)
+            if filename.endswith(self.SUFFIX)
+        ]
+
+    def _get_file(self, dataset_id: str):
+        f = self._files.get(dataset_id)
+        if f is not None and self._is_replaced(f, dataset_id):
+            # 日志已被其他进程压缩替换，重新打开新文件
+            f.close()
+            f = None
+        if f is None:
+            f = open(self.journal_path(dataset_id), 'ab')
+            self._files[dataset_id] = f
+        return f
+
+    def _is_replaced(self, f, dataset_id: str) -> bool:
+        try:
+            return os.fstat(f.fileno()).st_ino != os.stat(self.journal_path(dataset_id)).st_ino
+        except OSError:
+            return True
+
+    def append(self, dataset_id: str, op: Dict) -> int:
+        """追加一条操作并落盘，返回日志当前大小（字节）"""
+        return self.append_many(dataset_id, [op])
+
+    def append_many(self, dataset_id: str, ops: List[Dict]) -> int:
+        """追加多条操作，只fsync一次，返回日志当前大小（字节）"""
+        data = ''.join(json.dumps(op, ensure_ascii=False, separators=(',', ':')) + '\n' for op in ops)
+        with self._lock:
+            f = self._get_file(dataset_id)
+            f.write(data.encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+            return f.tell()
+
+    def size(self, dataset_id: str) -> int:
+        """获取日志当前大小（字节，包含其他进程追加的内容）"""
+        path = self.journal_path(dataset_id)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def read_ops(self, dataset_id: str) -> List[Dict]:
+        """读取日志中的全部操作，末尾不完整的行会被截断丢弃"""
+        path = self.journal_path(dataset_id)
+        if not os.path.exists(path):
+            return []
+
+        ops = []
+        valid_end = 0
+        with self._lock:
+            with open(path, 'rb') as f:
+                for raw_line in f:
+                    if not raw_line.endswith(b'\n'):
+                        break
+                    try:
+                        ops.append(json.loads(raw_line.decode('utf-8')))
+                    except (ValueError, UnicodeDecodeError):
+                        break
+                    valid_end += len(raw_line)
+
+            if valid_end < os.path.getsize(path):
+                print(f"⚠️ 片段日志 {dataset_id} 末尾存在损坏记录，已截断")
+                with open(path, 'r+b') as f:
+                    f.truncate(valid_end)
+        return ops
+
+    def discard_prefix(self, dataset_id: str, offset: int):
+        """丢弃已压缩进快照的前 offset 字节，保留之后追加的记录"""
+        path = self.journal_path(dataset_id)
+        with self._lock:
+            f = self._files.pop(dataset_id, None)
+            if f is not None:
+                f.close()
+            if not os.path.exists(path):
+                return
+
+            with open(path, 'rb') as src:
+                src.seek(offset)
+                remaining = src.read()
+
+            write_file_atomic(path, remaining)
+
+    def close(self):
+        """关闭所有日志文件句柄"""
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
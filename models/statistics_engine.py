@@ -0,0 +1,157 @@
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+# 汇总所有标注者的计数键
+ALL_ANNOTATORS = '*'
+
+SEGMENT_STATUS_KEYS = {'选用': 'selected', '待抉择': 'pending', '弃用': 'rejected'}
+LENGTH_BUCKETS = ['short', 'medium', 'long', 'extraLong']
+
+
+def segment_length_bucket(segment: Dict) -> str:
+    """按时长划分片段：≤5秒、(5-13秒]、(13-30秒]、>30秒"""
+    duration = (segment.get('end_time') or 0) - (segment.get('start_time') or 0)
+    if duration <= 5:
+        return 'short'
+    if duration <= 13:
+        return 'medium'
+    if duration <= 30:
+        return 'long'
+    return 'extraLong'
+
+
+class StatisticsEngine:
+    """增量维护的标注统计，按 (数据集, 标注者) 保存计数，修改时只做增量更新"""
+
+    def __init__(self):
+        self.counters: Dict[tuple, Counter] = {}
+
+    def _apply(self, dataset_id: str, annotator: Optional[str], keys: List[tuple], delta: int):
+        for counter_annotator in (annotator, ALL_ANNOTATORS):
+            if counter_annotator is None:
+                continue
+            counter = self.counters.get((dataset_id, counter_annotator))
+            if counter is None:
+                counter = self.counters[(dataset_id, counter_annotator)] = Counter()
+            for key in keys:
+                counter[key] += delta
+
+    @staticmethod
+    def _sample_keys(sample: Dict) -> List[tuple]:
+        keys = []
+        review_status = sample.get('review_status')
+        if review_status == '已审阅':
+            keys.append(('reviewed',))
+        elif review_status == '未审阅':
+            keys.append(('unreviewed',))
+        if sample.get('exception_status', {}).get('is_exception', False):
+            keys.append(('exception',))
+        return keys
+
+    @staticmethod
+    def _segment_keys(segment: Dict) -> List[tuple]:
+        status = SEGMENT_STATUS_KEYS.get(segment.get('status', '待抉择'))
+        if status is None:
+            return []
+        return [('segment', segment_length_bucket(segment), status)]
+
+    def add_sample(self, dataset_id: str, sample: Dict):
+        self._apply(dataset_id, sample.get('assigned_to'), self._sample_keys(sample), 1)
+
+    def remove_sample(self, dataset_id: str, sample: Dict):
+        self._apply(dataset_id, sample.get('assigned_to'), self._sample_keys(sample), -1)
+
+    def add_segment(self, dataset_id: str, segment: Dict, annotator: Optional[str]):
+        self._apply(dataset_id, annotator, self._segment_keys(segment), 1)
+
+    def remove_segment(self, dataset_id: str, segment: Dict, annotator: Optional[str]):
+        self._apply(dataset_id, annotator, self._segment_keys(segment), -1)
+
+    def clear_dataset(self, dataset_id: str):
+        """清除一个数据集的全部计数（重新加载数据集前调用）"""
+        for counter_key in [key for key in self.counters if key[0] == dataset_id]:
+            del self.counters[counter_key]
+
+    def export_dataset(self, dataset_id: str) -> Dict[str, Dict[str, int]]:
+        """导出一个数据集的计数（写入数据集清单，未加载的数据集也能统计）"""
+        return {
+            annotator: {'/'.join(key): count for key, count in counter.items() if count}
+            for (counter_dataset, annotator), counter in self.counters.items()
+            if counter_dataset == dataset_id
+        }
+
+    def import_dataset(self, dataset_id: str, exported: Dict[str, Dict[str, int]]):
+        """用 export_dataset 的结果替换一个数据集的计数"""
+        self.clear_dataset(dataset_id)
+        for annotator, counts in exported.items():
+            self.counters[(dataset_id, annotator)] = Counter(
+                {tuple(key.split('/')): count for key, count in counts.items()}
+            )
+
+    def rebuild(self, datasets: Dict, segments: Dict, resolve_annotator: Callable[[Dict], Optional[str]]):
+        """根据当前数据全量重建计数"""
+        self.counters.clear()
+        for dataset_id, dataset in datasets.items():
+            for sample in dataset.get('samples', []):
+                self.add_sample(dataset_id, sample)
+        for dataset_id, dataset_segments in segments.items():
+            for segment in dataset_segments.get('segments', []):
+                self.add_segment(dataset_id, segment, resolve_annotator(segment))
+
+    def verify(self, datasets: Dict, segments: Dict,
+               resolve_annotator: Callable[[Dict], Optional[str]]) -> List[Dict]:
+        """从头重算计数并与增量结果比较，返回不一致的条目"""
+        fresh = StatisticsEngine()
+        fresh.rebuild(datasets, segments, resolve_annotator)
+
+        differences = []
+        for counter_key in set(self.counters) | set(fresh.counters):
+            current = self.counters.get(counter_key, Counter())
+            expected = fresh.counters.get(counter_key, Counter())
+            for key in set(current) | set(expected):
+                if current[key] != expected[key]:
+                    differences.append({
+                        'dataset': counter_key[0],
+                        'annotator': counter_key[1],
+                        'key': '/'.join(key),
+                        'current': current[key],
+                        'expected': expected[key]
+                    })
+        return differences
+
+    def get_statistics(self, dataset_ids: List[str], segment_dataset_ids: List[str],
+                       annotator: Optional[str]) -> Dict:
+        """汇总统计结果，输出格式与 /api/statistics 保持一致"""
+        counter_annotator = annotator if annotator and annotator != 'all' else ALL_ANNOTATORS
+        empty = Counter()
+
+        statistics = {
+            'datasets': {},
+            'segments': {},
+            'totalSelected': 0
+        }
+
+        for dataset_id in dataset_ids:
+            counter = self.counters.get((dataset_id, counter_annotator), empty)
+            statistics['datasets'][dataset_id] = {
+                'reviewed': counter[('reviewed',)],
+                'unreviewed': counter[('unreviewed',)],
+                'exception': counter[('exception',)]
+            }
+
+        length_status_stats = {
+            bucket: {'selected': 0, 'pending': 0, 'rejected': 0}
+            for bucket in LENGTH_BUCKETS + ['all']
+        }
+        for dataset_id in segment_dataset_ids:
+            counter = self.counters.get((dataset_id, counter_annotator), empty)
+            for bucket in LENGTH_BUCKETS:
+                for status in ('selected', 'pending', 'rejected'):
+                    count = counter[('segment', bucket, status)]
+                    length_status_stats[bucket][status] += count
+                    length_status_stats['all'][status] += count
+
+        statistics['segments'] = dict(length_status_stats['all'])
+        statistics['segments']['lengthStatus'] = length_status_stats
+        statistics['totalSelected'] = length_status_stats['all']['selected']
+        return statistics
@@ -0,0 +1,564 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from contextlib import nullcontext
+from typing import Callable, ContextManager, Dict, List, Optional, Tuple
+from models.atomic_file import write_file_atomic, write_json_atomic
+from models.segment_journal import SegmentJournal, apply_segment_op
+
+# 将EgoExo4D原始列表格式转换为标准数据集格式的回调 (content, dataset_id) -> dataset
+EgoExo4DConverter = Callable[[List[Dict], str], Dict]
+
+# EgoExo4D转换结果缓存的格式版本，转换逻辑变化时递增，旧缓存会被重新转换
+EGOEXO4D_CACHE_VERSION = 1
+# 源文件变化导致重新转换时，从旧缓存中保留的样本标注字段
+EGOEXO4D_CARRY_OVER_FIELDS = ('review_status', 'exception_status')
+
+
+class StorageBackend:
+    """数据集与片段的存储后端接口，DatasetManager 在内存中保存数据，通过后端持久化"""
+
+    def initialize(self) -> bool:
+        """准备存储位置，返回是否为全新创建（此时由管理器写入示例数据）"""
+        raise NotImplementedError
+
+    def list_datasets(self) -> List[str]:
+        """列出存储中的数据集ID（不解析数据内容）"""
+        raise NotImplementedError
+
+    def dataset_signature(self, dataset_id: str) -> Optional[List]:
+        """数据集存储内容的签名（如文件大小与修改时间），签名不变说明内容未变；不支持时返回None"""
+        return None
+
+    def load_dataset(self, dataset_id: str, convert_egoexo4d: EgoExo4DConverter) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """加载单个数据集，返回 (dataset, segments_data)，没有片段存储时 segments_data 为None"""
+        raise NotImplementedError
+
+    def ensure_segments(self, dataset_id: str, segments_data: Optional[Dict] = None):
+        """确保数据集有片段存储（加载后对没有片段的数据集调用）"""
+
+    def release_dataset(self, dataset_id: str):
+        """管理器卸载数据集后调用，释放后端持有的该数据集数据"""
+
+    def on_dataset_loaded(self, dataset_id: str):
+        """数据集加载进管理器后调用（JSON后端据此压缩回放过的片段日志）"""
+
+    def save_dataset(self, dataset_id: str, dataset: Dict, changed_samples: Optional[List[Dict]] = None):
+        """保存数据集（样本信息），changed_samples 给出时只有这些样本发生了变化"""
+        raise NotImplementedError
+
+    def save_segments(self, dataset_id: str, segments_data: Dict):
+        """整体替换数据集的片段"""
+        raise NotImplementedError
+
+    def save_segment_op(self, dataset_id: str, op: Dict):
+        """持久化一次片段修改（操作格式见 segment_journal.apply_segment_op）"""
+        raise NotImplementedError
+
+    def save_segment_ops(self, dataset_id: str, ops: List[Dict]):
+        """按顺序持久化一批片段修改（后台写入线程合并后调用）"""
+        for op in ops:
+            self.save_segment_op(dataset_id, op)
+
+    def flush(self):
+        """把尚未合并的修改写入主存储（例如在退出前调用）"""
+
+    def close(self):
+        """释放文件句柄或数据库连接"""
+
+
+class JsonStorageBackend(StorageBackend):
+    """JSON文件后端：每个数据集一个 <id>.json 和 <id>_segments.json，片段修改可先追加到日志；
+    EgoExo4D原始列表格式的 <id>.json 保持只读，转换结果及其后的修改保存在 .converted/<id>.json"""
+
+    CONVERTED_DIR = '.converted'
+
+    def __init__(self, data_dir: str, lock_factory: Optional[Callable[[str], ContextManager[bool]]] = None,
+                 use_journal: bool = True, journal_compact_bytes: int = 4 * 1024 * 1024):
+        self.data_dir = data_dir
+        # 压缩时获取数据集写锁的回调，返回值表示内存数据是否为最新（过期时跳过压缩）
+        self._lock_factory = lock_factory or (lambda dataset_id: nullcontext(True))
+        self.use_journal = use_journal
+        self.journal_compact_bytes = journal_compact_bytes
+        self.journal = SegmentJournal(data_dir)
+        self._compacting = set()
+        self._compacting_lock = threading.Lock()
+        self._segments: Dict = {}
+        # 转换缓存的元信息（不含数据集内容），保存修改时写回缓存而不是源文件
+        self._converted: Dict[str, Dict] = {}
+
+    def initialize(self) -> bool:
+        if os.path.exists(self.data_dir):
+            return False
+        os.makedirs(self.data_dir)
+        return True
+
+    def list_datasets(self) -> List[str]:
+        dataset_ids = []
+        segment_ids = []
+        for filename in os.listdir(self.data_dir):
+            if filename.startswith('.'):
+                continue
+            if filename.endswith('_segments.json'):
+                segment_ids.append(filename[:-len('_segments.json')])
+            elif filename.endswith('.json'):
+                dataset_ids.append(filename[:-len('.json')])
+        segment_ids.extend(self.journal.list_datasets())
+        seen = set(dataset_ids)
+        for dataset_id in segment_ids:
+            if dataset_id not in seen:
+                seen.add(dataset_id)
+                dataset_ids.append(dataset_id)
+        return dataset_ids
+
+    def dataset_signature(self, dataset_id: str) -> Optional[List]:
+        signature = []
+        for path in (os.path.join(self.data_dir, f"{dataset_id}.json"),
+                     self._converted_path(dataset_id),
+                     self._segments_file_path(dataset_id),
+                     self.journal.journal_path(dataset_id)):
+            try:
+                stat = os.stat(path)
+                signature.append([stat.st_size, stat.st_mtime_ns])
+            except OSError:
+                signature.append(None)
+        return signature
+
+    def load_dataset(self, dataset_id: str, convert_egoexo4d: EgoExo4DConverter) -> Tuple[Optional[Dict], Optional[Dict]]:
+        dataset = None
+        if os.path.exists(os.path.join(self.data_dir, f"{dataset_id}.json")):
+            dataset = self._read_dataset_file(dataset_id, convert_egoexo4d)
+
+        segments_data = None
+        if os.path.exists(self._segments_file_path(dataset_id)):
+            with open(self._segments_file_path(dataset_id), 'r', encoding='utf-8') as f:
+                segments_data = json.load(f)
+        ops = self.journal.read_ops(dataset_id)
+        if ops:
+            if segments_data is None:
+                segments_data = {'segments': []}
+            for op in ops:
+                apply_segment_op(segments_data, op)
+        if segments_data is not None:
+            self._segments[dataset_id] = segments_data
+        return dataset, segments_data
+
+    def _converted_path(self, dataset_id: str) -> str:
+        return os.path.join(self.data_dir, self.CONVERTED_DIR, f"{dataset_id}.json")
+
+    def _read_converted_cache(self, dataset_id: str) -> Optional[Dict]:
+        try:
+            with open(self._converted_path(dataset_id), 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cache if isinstance(cache, dict) and isinstance(cache.get('dataset'), dict) else None
+
+    def _write_converted_cache(self, dataset_id: str, meta: Dict, dataset: Dict):
+        os.makedirs(os.path.join(self.data_dir, self.CONVERTED_DIR), exist_ok=True)
+        write_json_atomic(self._converted_path(dataset_id), {**meta, 'dataset': dataset}, indent=None)
+        self._converted[dataset_id] = meta
+
+    def _read_dataset_file(self, dataset_id: str, convert_egoexo4d: EgoExo4DConverter) -> Optional[Dict]:
+        """读取 <id>.json；EgoExo4D列表格式使用以源文件哈希为键的转换缓存，返回None表示不是数据集文件"""
+        filepath = os.path.join(self.data_dir, f"{dataset_id}.json")
+        stat = os.stat(filepath)
+        cache = self._read_converted_cache(dataset_id)
+        cache_valid = cache is not None and cache.get('version') == EGOEXO4D_CACHE_VERSION
+        # 源文件大小和修改时间都未变化时直接使用缓存，无需读取源文件
+        if cache_valid and cache.get('source_size') == stat.st_size \
+                and cache.get('source_mtime_ns') == stat.st_mtime_ns:
+            self._converted[dataset_id] = {k: v for k, v in cache.items() if k != 'dataset'}
+            return cache['dataset']
+
+        with open(filepath, 'rb') as f:
+            raw = f.read()
+        content = json.loads(raw.decode('utf-8'))
+        # 检查是否包含数据集必需字段
+        if isinstance(content, dict) and 'id' in content and 'samples' in content:
+            self._converted.pop(dataset_id, None)
+            return content
+        if not isinstance(content, list) or len(content) == 0:
+            return None
+
+        source_hash = hashlib.sha256(raw).hexdigest()
+        if cache_valid and cache.get('source_hash') == source_hash:
+            dataset = cache['dataset']
+        else:
+            # 处理EgoExo4D格式的数据，转换为标准格式并保留旧缓存中同ID样本的审阅状态
+            dataset = convert_egoexo4d(content, dataset_id)
+            if cache is not None:
+                self._carry_over_annotations(cache['dataset'], dataset)
+            print(f"💾 已缓存EgoExo4D转换结果: {dataset_id}")
+        meta = {
+            'version': EGOEXO4D_CACHE_VERSION,
+            'source_hash': source_hash,
+            'source_size': stat.st_size,
+            'source_mtime_ns': stat.st_mtime_ns
+        }
+        self._write_converted_cache(dataset_id, meta, dataset)
+        return dataset
+
+    @staticmethod
+    def _carry_over_annotations(old_dataset: Dict, dataset: Dict):
+        old_samples = {sample.get('id'): sample for sample in old_dataset.get('samples', [])}
+        for sample in dataset.get('samples', []):
+            old_sample = old_samples.get(sample.get('id'))
+            if old_sample is None:
+                continue
+            for field in EGOEXO4D_CARRY_OVER_FIELDS:
+                if field in old_sample:
+                    sample[field] = old_sample[field]
+
+    def ensure_segments(self, dataset_id: str, segments_data: Optional[Dict] = None):
+        if segments_data is not None:
+            self._segments[dataset_id] = segments_data
+        self._segments.setdefault(dataset_id, {'segments': []})
+        # 创建空的segment文件
+        try:
+            write_json_atomic(self._segments_file_path(dataset_id), {'segments': []})
+            print(f"📝 为数据集 {dataset_id} 创建空的segment文件")
+        except Exception as e:
+            print(f"⚠️ 创建segment文件失败 {dataset_id}: {e}")
+
+    def release_dataset(self, dataset_id: str):
+        self._segments.pop(dataset_id, None)
+
+    def on_dataset_loaded(self, dataset_id: str):
+        if self.journal.size(dataset_id) == 0:
+            return
+        if self.use_journal:
+            self._maybe_compact_segments(dataset_id)
+        elif self._begin_compaction(dataset_id):
+            self._compact_segments(dataset_id)
+
+    def save_dataset(self, dataset_id: str, dataset: Dict, changed_samples: Optional[List[Dict]] = None):
+        if dataset_id in self._converted:
+            self._write_converted_cache(dataset_id, self._converted[dataset_id], dataset)
+            return
+        write_json_atomic(os.path.join(self.data_dir, f"{dataset_id}.json"), dataset)
+
+    def save_segments(self, dataset_id: str, segments_data: Dict):
+        self._segments[dataset_id] = segments_data
+        write_json_atomic(self._segments_file_path(dataset_id), segments_data)
+
+    def save_segment_op(self, dataset_id: str, op: Dict):
+        """日志模式下追加一行，否则重写整个片段文件"""
+        if self.use_journal:
+            journal_size = self.journal.append(dataset_id, op)
+            if journal_size >= self.journal_compact_bytes:
+                self._maybe_compact_segments(dataset_id)
+            return
+
+        write_json_atomic(self._segments_file_path(dataset_id), self._segments[dataset_id])
+
+    def save_segment_ops(self, dataset_id: str, ops: List[Dict]):
+        """日志模式下一次追加全部操作（只fsync一次），否则只重写一次片段文件"""
+        if not ops:
+            return
+        if self.use_journal:
+            journal_size = self.journal.append_many(dataset_id, ops)
+            if journal_size >= self.journal_compact_bytes:
+                self._maybe_compact_segments(dataset_id)
+            return
+
+        write_json_atomic(self._segments_file_path(dataset_id), self._segments[dataset_id])
+
+    def _segments_file_path(self, dataset_id: str) -> str:
+        """获取数据集片段快照文件路径"""
+        return os.path.join(self.data_dir, f"{dataset_id}_segments.json")
+
+    def _maybe_compact_segments(self, dataset_id: str):
+        """日志超过阈值时在后台线程中压缩"""
+        if self.journal.size(dataset_id) < self.journal_compact_bytes:
+            return
+        if not self._begin_compaction(dataset_id):
+            return
+
+        thread = threading.Thread(
+            target=self._compact_segments, args=(dataset_id,),
+            name=f"compact-{dataset_id}", daemon=True
+        )
+        thread.start()
+
+    def _begin_compaction(self, dataset_id: str) -> bool:
+        """登记压缩任务，同一数据集同时只允许一个压缩"""
+        with self._compacting_lock:
+            if dataset_id in self._compacting:
+                return False
+            self._compacting.add(dataset_id)
+            return True
+
+    def _compact_segments(self, dataset_id: str):
+        """将内存中的片段写成快照JSON，并清空已包含在快照中的日志（调用前需先登记）"""
+        try:
+            # 持有数据集写锁（含跨进程锁）期间没有新的日志写入，快照包含日志中的全部操作
+            with self._lock_factory(dataset_id) as is_current:
+                if not is_current:
+                    return
+                content = json.dumps(
+                    self._segments.get(dataset_id, {'segments': []}),
+                    ensure_ascii=False, indent=2
+                )
+                offset = self.journal.size(dataset_id)
+
+                write_file_atomic(self._segments_file_path(dataset_id), content)
+
+                self.journal.discard_prefix(dataset_id, offset)
+            print(f"🗜️ 片段日志已压缩: {dataset_id}")
+        except Exception as e:
+            print(f"❌ 压缩片段日志失败 {dataset_id}: {e}")
+        finally:
+            with self._compacting_lock:
+                self._compacting.discard(dataset_id)
+
+    def flush(self):
+        """立即压缩所有数据集的片段日志"""
+        for dataset_id in self.journal.list_datasets():
+            if self.journal.size(dataset_id) > 0 and self._begin_compaction(dataset_id):
+                self._compact_segments(dataset_id)
+
+    def close(self):
+        self.journal.close()
+
+
+class SqliteStorageBackend(StorageBackend):
+    """SQLite后端：WAL模式，样本与片段各占一行，按 sample_id/status/assigned_to 建索引，每次修改一个事务"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS datasets (
+            id TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            meta TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS samples (
+            dataset_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            sample_id TEXT,
+            assigned_to TEXT,
+            review_status TEXT,
+            data TEXT NOT NULL,
+            PRIMARY KEY (dataset_id, position)
+        );
+        CREATE INDEX IF NOT EXISTS idx_samples_sample_id ON samples (sample_id);
+        CREATE INDEX IF NOT EXISTS idx_samples_assigned_to ON samples (assigned_to);
+        CREATE TABLE IF NOT EXISTS segments (
+            dataset_id TEXT NOT NULL,
+            segment_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            sample_id TEXT,
+            status TEXT,
+            data TEXT NOT NULL,
+            PRIMARY KEY (dataset_id, segment_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_segments_order ON segments (dataset_id, seq);
+        CREATE INDEX IF NOT EXISTS idx_segments_sample_id ON segments (sample_id);
+        CREATE INDEX IF NOT EXISTS idx_segments_status ON segments (status);
+    """
+
+    def __init__(self, database_path: str):
+        self.database_path = database_path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程一个连接，WAL模式下读写互不阻塞"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.database_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def initialize(self) -> bool:
+        directory = os.path.dirname(self.database_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.executescript(self.SCHEMA)
+        return conn.execute('SELECT COUNT(*) FROM datasets').fetchone()[0] == 0
+
+    def load(self, convert_egoexo4d: EgoExo4DConverter) -> Tuple[Dict, Dict]:
+        """一次读出全部数据，返回 (datasets, segments)（导出为JSON时使用）"""
+        conn = self._connection()
+        datasets = {}
+        for dataset_id, meta in conn.execute('SELECT id, meta FROM datasets ORDER BY position'):
+            dataset = json.loads(meta)
+            dataset['samples'] = []
+            datasets[dataset_id] = dataset
+        for dataset_id, data in conn.execute('SELECT dataset_id, data FROM samples ORDER BY dataset_id, position'):
+            if dataset_id in datasets:
+                datasets[dataset_id]['samples'].append(json.loads(data))
+
+        segments = {dataset_id: {'segments': []} for dataset_id in datasets}
+        for dataset_id, data in conn.execute('SELECT dataset_id, data FROM segments ORDER BY dataset_id, seq'):
+            segments.setdefault(dataset_id, {'segments': []})['segments'].append(json.loads(data))
+        return datasets, segments
+
+    def list_datasets(self) -> List[str]:
+        conn = self._connection()
+        dataset_ids = [row[0] for row in conn.execute('SELECT id FROM datasets ORDER BY position')]
+        seen = set(dataset_ids)
+        for (dataset_id,) in conn.execute('SELECT DISTINCT dataset_id FROM segments ORDER BY dataset_id'):
+            if dataset_id not in seen:
+                dataset_ids.append(dataset_id)
+        return dataset_ids
+
+    def load_dataset(self, dataset_id: str, convert_egoexo4d: EgoExo4DConverter) -> Tuple[Optional[Dict], Optional[Dict]]:
+        conn = self._connection()
+        row = conn.execute('SELECT meta FROM datasets WHERE id = ?', (dataset_id,)).fetchone()
+        dataset = None
+        if row is not None:
+            dataset = json.loads(row[0])
+            dataset['samples'] = [
+                json.loads(data) for (data,) in conn.execute(
+                    'SELECT data FROM samples WHERE dataset_id = ? ORDER BY position', (dataset_id,)
+                )
+            ]
+        segments_data = {
+            'segments': [
+                json.loads(data) for (data,) in conn.execute(
+                    'SELECT data FROM segments WHERE dataset_id = ? ORDER BY seq', (dataset_id,)
+                )
+            ]
+        }
+        return dataset, segments_data
+
+    def _write_dataset(self, conn: sqlite3.Connection, dataset_id: str, dataset: Dict):
+        meta = {key: value for key, value in dataset.items() if key != 'samples'}
+        position = conn.execute('SELECT position FROM datasets WHERE id = ?', (dataset_id,)).fetchone()
+        if position is None:
+            position = conn.execute('SELECT COALESCE(MAX(position) + 1, 0) FROM datasets').fetchone()
+        conn.execute(
+            'INSERT OR REPLACE INTO datasets (id, position, meta) VALUES (?, ?, ?)',
+            (dataset_id, position[0], json.dumps(meta, ensure_ascii=False))
+        )
+        conn.execute('DELETE FROM samples WHERE dataset_id = ?', (dataset_id,))
+        conn.executemany(
+            'INSERT INTO samples (dataset_id, position, sample_id, assigned_to, review_status, data) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [
+                (dataset_id, position, sample.get('id'), sample.get('assigned_to'),
+                 sample.get('review_status'), json.dumps(sample, ensure_ascii=False))
+                for position, sample in enumerate(dataset.get('samples', []))
+            ]
+        )
+
+    def save_dataset(self, dataset_id: str, dataset: Dict, changed_samples: Optional[List[Dict]] = None):
+        conn = self._connection()
+        with conn:
+            if changed_samples is None:
+                self._write_dataset(conn, dataset_id, dataset)
+                return
+
+            # 只更新发生变化的样本行；样本ID不唯一时整体重写该数据集
+            for changed_sample in changed_samples:
+                cursor = conn.execute(
+                    'UPDATE samples SET assigned_to = ?, review_status = ?, data = ? '
+                    'WHERE dataset_id = ? AND sample_id = ?',
+                    (changed_sample.get('assigned_to'), changed_sample.get('review_status'),
+                     json.dumps(changed_sample, ensure_ascii=False), dataset_id, changed_sample.get('id'))
+                )
+                if cursor.rowcount != 1:
+                    self._write_dataset(conn, dataset_id, dataset)
+                    return
+
+    def _upsert_segments(self, conn: sqlite3.Connection, dataset_id: str, segments: List[Dict]):
+        next_seq = conn.execute(
+            'SELECT COALESCE(MAX(seq) + 1, 0) FROM segments WHERE dataset_id = ?', (dataset_id,)
+        ).fetchone()[0]
+        conn.executemany(
+            'INSERT INTO segments (dataset_id, segment_id, seq, sample_id, status, data) VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (dataset_id, segment_id) DO UPDATE SET '
+            'sample_id = excluded.sample_id, status = excluded.status, data = excluded.data',
+            [
+                (dataset_id, segment.get('id'), next_seq + i, segment.get('sample_id'),
+                 segment.get('status'), json.dumps(segment, ensure_ascii=False))
+                for i, segment in enumerate(segments)
+            ]
+        )
+
+    def _update_segment_fields(self, conn: sqlite3.Connection, dataset_id: str, segment_id: str, fields: Dict):
+        row = conn.execute(
+            'SELECT data FROM segments WHERE dataset_id = ? AND segment_id = ?', (dataset_id, segment_id)
+        ).fetchone()
+        if row is None:
+            return
+        segment = json.loads(row[0])
+        segment.update(fields)
+        conn.execute(
+            'UPDATE segments SET sample_id = ?, status = ?, data = ? WHERE dataset_id = ? AND segment_id = ?',
+            (segment.get('sample_id'), segment.get('status'), json.dumps(segment, ensure_ascii=False),
+             dataset_id, segment_id)
+        )
+
+    def save_segments(self, dataset_id: str, segments_data: Dict):
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM segments WHERE dataset_id = ?', (dataset_id,))
+            self._upsert_segments(conn, dataset_id, segments_data.get('segments', []))
+
+    def save_segment_op(self, dataset_id: str, op: Dict):
+        self.save_segment_ops(dataset_id, [op])
+
+    def save_segment_ops(self, dataset_id: str, ops: List[Dict]):
+        """同一事务中应用一批片段修改"""
+        conn = self._connection()
+        with conn:
+            for op in ops:
+                self._apply_segment_op(conn, dataset_id, op)
+
+    def _apply_segment_op(self, conn: sqlite3.Connection, dataset_id: str, op: Dict):
+        op_type = op.get('op')
+        if op_type == 'create':
+            self._upsert_segments(conn, dataset_id, [op.get('segment', {})])
+        elif op_type == 'create_many':
+            self._upsert_segments(conn, dataset_id, op.get('segments', []))
+        elif op_type == 'update':
+            self._update_segment_fields(conn, dataset_id, op.get('id'), op.get('fields', {}))
+        elif op_type == 'update_many':
+            for update in op.get('updates', []):
+                self._update_segment_fields(conn, dataset_id, update.get('id'), update.get('fields', {}))
+        elif op_type == 'delete':
+            conn.execute('DELETE FROM segments WHERE dataset_id = ? AND segment_id = ?', (dataset_id, op.get('id')))
+        elif op_type == 'delete_many':
+            conn.executemany(
+                'DELETE FROM segments WHERE dataset_id = ? AND segment_id = ?',
+                [(dataset_id, segment_id) for segment_id in op.get('ids', [])]
+            )
+        else:
+            print(f"⚠️ 未知的片段操作: {op_type}")
+
+    def flush(self):
+        """将WAL合并进主数据库文件"""
+        self._connection().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    # 连接属于其他线程，进程退出时自动关闭
+                    pass
+            self._connections.clear()
+        self._local = threading.local()
+
+    def import_data(self, datasets: Dict, segments: Dict):
+        """整体导入数据（覆盖数据库中的同名数据集）"""
+        conn = self._connection()
+        with conn:
+            for dataset_id, dataset in datasets.items():
+                self._write_dataset(conn, dataset_id, dataset)
+            for dataset_id, segments_data in segments.items():
+                conn.execute('DELETE FROM segments WHERE dataset_id = ?', (dataset_id,))
+                self._upsert_segments(conn, dataset_id, segments_data.get('segments', []))
+
@@ -0,0 +1,362 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from models.atomic_file import write_json_atomic
+from models.media_processor import MEDIA_MISSING, MEDIA_PENDING, MEDIA_READY, MediaProcessor, is_up_to_date
+
+logger = logging.getLogger(__name__)
+
+# 样本缩略图取视频时长的这一比例处的帧（片头常为黑屏或片名）
+POSTER_POSITION = 0.1
+SPRITE_SUFFIX = '_sprite'
+
+
+def youtube_thumbnail_url(youtube_url: Optional[str]) -> Optional[str]:
+    """YouTube视频的官方缩略图地址（视频尚未下载时使用）"""
+    if not youtube_url:
+        return None
+    parsed = urlparse(youtube_url)
+    if parsed.hostname in ('youtu.be', 'www.youtu.be'):
+        video_id = parsed.path.lstrip('/')
+    else:
+        video_id = (parse_qs(parsed.query).get('v') or [None])[0]
+    return f"https://i.ytimg.com/vi/{video_id}/mqdefault.jpg" if video_id else None
+
+
+class ThumbnailService:
+    """样本/片段缩略图和视频时间轴雪碧图
+
+    由有界的ffmpeg线程池从已下载的视频生成，保存在视频目录之外（默认 static/thumbnails），
+    因此视频被缓存清理后缩略图仍然可用；视频重新下载后按修改时间判断并重新生成。
+    片段缩略图在后台按样本生成和清理：片段创建、修改或删除（数据集管理器的修改日志）、视频下载完成和打开样本时
+    排队一次，生成结果记入样本目录下的片段缩略图清单，查询片段缩略图时只读取该清单。
+    """
+
+    def __init__(self, video_manager, base_dir: Optional[str] = None, workers: int = 2,
+                 poster_width: int = 320, sprite_columns: int = 10, sprite_rows: int = 10,
+                 sprite_tile_width: int = 160, sprite_tile_height: int = 90, min_sprite_interval: float = 1.0):
+        if base_dir is None:
+            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            base_dir = os.path.join(project_root, "static", "thumbnails")
+        self.base_dir = base_dir
+        os.makedirs(self.base_dir, exist_ok=True)
+
+        self.video_manager = video_manager
+        self.poster_width = poster_width
+        self.sprite_columns = sprite_columns
+        self.sprite_rows = sprite_rows
+        self.sprite_tile_width = sprite_tile_width
+        self.sprite_tile_height = sprite_tile_height
+        self.min_sprite_interval = min_sprite_interval
+        self.processor = MediaProcessor(workers=workers, name="thumbnail")
+        self._segment_scheduler = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbnail-segments")
+        self._segment_jobs = set()
+        self._segment_lock = threading.Lock()
+        self._manifest_lock = threading.Lock()
+        self.dataset_manager = getattr(video_manager, 'dataset_manager', None)
+        if self.dataset_manager is not None:
+            self.dataset_manager.changes.add_listener(self.on_segment_change)
+            video_manager.add_download_listener(self.schedule_segment_thumbnails)
+
+    # ---- 路径 ----
+
+    def _sample_dir(self, dataset_name: str, sample_name: str) -> str:
+        return os.path.join(self.base_dir, dataset_name, sample_name)
+
+    def get_poster_path(self, dataset_name: str, sample_name: str) -> str:
+        return os.path.join(self._sample_dir(dataset_name, sample_name), 'poster.jpg')
+
+    def get_segment_poster_path(self, dataset_name: str, sample_name: str, start_time: float, end_time: float) -> str:
+        name = f"segment_{int(round(start_time * 1000))}-{int(round(end_time * 1000))}.jpg"
+        return os.path.join(self._sample_dir(dataset_name, sample_name), name)
+
+    def get_sprite_path(self, dataset_name: str, sample_name: str, video_filename: str) -> str:
+        stem = os.path.splitext(video_filename)[0]
+        return os.path.join(self._sample_dir(dataset_name, sample_name), f"{stem}{SPRITE_SUFFIX}.jpg")
+
+    def _url(self, path: str) -> Optional[str]:
+        """缩略图URL，带文件版本参数，重新生成后URL随之变化，浏览器可以长期缓存"""
+        version = self._version(path)
+        return self._versioned_url(path, version) if version else None
+
+    @staticmethod
+    def _version(path: str) -> Optional[str]:
+        try:
+            return f"{os.stat(path).st_mtime_ns:x}"
+        except OSError:
+            return None
+
+    def _versioned_url(self, path: str, version: str) -> str:
+        relative = os.path.relpath(path, self.base_dir).replace(os.sep, '/')
+        return f"/static/thumbnails/{relative}?v={version}"
+
+    # ---- 源视频 ----
+
+    def _source_video(self, dataset_name: str, sample: Dict) -> Optional[str]:
+        """用于生成样本和片段缩略图的视频（第一个已下载的视角），未下载时返回None"""
+        sample_name = sample.get('id')
+        for filename in self.video_manager.get_sample_video_filenames(dataset_name, sample):
+            if self.video_manager.check_video_exists(dataset_name, sample_name, filename):
+                return self.video_manager.get_video_path(dataset_name, sample_name, filename)
+        return None
+
+    def _duration(self, video_path: str) -> Optional[float]:
+        """视频时长（来自元数据缓存），尚未探测时提交后台探测并返回None"""
+        metadata = self.video_manager.video_metadata.get(video_path)
+        if metadata is None:
+            self.video_manager.video_metadata.schedule([video_path])
+            return None
+        return metadata.get('duration')
+
+    def _ensure(self, output_path: str, source_path: Optional[str], args_factory) -> Optional[str]:
+        """输出已是最新或源视频不在本地时直接返回已有文件，否则提交生成任务；返回可用文件的URL"""
+        if source_path is None or is_up_to_date(output_path, [source_path]):
+            return self._url(output_path)
+        args = args_factory()
+        if args is not None:
+            self.processor.submit(output_path, args, [source_path])
+        # 旧版本在新文件生成前仍可使用
+        return self._url(output_path)
+
+    def _poster_args(self, source_path: str, seek_time: float) -> List[str]:
+        return [
+            '-ss', f"{max(seek_time, 0):.3f}",
+            '-i', source_path,
+            '-frames:v', '1', '-an',
+            '-vf', f"scale={self.poster_width}:-2",
+            '-q:v', '4', '-update', '1'
+        ]
+
+    # ---- 缩略图 ----
+
+    def get_sample_thumbnail(self, dataset_name: str, sample: Dict) -> Optional[str]:
+        """样本缩略图URL；视频已下载但缩略图缺失或过期时提交生成，尚无缩略图的YouTube样本使用官方缩略图"""
+        poster_path = self.get_poster_path(dataset_name, sample.get('id'))
+        source_path = self._source_video(dataset_name, sample)
+
+        def poster_args():
+            duration = self._duration(source_path)
+            if duration is None:
+                return None
+            return self._poster_args(source_path, duration * POSTER_POSITION)
+
+        url = self._ensure(poster_path, source_path, poster_args)
+        if url is None and sample.get('type') == 'youtube':
+            return youtube_thumbnail_url(sample.get('youtube_url'))
+        return url
+
+    # 片段缩略图清单：{缩略图文件名: 版本}
+    SEGMENT_MANIFEST = 'segments.json'
+
+    @staticmethod
+    def _segment_times(segment: Dict) -> Optional[Tuple[float, float]]:
+        start_time, end_time = segment.get('start_time'), segment.get('end_time')
+        if not isinstance(start_time, (int, float)) or not isinstance(end_time, (int, float)) or end_time <= start_time:
+            return None
+        return start_time, end_time
+
+    def _read_segment_manifest(self, dataset_name: str, sample_name: str) -> Dict[str, str]:
+        try:
+            with open(os.path.join(self._sample_dir(dataset_name, sample_name), self.SEGMENT_MANIFEST),
+                      'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return manifest if isinstance(manifest, dict) else {}
+
+    def _update_segment_manifest(self, dataset_name: str, sample_name: str,
+                                 entries: Optional[Dict[str, str]] = None, removed: set = frozenset()):
+        """更新片段缩略图清单（进程内串行）；其他进程的并发更新可能丢失条目，下次为样本排队时会重新记录"""
+        with self._manifest_lock:
+            manifest = self._read_segment_manifest(dataset_name, sample_name)
+            if not entries and not set(removed) & set(manifest):
+                return
+            for name in removed:
+                manifest.pop(name, None)
+            manifest.update(entries or {})
+            manifest_path = os.path.join(self._sample_dir(dataset_name, sample_name), self.SEGMENT_MANIFEST)
+            try:
+                os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+                write_json_atomic(manifest_path, manifest, indent=None)
+            except OSError as e:
+                logger.warning(f"保存片段缩略图清单失败 {manifest_path}: {str(e)}")
+
+    def _record_segment_poster(self, dataset_name: str, sample_name: str, poster_path: str, success: bool):
+        version = self._version(poster_path) if success else None
+        if version:
+            self._update_segment_manifest(dataset_name, sample_name, {os.path.basename(poster_path): version})
+
+    def get_segment_thumbnails(self, dataset_name: str, sample: Dict, segments: List[Dict]) -> List[Optional[str]]:
+        """各片段缩略图URL（取片段中点处的帧，以 (开始, 结束) 为键），尚未生成时为None；只读取片段缩略图清单"""
+        sample_name = sample.get('id')
+        manifest = self._read_segment_manifest(dataset_name, sample_name)
+        urls = []
+        for segment in segments:
+            times = self._segment_times(segment)
+            poster_path = self.get_segment_poster_path(dataset_name, sample_name, *times) if times else None
+            version = manifest.get(os.path.basename(poster_path)) if poster_path else None
+            urls.append(self._versioned_url(poster_path, version) if version else None)
+        return urls
+
+    def _generate_segment_thumbnails(self, dataset_name: str, sample: Dict, segments: List[Dict]):
+        """为已下载样本的片段提交缩略图任务（已是最新的跳过，清单中缺少的补记）"""
+        sample_name = sample.get('id')
+        source_path = self._source_video(dataset_name, sample)
+        if source_path is None:
+            return
+        manifest = self._read_segment_manifest(dataset_name, sample_name)
+        for segment in segments:
+            times = self._segment_times(segment)
+            if times is None:
+                continue
+            poster_path = self.get_segment_poster_path(dataset_name, sample_name, *times)
+            if is_up_to_date(poster_path, [source_path]):
+                if os.path.basename(poster_path) not in manifest:
+                    self._record_segment_poster(dataset_name, sample_name, poster_path, True)
+                continue
+            self.processor.submit(
+                poster_path, self._poster_args(source_path, (times[0] + times[1]) / 2), [source_path],
+                on_done=lambda path, success: self._record_segment_poster(dataset_name, sample_name, path, success)
+            )
+
+    def prune_segment_thumbnails(self, dataset_name: str, sample: Dict, segments: List[Dict]):
+        """删除不再对应样本任何片段的片段缩略图（传入样本的全部片段）"""
+        sample_dir = self._sample_dir(dataset_name, sample.get('id'))
+        if not os.path.isdir(sample_dir):
+            return
+        expected = {
+            os.path.basename(self.get_segment_poster_path(dataset_name, sample.get('id'),
+                                                          segment['start_time'], segment['end_time']))
+            for segment in segments
+            if isinstance(segment.get('start_time'), (int, float)) and isinstance(segment.get('end_time'), (int, float))
+        }
+        for name in os.listdir(sample_dir):
+            if name.startswith('segment_') and name.endswith('.jpg') and '.tmp.' not in name and name not in expected:
+                try:
+                    os.remove(os.path.join(sample_dir, name))
+                except OSError:
+                    pass
+        self._update_segment_manifest(dataset_name, sample.get('id'),
+                                      removed=set(self._read_segment_manifest(dataset_name, sample.get('id'))) - expected)
+
+    def on_segment_change(self, change: Dict):
+        """数据集修改监听器（在修改线程中调用）：片段创建、修改或删除后在后台更新该样本的片段缩略图"""
+        if change.get('type') != 'segment':
+            return
+        sample_id = (change.get('data') or {}).get('sample_id')
+        if sample_id:
+            self.schedule_segment_thumbnails(change.get('dataset_id'), sample_id)
+
+    def schedule_segment_thumbnails(self, dataset_name: str, sample_name: str):
+        """在后台为样本的全部片段生成缩略图并清理多余的缩略图（片段修改、视频下载完成、打开样本时），同一样本不重复排队"""
+        with self._segment_lock:
+            if (dataset_name, sample_name) in self._segment_jobs:
+                return
+            self._segment_jobs.add((dataset_name, sample_name))
+        self._segment_scheduler.submit(self._refresh_segment_thumbnails, dataset_name, sample_name)
+
+    def _refresh_segment_thumbnails(self, dataset_name: str, sample_id: str):
+        try:
+            with self._segment_lock:
+                self._segment_jobs.discard((dataset_name, sample_id))
+            found = self.dataset_manager.get_sample(sample_id)
+            if found is None or found[0] != dataset_name:
+                return
+            segments = self.dataset_manager.get_segments_for_sample(sample_id)
+            self._generate_segment_thumbnails(dataset_name, found[1], segments)
+            self.prune_segment_thumbnails(dataset_name, found[1], segments)
+        except Exception as e:
+            logger.warning(f"更新片段缩略图失败 {dataset_name}/{sample_id}: {str(e)}")
+
+    # ---- 时间轴雪碧图 ----
+
+    def _sprite_layout(self, duration: float) -> Dict:
+        """雪碧图布局：按时长均匀取 columns*rows 帧，间隔不小于 min_sprite_interval"""
+        interval = max(duration / (self.sprite_columns * self.sprite_rows), self.min_sprite_interval)
+        return {
+            'interval': round(interval, 3),
+            'columns': self.sprite_columns,
+            'rows': self.sprite_rows,
+            'tile_width': self.sprite_tile_width,
+            'tile_height': self.sprite_tile_height
+        }
+
+    def _sprite_args(self, source_path: str, layout: Dict) -> List[str]:
+        width, height = layout['tile_width'], layout['tile_height']
+        filters = ','.join([
+            f"fps=1/{layout['interval']}",
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease",
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2",
+            f"tile={layout['columns']}x{layout['rows']}"
+        ])
+        # 只解码关键帧，生成时间与视频长度而不是帧数相关
+        return [
+            '-skip_frame', 'nokey',
+            '-i', source_path,
+            '-vf', filters,
+            '-frames:v', '1', '-an',
+            '-q:v', '5', '-update', '1'
+        ]
+
+    def _write_layout(self, sprite_path: str, layout: Dict, success: bool):
+        if not success:
+            return
+        layout_path = os.path.splitext(sprite_path)[0] + '.json'
+        try:
+            write_json_atomic(layout_path, layout, indent=None)
+        except OSError as e:
+            logger.warning(f"保存雪碧图布局失败 {layout_path}: {str(e)}")
+
+    def _read_layout(self, sprite_path: str) -> Optional[Dict]:
+        try:
+            with open(os.path.splitext(sprite_path)[0] + '.json', 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get_sprite(self, dataset_name: str, sample: Dict, video_filename: str) -> Dict:
+        """视频的时间轴雪碧图：{'filename', 'url', 'status', 布局字段}，url 为None时尚不可用"""
+        sample_name = sample.get('id')
+        sprite_path = self.get_sprite_path(dataset_name, sample_name, video_filename)
+        source_path = None
+        if self.video_manager.check_video_exists(dataset_name, sample_name, video_filename):
+            source_path = self.video_manager.get_video_path(dataset_name, sample_name, video_filename)
+
+        if source_path is not None and not is_up_to_date(sprite_path, [source_path]):
+            duration = self._duration(source_path)
+            if duration:
+                new_layout = self._sprite_layout(duration)
+                self.processor.submit(
+                    sprite_path, self._sprite_args(source_path, new_layout), [source_path],
+                    on_done=lambda path, success: self._write_layout(path, new_layout, success)
+                )
+
+        result = {'filename': video_filename, 'url': None, 'status': self.processor.status(sprite_path)}
+        layout = self._read_layout(sprite_path)
+        url = self._url(sprite_path)
+        if url is not None and layout is not None:
+            result.update(layout)
+            result['url'] = url
+        elif result['status'] in (MEDIA_READY, MEDIA_MISSING) and source_path is not None:
+            # 正在探测视频时长（随后提交生成）或刚生成完、布局文件尚未写入
+            result['status'] = MEDIA_PENDING
+        return result
+
+    def get_sample_sprites(self, dataset_name: str, sample: Dict) -> List[Dict]:
+        """样本每个视角的时间轴雪碧图"""
+        return [
+            self.get_sprite(dataset_name, sample, filename)
+            for filename in self.video_manager.get_sample_video_filenames(dataset_name, sample)
+        ]
+
+    def shutdown(self, wait: bool = False):
+        if self.dataset_manager is not None:
+            self.dataset_manager.changes.remove_listener(self.on_segment_change)
+            self.video_manager.remove_download_listener(self.schedule_segment_thumbnails)
+        self._segment_scheduler.shutdown(wait=wait, cancel_futures=not wait)
+        self.processor.shutdown(wait=wait)
@@ -1,20 +1,44 @@
+import functools
+import inspect
+import json
 import os
+import subprocess
 import zipfile
 import requests
 import shutil
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 import yt_dlp
 from huggingface_hub import hf_hub_download
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from models.atomic_file import write_json_atomic
+from models.video_metadata import VideoMetadataStore, probe_keyframe_before
+from models.media_processor import MediaProcessor, is_up_to_date
+from models.download_jobs import (
+    DownloadJob, DownloadJobQueue, PRIORITY_USER, PRIORITY_PREFETCH,
+    PHASE_DOWNLOAD, PHASE_MERGE, PHASE_EXTRACT, PHASE_VALIDATE
+)
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class DownloadCancelled(Exception):
+    """下载任务被取消"""
+
+
 class VideoDownloadManager:
     """视频下载管理器，处理YouTube和HuggingFace视频下载"""
     
-    def __init__(self, base_video_dir: str = None, dataset_manager=None):
+    def __init__(self, base_video_dir: str = None, dataset_manager=None,
+                 youtube_workers: int = 2, huggingface_workers: int = 3,
+                 prefetch_count: int = 3, prefetch_budget_bytes: Optional[int] = 20 * 1024 ** 3,
+                 open_sample_ttl: float = 30 * 60, cache_budget_bytes: Optional[int] = None,
+                 per_file_download: bool = False, per_file_workers: int = 4,
+                 proxy_workers: int = 2, proxy_height: int = 360, clip_workers: int = 2):
         # 如果没有指定，使用项目根目录下的static/videos
         if base_video_dir is None:
             # 获取当前文件所在目录的上级目录（项目根目录）
@@ -26,35 +50,738 @@ class VideoDownloadManager:
             
         self.hf_repo = "GuangsTrip/spatialpredictsource"
         self.hf_repo_type = "dataset"  # 明确指定为数据集仓库
+        # 逐文件下载模式下单个视频在仓库中的路径
+        self.hf_file_template = "videos/{dataset}/{sample}/{filename}"
         
         # 数据集管理器引用，用于管理异常状态
         self.dataset_manager = dataset_manager
         
         # 确保基础目录存在
         os.makedirs(self.base_video_dir, exist_ok=True)
+        
+        # 后台下载任务队列，按来源限制并发
+        self.download_jobs = DownloadJobQueue(
+            self._run_download_job,
+            {'youtube': youtube_workers, 'huggingface': huggingface_workers}
+        )
+        
+        # 逐文件下载：多视角样本的各个视频并发下载（所有任务共享一个有界线程池）
+        self.per_file_download = per_file_download
+        self._file_download_pool = ThreadPoolExecutor(
+            max_workers=per_file_workers, thread_name_prefix="download-file"
+        )
+        
+        # 预取配置：提前下载标注队列中接下来的样本，磁盘占用不超过预算
+        self.prefetch_count = prefetch_count
+        self.prefetch_budget_bytes = prefetch_budget_bytes
+        
+        # 正在被打开查看的样本 (dataset, sample) -> 最近访问时间，超过TTL视为已关闭
+        self.open_sample_ttl = open_sample_ttl
+        self._open_samples: Dict[Tuple[str, str], float] = {}
+        self._open_lock = threading.Lock()
+        
+        # 视频缓存：记录每个样本目录的大小和最近访问时间（按LRU顺序），超出预算时清理
+        self.cache_budget_bytes = cache_budget_bytes
+        self._cache_entries: OrderedDict = OrderedDict()
+        # 已下载文件索引 (dataset, sample) -> {文件名: {size, mtime, validation}}
+        self._video_index: Dict[Tuple[str, str], Dict[str, Dict]] = {}
+        self._cache_lock = threading.Lock()
+        self._cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'evicted_bytes': 0}
+        self._scan_video_cache()
+        
+        # 视频元数据缓存（ffprobe结果持久化），启动时在后台探测已有但未缓存的文件
+        self.video_metadata = VideoMetadataStore(
+            self.base_video_dir, os.path.join(self.base_video_dir, '.video_metadata.json')
+        )
+        indexed_videos = self._indexed_video_paths()
+        self.video_metadata.prune(indexed_videos)
+        self.video_metadata.schedule(indexed_videos)
+        
+        # 多视角样本的低分辨率代理视频（关键帧密集的H.264），下载完成后由后台ffmpeg线程池生成，
+        # 保存在样本目录的 proxies/ 下，随样本一起计入缓存预算和清理
+        self.proxy_height = proxy_height
+        self.proxy_processor = MediaProcessor(workers=proxy_workers, name="proxy")
+        
+        # 片段剪辑缓存：每个片段在每个视角上用流复制剪出的短视频，以 (视频, 开始, 结束) 为键保存在 clips/ 下；
+        # 片段创建/修改时间/删除通过数据集管理器的修改日志通知，在单独线程中更新，不阻塞标注请求
+        self.clip_processor = MediaProcessor(workers=clip_workers, name="clip")
+        self._clip_scheduler = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clip-scheduler")
+        self._segment_clips: Dict[Tuple[str, str], Dict[str, set]] = {}
+        self._clip_jobs = set()
+        self._clip_lock = threading.Lock()
+        self._clip_manifest_lock = threading.Lock()
+        # 样本下载成功后的回调 (dataset_name, sample_name)，在下载线程中调用（如缩略图服务）
+        self._download_listeners: List[Callable[[str, str], None]] = []
+        if dataset_manager is not None:
+            dataset_manager.changes.add_listener(self.on_segment_change)
         logger.info(f"视频下载管理器初始化完成，基础目录: {self.base_video_dir}")
     
+    def submit_download(self, dataset_name: str, sample_name: str, video_type: str,
+                        video_info: Optional[Dict] = None, priority: int = PRIORITY_USER) -> Tuple[DownloadJob, bool]:
+        """提交后台下载任务，立即返回；同一样本的重复请求共享同一个任务"""
+        if video_type == 'youtube':
+            if not (video_info or {}).get('youtube_url'):
+                raise ValueError("缺少YouTube链接")
+            source = 'youtube'
+        elif video_type in ['single_video', 'multiple_videos']:
+            if not isinstance((video_info or {}).get('per_file', False), bool):
+                raise ValueError("per_file 必须是布尔值")
+            source = 'huggingface'
+        else:
+            raise ValueError(f"不支持的视频类型: {video_type}")
+        
+        return self.download_jobs.submit(dataset_name, sample_name, video_type, video_info, source, priority)
+    
+    def get_download_job(self, job_id: str) -> Optional[DownloadJob]:
+        """获取下载任务"""
+        return self.download_jobs.get(job_id)
+    
+    def list_download_jobs(self, dataset_name: str = None, sample_name: str = None) -> List[DownloadJob]:
+        """列出下载任务"""
+        return self.download_jobs.list_jobs(dataset_name, sample_name)
+    
+    def cancel_download_job(self, job_id: str) -> bool:
+        """取消下载任务"""
+        return self.download_jobs.cancel(job_id)
+    
+    def _run_download_job(self, job: DownloadJob) -> Dict[str, str]:
+        """在工作线程中执行下载任务"""
+        if job.video_type == 'youtube':
+            video_filename = f"{job.sample_name}_youtube.mp4"
+            result = self.download_youtube_video(
+                job.video_info.get('youtube_url'), job.dataset_name, job.sample_name, video_filename, job=job
+            )
+        else:
+            sample = self._find_sample(job.dataset_name, job.sample_name)
+            per_file = job.video_info.get('per_file', self.per_file_download)
+            if per_file and sample and len(sample.get('video_paths') or []) > 1:
+                result = self.download_huggingface_files(job.dataset_name, sample, job=job)
+            else:
+                result = self.download_huggingface_video(job.dataset_name, job.sample_name, job=job)
+        
+        # 更新缓存记录，超出预算时清理最久未使用的样本
+        self._refresh_cache_entry(job.dataset_name, job.sample_name)
+        if result.get('success'):
+            self.video_metadata.schedule(self._indexed_video_paths(job.dataset_name, job.sample_name))
+            if job.video_type == 'multiple_videos':
+                self.schedule_proxies(job.dataset_name, job.sample_name)
+            if self.dataset_manager:
+                self.schedule_sample_clips(job.dataset_name, job.sample_name)
+            for listener in list(self._download_listeners):
+                try:
+                    listener(job.dataset_name, job.sample_name)
+                except Exception as e:
+                    logger.warning(f"下载完成回调失败 {job.dataset_name}/{job.sample_name}: {str(e)}")
+            self.enforce_cache_budget()
+        return result
+    
+    def add_download_listener(self, listener: Callable[[str, str], None]):
+        """注册样本下载成功后的回调"""
+        self._download_listeners.append(listener)
+    
+    def remove_download_listener(self, listener: Callable[[str, str], None]):
+        if listener in self._download_listeners:
+            self._download_listeners.remove(listener)
+    
+    def _cancelled_result(self) -> Dict[str, str]:
+        return {
+            "success": False,
+            "cancelled": True,
+            "message": "下载已取消"
+        }
+    
+    def open_sample(self, dataset_name: str, sample_name: str):
+        """标记样本正在被查看（预取与清理都不会动它）"""
+        with self._open_lock:
+            self._open_samples[(dataset_name, sample_name)] = time.time()
+        self.touch_sample(dataset_name, sample_name)
+    
+    def close_sample(self, dataset_name: str, sample_name: str):
+        """取消样本的查看标记"""
+        with self._open_lock:
+            self._open_samples.pop((dataset_name, sample_name), None)
+    
+    def is_sample_open(self, dataset_name: str, sample_name: str) -> bool:
+        """样本是否正在被查看"""
+        with self._open_lock:
+            opened_at = self._open_samples.get((dataset_name, sample_name))
+            if opened_at is None:
+                return False
+            if time.time() - opened_at > self.open_sample_ttl:
+                del self._open_samples[(dataset_name, sample_name)]
+                return False
+            return True
+    
+    def get_sample_video_filenames(self, dataset_name: str, sample: Dict) -> List[str]:
+        """样本下载完成后应存在的视频文件名"""
+        if sample.get('type') == 'youtube':
+            return [f"{sample.get('id')}_youtube.mp4"]
+        video_paths = sample.get('video_paths') or ([sample['video_path']] if sample.get('video_path') else [])
+        return [os.path.basename(path) for path in video_paths]
+    
+    def is_sample_downloaded(self, dataset_name: str, sample: Dict) -> bool:
+        """样本的全部视频是否都已在本地"""
+        filenames = self.get_sample_video_filenames(dataset_name, sample)
+        return bool(filenames) and all(
+            self.check_video_exists(dataset_name, sample.get('id'), filename) for filename in filenames
+        )
+    
+    # 下载过程中的临时文件，不计入视频索引
+    TEMP_FILE_SUFFIXES = ('.part', '.tmp', '.ytdl')
+    
+    def _scan_sample_dir(self, sample_dir: str) -> Tuple[Dict[str, Dict], int, float]:
+        """扫描样本目录，返回 (顶层文件索引, 目录总大小, 最近修改时间)"""
+        files = {}
+        total = 0
+        latest_mtime = 0.0
+        pending = [(sample_dir, True)]
+        while pending:
+            directory, top_level = pending.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append((entry.path, False))
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                total += stat.st_size
+                latest_mtime = max(latest_mtime, stat.st_mtime)
+                if top_level and not entry.name.endswith(self.TEMP_FILE_SUFFIXES):
+                    files[entry.name] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'validation': None}
+        return files, total, latest_mtime
+    
+    def _scan_video_cache(self):
+        """启动时扫描视频目录，建立文件索引；以文件修改时间作为初始访问时间"""
+        entries = []
+        for dataset_entry in os.scandir(self.base_video_dir):
+            if not dataset_entry.is_dir():
+                continue
+            for sample_entry in os.scandir(dataset_entry.path):
+                if not sample_entry.is_dir():
+                    continue
+                files, size, mtime = self._scan_sample_dir(sample_entry.path)
+                if size > 0:
+                    entries.append(((dataset_entry.name, sample_entry.name), files, size, mtime))
+        
+        entries.sort(key=lambda entry: entry[3])
+        with self._cache_lock:
+            self._cache_entries.clear()
+            self._video_index.clear()
+            for key, files, size, mtime in entries:
+                self._cache_entries[key] = {'size': size, 'last_access': mtime}
+                self._video_index[key] = files
+        logger.info(f"视频缓存扫描完成: {len(entries)} 个样本，共 {self.format_file_size(self.get_cache_usage_bytes())}")
+    
+    def _refresh_cache_entry(self, dataset_name: str, sample_name: str):
+        """重新扫描样本目录（下载或删除后调用），目录为空时移除记录；未变化文件保留校验结果"""
+        sample_dir = os.path.join(self.base_video_dir, dataset_name, sample_name)
+        if os.path.isdir(sample_dir):
+            files, size, _ = self._scan_sample_dir(sample_dir)
+        else:
+            files, size = {}, 0
+        key = (dataset_name, sample_name)
+        with self._cache_lock:
+            previous = self._video_index.pop(key, {})
+            for filename, info in files.items():
+                old = previous.get(filename)
+                if old and old['size'] == info['size'] and old['mtime'] == info['mtime']:
+                    info['validation'] = old['validation']
+            
+            self._cache_entries.pop(key, None)
+            if size > 0:
+                self._cache_entries[key] = {'size': size, 'last_access': time.time()}
+                self._video_index[key] = files
+    
+    def _record_validation(self, dataset_name: str, sample_name: str, video_filename: str, validation: Dict):
+        """在索引中记录视频校验结果"""
+        key = (dataset_name, sample_name)
+        with self._cache_lock:
+            indexed = video_filename in self._video_index.get(key, {})
+        if not indexed:
+            self._refresh_cache_entry(dataset_name, sample_name)
+        with self._cache_lock:
+            info = self._video_index.get(key, {}).get(video_filename)
+            if info is not None:
+                info['validation'] = bool(validation.get('valid'))
+    
+    def _indexed_video_paths(self, dataset_name: str = None, sample_name: str = None) -> List[str]:
+        """索引中的视频文件路径，可按样本过滤"""
+        with self._cache_lock:
+            keys = [(dataset_name, sample_name)] if dataset_name else list(self._video_index.keys())
+            return [
+                self.get_video_path(key[0], key[1], filename)
+                for key in keys
+                for filename in self._video_index.get(key, {})
+                if self._is_video_file(filename)
+            ]
+    
+    def get_sample_metadata(self, dataset_name: str, sample_name: str) -> List[Dict]:
+        """获取样本各视频的元数据（时长、分辨率、帧率、编码），未缓存的文件提交后台探测"""
+        paths = self._indexed_video_paths(dataset_name, sample_name)
+        self.video_metadata.schedule(paths)
+        return [
+            {
+                'filename': os.path.basename(path),
+                'metadata': self.video_metadata.get(path),
+                'pending': self.video_metadata.is_pending(path)
+            }
+            for path in paths
+        ]
+    
+    def _get_indexed_file(self, dataset_name: str, sample_name: str, video_filename: str) -> Optional[Dict]:
+        with self._cache_lock:
+            info = self._video_index.get((dataset_name, sample_name), {}).get(video_filename)
+            return dict(info) if info else None
+    
+    def touch_sample(self, dataset_name: str, sample_name: str):
+        """记录样本被访问，移动到LRU队尾"""
+        key = (dataset_name, sample_name)
+        with self._cache_lock:
+            entry = self._cache_entries.get(key)
+            if entry is not None:
+                entry['last_access'] = time.time()
+                self._cache_entries.move_to_end(key)
+    
+    def get_cache_usage_bytes(self) -> int:
+        """视频目录当前占用的磁盘空间（来自缓存记录）"""
+        with self._cache_lock:
+            return sum(entry['size'] for entry in self._cache_entries.values())
+    
+    def _find_sample(self, dataset_name: str, sample_name: str) -> Optional[Dict]:
+        """从数据集管理器中查找样本"""
+        if not self.dataset_manager:
+            return None
+        found = self.dataset_manager.get_sample(sample_name)
+        if found is None or found[0] != dataset_name:
+            return None
+        return found[1]
+    
+    def _is_sample_reviewed(self, dataset_name: str, sample_name: str) -> bool:
+        sample = self._find_sample(dataset_name, sample_name)
+        return bool(sample) and sample.get('review_status') == '已审阅'
+    
+    def _is_sample_evictable(self, dataset_name: str, sample_name: str) -> bool:
+        """正在查看或仍在下载的样本不能清理"""
+        if self.is_sample_open(dataset_name, sample_name):
+            return False
+        return self.download_jobs.get_active(dataset_name, sample_name) is None
+    
+    def enforce_cache_budget(self) -> List[Dict]:
+        """超出磁盘预算时按LRU顺序清理样本：先清理已审阅的，再清理未打开的，返回被清理的样本"""
+        if self.cache_budget_bytes is None:
+            return []
+        
+        with self._cache_lock:
+            usage = sum(entry['size'] for entry in self._cache_entries.values())
+            if usage <= self.cache_budget_bytes:
+                return []
+            lru_keys = list(self._cache_entries.keys())
+        
+        candidates = [key for key in lru_keys if self._is_sample_evictable(*key)]
+        reviewed = [key for key in candidates if self._is_sample_reviewed(*key)]
+        reviewed_keys = set(reviewed)
+        ordered = reviewed + [key for key in candidates if key not in reviewed_keys]
+        
+        evicted = []
+        for dataset_name, sample_name in ordered:
+            if usage <= self.cache_budget_bytes:
+                break
+            sample_dir = os.path.join(self.base_video_dir, dataset_name, sample_name)
+            try:
+                shutil.rmtree(sample_dir)
+            except OSError as e:
+                logger.error(f"清理缓存样本失败 {sample_dir}: {str(e)}")
+                continue
+            
+            with self._cache_lock:
+                entry = self._cache_entries.pop((dataset_name, sample_name), None)
+                self._video_index.pop((dataset_name, sample_name), None)
+                size = entry['size'] if entry else 0
+                self._cache_stats['evictions'] += 1
+                self._cache_stats['evicted_bytes'] += size
+            usage -= size
+            evicted.append({'dataset': dataset_name, 'sample': sample_name, 'size': size})
+            logger.info(f"已清理缓存样本: {dataset_name}/{sample_name} ({self.format_file_size(size)})")
+        
+        if usage > self.cache_budget_bytes:
+            logger.warning(f"视频缓存仍超出预算: {self.format_file_size(usage)} / "
+                           f"{self.format_file_size(self.cache_budget_bytes)}（其余样本正在使用）")
+        return evicted
+    
+    def set_cache_budget(self, budget_bytes: Optional[int]) -> List[Dict]:
+        """修改磁盘预算（None表示不限制）并立即执行清理"""
+        self.cache_budget_bytes = budget_bytes
+        return self.enforce_cache_budget()
+    
+    def get_cache_stats(self) -> Dict:
+        """视频缓存使用情况：占用、预算、命中/未命中次数与清理次数"""
+        with self._cache_lock:
+            usage = sum(entry['size'] for entry in self._cache_entries.values())
+            stats = dict(self._cache_stats)
+            sample_count = len(self._cache_entries)
+        return {
+            'usage_bytes': usage,
+            'usage': self.format_file_size(usage),
+            'budget_bytes': self.cache_budget_bytes,
+            'samples': sample_count,
+            **stats
+        }
+    
+    def prefetch_samples(self, dataset_name: str, annotator: str, current_sample: str = None,
+                         count: int = None) -> List[DownloadJob]:
+        """按标注顺序在后台预取当前样本之后的未审阅样本，返回提交的任务"""
+        if not self.dataset_manager:
+            return []
+        
+        count = self.prefetch_count if count is None else count
+        samples = self.dataset_manager.get_samples_for_dataset(dataset_name, annotator)
+        
+        # 从当前样本之后开始
+        start = 0
+        for i, sample in enumerate(samples):
+            if sample.get('id') == current_sample:
+                start = i + 1
+                break
+        
+        jobs = []
+        usage = None
+        for sample in samples[start:]:
+            if len(jobs) >= count:
+                break
+            if sample.get('review_status') == '已审阅':
+                continue
+            if sample.get('exception_status', {}).get('is_exception', False):
+                continue
+            if self.is_sample_downloaded(dataset_name, sample):
+                continue
+            
+            # 超出磁盘预算时停止预取
+            if self.prefetch_budget_bytes is not None:
+                if usage is None:
+                    usage = self.get_cache_usage_bytes()
+                if usage >= self.prefetch_budget_bytes:
+                    logger.info(f"视频缓存已达预取预算 {self.format_file_size(self.prefetch_budget_bytes)}，停止预取")
+                    break
+            
+            video_info = {'youtube_url': sample.get('youtube_url')} if sample.get('type') == 'youtube' else {}
+            try:
+                job, _ = self.submit_download(
+                    dataset_name, sample.get('id'), sample.get('type'), video_info, priority=PRIORITY_PREFETCH
+                )
+                jobs.append(job)
+            except ValueError as e:
+                logger.warning(f"跳过预取样本 {sample.get('id')}: {e}")
+        
+        if jobs:
+            logger.info(f"已提交 {len(jobs)} 个预取任务: {[job.sample_name for job in jobs]}")
+        return jobs
+    
     def check_video_exists(self, dataset_name: str, sample_name: str, video_filename: str) -> bool:
-        """检查本地视频文件是否存在"""
-        video_path = os.path.join(self.base_video_dir, dataset_name, sample_name, video_filename)
-        return os.path.exists(video_path)
+        """检查本地视频文件是否存在（查询内存索引）"""
+        return self._get_indexed_file(dataset_name, sample_name, video_filename) is not None
     
     def get_video_path(self, dataset_name: str, sample_name: str, video_filename: str) -> str:
         """获取视频的完整路径"""
         return os.path.join(self.base_video_dir, dataset_name, sample_name, video_filename)
     
+    # 代理视频目录（位于样本目录内）
+    PROXY_DIR = 'proxies'
+    
+    def get_proxy_path(self, dataset_name: str, sample_name: str, video_filename: str) -> str:
+        """获取视频对应代理文件的完整路径"""
+        stem = os.path.splitext(video_filename)[0]
+        return os.path.join(self.base_video_dir, dataset_name, sample_name, self.PROXY_DIR, f"{stem}.mp4")
+    
+    def _proxy_args(self, source_path: str) -> List[str]:
+        # 缩放到不超过 proxy_height 的高度，每12帧一个关键帧以便快速定位，去掉音轨
+        return [
+            '-i', source_path,
+            '-map', '0:v:0',
+            '-vf', f"scale=-2:'min({self.proxy_height},ih)'",
+            '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '28',
+            '-g', '12', '-keyint_min', '12', '-sc_threshold', '0',
+            '-pix_fmt', 'yuv420p', '-an',
+            '-movflags', '+faststart'
+        ]
+    
+    def schedule_proxies(self, dataset_name: str, sample_name: str) -> int:
+        """为样本已下载的视频提交代理转码任务（已是最新的跳过），返回新提交的数量"""
+        submitted = 0
+        for source_path in self._indexed_video_paths(dataset_name, sample_name):
+            proxy_path = self.get_proxy_path(dataset_name, sample_name, os.path.basename(source_path))
+            if is_up_to_date(proxy_path, [source_path]):
+                continue
+            if self.proxy_processor.submit(
+                proxy_path, self._proxy_args(source_path), [source_path],
+                on_done=lambda path, success: self._refresh_cache_entry(dataset_name, sample_name)
+            ) is not None:
+                submitted += 1
+        if submitted:
+            logger.info(f"已提交 {submitted} 个代理视频转码任务: {dataset_name}/{sample_name}")
+        return submitted
+    
+    def get_sample_proxy_paths(self, dataset_name: str, sample: Dict, schedule: bool = True) -> List[Optional[str]]:
+        """多视角样本每个视角的代理视频URL（尚未生成时为None），schedule 为True时为缺少代理的已下载视角提交转码"""
+        if sample.get('type') != 'multiple_videos':
+            return []
+        sample_name = sample.get('id')
+        proxy_paths = []
+        missing = False
+        for filename in self.get_sample_video_filenames(dataset_name, sample):
+            proxy_path = self.get_proxy_path(dataset_name, sample_name, filename)
+            if not self.check_video_exists(dataset_name, sample_name, filename):
+                proxy_paths.append(None)
+            elif is_up_to_date(proxy_path, [self.get_video_path(dataset_name, sample_name, filename)]):
+                relative = os.path.relpath(proxy_path, self.base_video_dir).replace(os.sep, '/')
+                proxy_paths.append(f"/static/videos/{relative}")
+            else:
+                proxy_paths.append(None)
+                missing = True
+        if missing and schedule:
+            self.schedule_proxies(dataset_name, sample_name)
+        return proxy_paths
+    
+    # 片段剪辑目录（位于样本目录内）
+    CLIP_DIR = 'clips'
+    
+    def get_clip_path(self, dataset_name: str, sample_name: str, video_filename: str,
+                      start_time: float, end_time: float) -> str:
+        """获取 (视频, 开始, 结束) 对应剪辑文件的完整路径（时间精确到毫秒）"""
+        stem = os.path.splitext(video_filename)[0]
+        name = f"{stem}_{int(round(start_time * 1000))}-{int(round(end_time * 1000))}.mp4"
+        return os.path.join(self.base_video_dir, dataset_name, sample_name, self.CLIP_DIR, name)
+    
+    # 剪辑清单（位于剪辑目录内）：{剪辑文件名: {'start': 实际开始时间, 'source_mtime': 生成时源视频的修改时间}}，
+    # 查询剪辑时每个样本只读取这一个文件
+    CLIP_MANIFEST = 'clips.json'
+    
+    def _clip_manifest_path(self, dataset_name: str, sample_name: str) -> str:
+        return os.path.join(self.base_video_dir, dataset_name, sample_name, self.CLIP_DIR, self.CLIP_MANIFEST)
+    
+    def _read_clip_manifest(self, dataset_name: str, sample_name: str) -> Dict[str, Dict]:
+        try:
+            with open(self._clip_manifest_path(dataset_name, sample_name), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return manifest if isinstance(manifest, dict) else {}
+    
+    def _update_clip_manifest(self, dataset_name: str, sample_name: str,
+                              entries: Optional[Dict[str, Dict]] = None, removed: Iterable[str] = ()):
+        """更新剪辑清单（进程内串行）；其他进程的并发更新可能丢失条目，下次补齐样本剪辑时会重新记录"""
+        removed = set(removed)
+        with self._clip_manifest_lock:
+            manifest = self._read_clip_manifest(dataset_name, sample_name)
+            if not entries and not removed & set(manifest):
+                return
+            for name in removed:
+                manifest.pop(name, None)
+            manifest.update(entries or {})
+            manifest_path = self._clip_manifest_path(dataset_name, sample_name)
+            try:
+                if not manifest and not os.path.exists(manifest_path):
+                    return
+                os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+                write_json_atomic(manifest_path, manifest, indent=None)
+            except OSError as e:
+                logger.warning(f"保存剪辑清单失败 {manifest_path}: {str(e)}")
+    
+    def _clip_args(self, source_path: str, start_time: float, end_time: float) -> List[str]:
+        # 输入端定位并流复制，不重新编码；流复制从 start_time 之前最近的关键帧开始，
+        # 实际开始时间在生成后探测并写入信息文件。时间戳归零使剪辑从0秒开始
+        return [
+            '-ss', f"{start_time:.3f}",
+            '-i', source_path,
+            '-t', f"{end_time - start_time:.3f}",
+            '-map', '0', '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero',
+            '-movflags', '+faststart'
+        ]
+    
+    def _finish_clip(self, dataset_name: str, sample_name: str, source_path: str, start_time: float,
+                     clip_path: str, success: bool):
+        """剪辑生成后探测其实际开始时间（不晚于片段开始的最后一个关键帧）并记入剪辑清单；
+        探测失败时记录为未知，剪辑不会返回给界面"""
+        if success:
+            self._record_clip(dataset_name, sample_name, source_path, start_time, clip_path)
+        self._refresh_cache_entry(dataset_name, sample_name)
+    
+    def _record_clip(self, dataset_name: str, sample_name: str, source_path: str, start_time: float, clip_path: str):
+        clip_start = None
+        try:
+            clip_start = probe_keyframe_before(source_path, start_time)
+        except FileNotFoundError:
+            logger.warning(f"未找到ffprobe，无法确定剪辑开始时间: {clip_path}")
+        except Exception as e:
+            logger.warning(f"探测剪辑开始时间失败 {clip_path}: {str(e)}")
+        try:
+            source_mtime = os.stat(source_path).st_mtime
+        except OSError:
+            return
+        self._update_clip_manifest(dataset_name, sample_name, {
+            os.path.basename(clip_path): {'start': clip_start, 'source_mtime': source_mtime}
+        })
+    
+    @staticmethod
+    def _segment_times(segment: Dict) -> Optional[Tuple[float, float]]:
+        start_time, end_time = segment.get('start_time'), segment.get('end_time')
+        if not isinstance(start_time, (int, float)) or not isinstance(end_time, (int, float)):
+            return None
+        if start_time < 0 or end_time <= start_time:
+            return None
+        return float(start_time), float(end_time)
+    
+    def _segment_clip_paths(self, dataset_name: str, sample: Dict, segment: Dict) -> List[Tuple[str, Optional[str]]]:
+        """片段在各视角上的 (源视频路径, 剪辑路径)，视角未下载或时间无效时剪辑路径为None"""
+        sample_name = sample.get('id')
+        times = self._segment_times(segment)
+        paths = []
+        for filename in self.get_sample_video_filenames(dataset_name, sample):
+            source_path = self.get_video_path(dataset_name, sample_name, filename)
+            if times is None or not self.check_video_exists(dataset_name, sample_name, filename):
+                paths.append((source_path, None))
+            else:
+                paths.append((source_path, self.get_clip_path(dataset_name, sample_name, filename, *times)))
+        return paths
+    
+    def schedule_segment_clips(self, dataset_name: str, sample: Dict, segments: List[Dict], prune: bool = False) -> int:
+        """为样本的片段提交剪辑任务（已是最新的跳过，清单中缺少的补记），prune 为True时（需传入样本的全部片段）
+        删除不再对应任何片段的剪辑文件；返回新提交的数量（在剪辑调度线程中调用）"""
+        sample_name = sample.get('id')
+        submitted = 0
+        expected = set()
+        manifest = self._read_clip_manifest(dataset_name, sample_name)
+        for segment in segments:
+            clip_paths = set()
+            for source_path, clip_path in self._segment_clip_paths(dataset_name, sample, segment):
+                if clip_path is None:
+                    continue
+                clip_paths.add(clip_path)
+                start_time, end_time = self._segment_times(segment)
+                if is_up_to_date(clip_path, [source_path]):
+                    if os.path.basename(clip_path) not in manifest:
+                        self._record_clip(dataset_name, sample_name, source_path, start_time, clip_path)
+                    continue
+                if self.clip_processor.submit(
+                    clip_path, self._clip_args(source_path, start_time, end_time), [source_path],
+                    on_done=functools.partial(self._finish_clip, dataset_name, sample_name, source_path, start_time)
+                ) is not None:
+                    submitted += 1
+            self._replace_segment_clips(dataset_name, sample_name, segment.get('id'), clip_paths)
+            expected |= clip_paths
+        
+        if prune:
+            clip_dir = os.path.join(self.base_video_dir, dataset_name, sample_name, self.CLIP_DIR)
+            if os.path.isdir(clip_dir):
+                expected_names = {os.path.basename(path) for path in expected} | {self.CLIP_MANIFEST}
+                stale = [
+                    name for name in os.listdir(clip_dir)
+                    if name not in expected_names and '.tmp' not in name
+                ]
+                self._remove_files([os.path.join(clip_dir, name) for name in stale])
+                self._update_clip_manifest(dataset_name, sample_name, removed=set(manifest) - expected_names)
+        return submitted
+    
+    def _replace_segment_clips(self, dataset_name: str, sample_name: str, segment_id: str, clip_paths: set):
+        """更新片段对应的剪辑文件，删除不再被样本中任何片段使用的旧剪辑（片段时间修改或删除后）"""
+        with self._clip_lock:
+            sample_clips = self._segment_clips.setdefault((dataset_name, sample_name), {})
+            old_paths = sample_clips.pop(segment_id, set())
+            if clip_paths:
+                sample_clips[segment_id] = set(clip_paths)
+            # 剪辑位于样本目录内，只可能被同一样本的片段共用
+            in_use = set().union(*sample_clips.values())
+            if not sample_clips:
+                del self._segment_clips[(dataset_name, sample_name)]
+            stale = [path for path in old_paths - clip_paths if path not in in_use]
+        self._remove_files(stale)
+        if stale:
+            self._update_clip_manifest(dataset_name, sample_name, removed={os.path.basename(path) for path in stale})
+    
+    def schedule_sample_clips(self, dataset_name: str, sample_name: str):
+        """在后台为样本的全部片段补齐剪辑并清理多余剪辑（视频下载完成后、或发现缺少剪辑时），同一样本不重复排队"""
+        with self._clip_lock:
+            if (dataset_name, sample_name) in self._clip_jobs:
+                return
+            self._clip_jobs.add((dataset_name, sample_name))
+        self._clip_scheduler.submit(self._rebuild_sample_clips, dataset_name, sample_name)
+    
+    def _rebuild_sample_clips(self, dataset_name: str, sample_name: str):
+        try:
+            with self._clip_lock:
+                self._clip_jobs.discard((dataset_name, sample_name))
+            sample = self._find_sample(dataset_name, sample_name)
+            if sample is None:
+                return
+            segments = self.dataset_manager.get_segments_for_sample(sample_name)
+            self.schedule_segment_clips(dataset_name, sample, segments, prune=True)
+        except Exception as e:
+            logger.warning(f"更新样本剪辑失败 {dataset_name}/{sample_name}: {str(e)}")
+    
+    def on_segment_change(self, change: Dict):
+        """数据集修改监听器（在修改线程中调用）：片段创建、修改或删除后在后台更新剪辑"""
+        if change.get('type') != 'segment':
+            return
+        self._clip_scheduler.submit(self._apply_segment_change, change)
+    
+    def _apply_segment_change(self, change: Dict):
+        try:
+            segment = change.get('data') or {}
+            if change.get('action') == 'delete':
+                self._replace_segment_clips(change.get('dataset_id'), segment.get('sample_id'), change.get('id'), set())
+                return
+            sample = self._find_sample(change.get('dataset_id'), segment.get('sample_id'))
+            if sample is None:
+                return
+            self.schedule_segment_clips(change.get('dataset_id'), sample, [segment])
+        except Exception as e:
+            logger.warning(f"更新片段剪辑失败 {change.get('id')}: {str(e)}")
+    
+    def get_sample_clips(self, dataset_name: str, sample: Dict,
+                         segments: List[Dict]) -> List[Tuple[List[Optional[str]], List[Optional[float]]]]:
+        """各片段在各视角上已生成的剪辑URL及其在源视频中的实际开始时间（尚未生成的视角为None）；
+        只读取样本的剪辑清单和内存中的视频索引，不提交剪辑任务"""
+        sample_name = sample.get('id')
+        manifest = self._read_clip_manifest(dataset_name, sample_name)
+        source_mtimes = {}
+        for filename in self.get_sample_video_filenames(dataset_name, sample):
+            info = self._get_indexed_file(dataset_name, sample_name, filename)
+            source_mtimes[self.get_video_path(dataset_name, sample_name, filename)] = info['mtime'] if info else None
+        
+        result = []
+        for segment in segments:
+            urls, starts = [], []
+            for source_path, clip_path in self._segment_clip_paths(dataset_name, sample, segment):
+                entry = manifest.get(os.path.basename(clip_path)) if clip_path is not None else None
+                start = entry.get('start') if isinstance(entry, dict) else None
+                # 源视频重新下载后剪辑已过期
+                if isinstance(start, (int, float)) and entry.get('source_mtime') == source_mtimes.get(source_path):
+                    relative = os.path.relpath(clip_path, self.base_video_dir).replace(os.sep, '/')
+                    urls.append(f"/static/videos/{relative}")
+                    starts.append(float(start))
+                else:
+                    urls.append(None)
+                    starts.append(None)
+            result.append((urls, starts))
+        return result
+    
     def get_video_status(self, dataset_name: str, sample_name: str, video_filename: str) -> Dict[str, str]:
         """获取视频状态信息"""
         video_path = self.get_video_path(dataset_name, sample_name, video_filename)
+        info = self._get_indexed_file(dataset_name, sample_name, video_filename)
         
-        if os.path.exists(video_path):
-            # 获取文件大小
-            file_size = os.path.getsize(video_path)
+        if info is not None:
             return {
                 "status": "已下载",
                 "path": video_path,
-                "size": self.format_file_size(file_size),
-                "exists": True
+                "size": self.format_file_size(info['size']),
+                "exists": True,
+                "valid": info['validation']
             }
         else:
             return {
@@ -65,8 +792,9 @@ class VideoDownloadManager:
             }
     
     def download_youtube_video(self, youtube_url: str, dataset_name: str, sample_name: str, 
-                              video_filename: str) -> Dict[str, str]:
+                              video_filename: str, job: Optional[DownloadJob] = None) -> Dict[str, str]:
         """从YouTube下载视频"""
+        target_path = None
         try:
             # 创建目标目录
             target_dir = os.path.join(self.base_video_dir, dataset_name, sample_name)
@@ -94,7 +822,6 @@ class VideoDownloadManager:
             
             # 使用subprocess调用，与FrameQuiz完全一致
             try:
-                import subprocess
                 # 确保使用正确的环境变量，特别是conda环境
                 env = os.environ.copy()
                 # 确保PATH包含conda的bin目录
@@ -105,11 +832,13 @@ class VideoDownloadManager:
                 logger.info(f"使用环境PATH: {env['PATH']}")
                 
                 # 使用与FrameQuiz完全相同的subprocess调用方式
-                process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
-                stdout, stderr = process.communicate()
+                returncode, stderr = self._run_yt_dlp(command, env, job)
                 
-                if process.returncode != 0:
-                    error_msg = stderr.decode() if stderr else "Unknown error"
+                if job and job.is_cancelled():
+                    raise DownloadCancelled()
+                
+                if returncode != 0:
+                    error_msg = stderr or "Unknown error"
                     logger.warning(f"FrameQuiz策略失败，尝试兼容策略: {error_msg}")
                     
                     # 如果FrameQuiz策略失败，尝试更兼容的格式选择
@@ -122,11 +851,13 @@ class VideoDownloadManager:
                     ]
                     
                     logger.info("尝试兼容策略下载...")
-                    fallback_process = subprocess.Popen(fallback_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
-                    fallback_stdout, fallback_stderr = fallback_process.communicate()
+                    fallback_returncode, fallback_stderr = self._run_yt_dlp(fallback_command, env, job)
+                    
+                    if job and job.is_cancelled():
+                        raise DownloadCancelled()
                     
-                    if fallback_process.returncode != 0:
-                        fallback_error = fallback_stderr.decode() if fallback_stderr else "Unknown error"
+                    if fallback_returncode != 0:
+                        fallback_error = fallback_stderr or "Unknown error"
                         logger.error(f"兼容策略也失败: {fallback_error}")
                         raise Exception(f"All download strategies failed. FrameQuiz: {error_msg}, Fallback: {fallback_error}")
                     
@@ -136,6 +867,8 @@ class VideoDownloadManager:
                 
                 logger.info("YouTube视频下载完成")
                 
+            except DownloadCancelled:
+                raise
             except Exception as e:
                 logger.error(f"YouTube视频下载失败: {str(e)}")
                 raise e
@@ -147,7 +880,10 @@ class VideoDownloadManager:
                 # 验证文件完整性
                 if file_size > 0:
                     # 尝试获取视频时长等信息来验证文件
+                    if job:
+                        job.update_progress(phase=PHASE_VALIDATE)
                     validation_result = self._validate_video_file(target_path)
+                    self._record_validation(dataset_name, sample_name, video_filename, validation_result)
                     
                     if validation_result["valid"]:
                         logger.info(f"YouTube视频下载成功: {target_path}, 大小: {self.format_file_size(file_size)}")
@@ -189,11 +925,18 @@ class VideoDownloadManager:
                     "success": False,
                     "message": "YouTube视频下载失败：文件未创建"
                 }
+        
+        except DownloadCancelled:
+            logger.info(f"YouTube视频下载已取消: {youtube_url}")
+            self.cleanup_temp_files(dataset_name, sample_name)
+            if target_path and os.path.exists(target_path):
+                os.remove(target_path)
+            return self._cancelled_result()
                 
         except Exception as e:
             logger.error(f"YouTube视频下载失败: {str(e)}")
             # 清理可能的部分下载文件
-            if os.path.exists(target_path):
+            if target_path and os.path.exists(target_path):
                 try:
                     os.remove(target_path)
                     logger.info(f"已清理部分下载文件: {target_path}")
@@ -220,56 +963,36 @@ class VideoDownloadManager:
             }
     
     def _validate_video_file(self, video_path: str) -> Dict[str, str]:
-        """验证视频文件的有效性"""
+        """验证视频文件的有效性（ffprobe结果写入元数据缓存）"""
         try:
-            import subprocess
-            import json
-            
-            # 使用ffprobe检查视频文件
-            cmd = [
-                'ffprobe', 
-                '-v', 'quiet', 
-                '-print_format', 'json', 
-                '-show_format', 
-                '-show_streams', 
-                video_path
-            ]
+            metadata = self.video_metadata.get_or_probe(video_path)
             
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0:
-                try:
-                    info = json.loads(result.stdout)
-                    
-                    # 检查是否有视频流
-                    if 'streams' in info and any(s.get('codec_type') == 'video' for s in info['streams']):
-                        format_info = info.get('format', {})
-                        duration = format_info.get('duration', 'Unknown')
-                        format_name = format_info.get('format_name', 'Unknown')
-                        
-                        return {
-                            "valid": True,
-                            "duration": duration,
-                            "format": format_name,
-                            "message": "视频文件验证成功"
-                        }
-                    else:
-                        return {
-                            "valid": False,
-                            "message": "文件不包含有效的视频流"
-                        }
-                        
-                except json.JSONDecodeError:
-                    return {
-                        "valid": False,
-                        "message": "无法解析视频文件信息"
-                    }
+            # 检查是否有视频流
+            if metadata.get('has_video'):
+                duration = metadata.get('duration')
+                return {
+                    "valid": True,
+                    "duration": duration if duration is not None else 'Unknown',
+                    "format": metadata.get('format') or 'Unknown',
+                    "metadata": metadata,
+                    "message": "视频文件验证成功"
+                }
             else:
                 return {
                     "valid": False,
-                    "message": f"ffprobe检查失败: {result.stderr}"
+                    "message": "文件不包含有效的视频流"
                 }
                 
+        except ValueError:
+            return {
+                "valid": False,
+                "message": "无法解析视频文件信息"
+            }
+        except RuntimeError as e:
+            return {
+                "valid": False,
+                "message": str(e)
+            }
         except subprocess.TimeoutExpired:
             return {
                 "valid": False,
@@ -331,7 +1054,8 @@ class VideoDownloadManager:
                 "message": f"基本验证失败: {str(e)}"
             }
     
-    def download_huggingface_video(self, dataset_name: str, sample_name: str) -> Dict[str, str]:
+    def download_huggingface_video(self, dataset_name: str, sample_name: str,
+                                   job: Optional[DownloadJob] = None) -> Dict[str, str]:
         """从HuggingFace下载视频压缩包并解压"""
         try:
             # 创建目标目录
@@ -346,29 +1070,34 @@ class VideoDownloadManager:
             logger.info(f"开始从HuggingFace下载: {self.hf_repo}/videos/{dataset_name}/{zip_filename}")
             
             try:
+                download_kwargs = {}
+                if job and self._hf_supports_tqdm_class():
+                    download_kwargs['tqdm_class'] = self._make_hf_progress_class(job)
+                
                 downloaded_path = hf_hub_download(
                     repo_id=self.hf_repo,
                     repo_type="dataset",  # 明确指定为数据集仓库
                     filename=f"videos/{dataset_name}/{zip_filename}",
                     local_dir=target_dir,
-                    local_dir_use_symlinks=False
+                    local_dir_use_symlinks=False,
+                    **download_kwargs
                 )
                 
+                # hf_hub_download 无法中途打断，下载完成后再响应取消
+                if job and job.is_cancelled():
+                    if os.path.exists(downloaded_path):
+                        os.remove(downloaded_path)
+                    return self._cancelled_result()
+                
                 # 如果下载成功，解压文件
                 if os.path.exists(downloaded_path):
                     logger.info(f"压缩包下载成功: {downloaded_path}")
                     
-                    # 解压文件
-                    extract_result = self._extract_zip_file(downloaded_path, target_dir)
+                    # 流式解压到目标目录（成功后删除压缩包）
+                    extract_result = self._extract_zip_file(downloaded_path, target_dir, job=job)
+                    self._remove_empty_dirs(os.path.dirname(downloaded_path), target_dir)
                     
                     if extract_result["success"]:
-                        # 删除压缩包
-                        os.remove(downloaded_path)
-                        logger.info(f"压缩包已删除: {downloaded_path}")
-                        
-                        # 清理多余的目录结构
-                        self._cleanup_extraction_dirs(target_dir)
-                        
                         return {
                             "success": True,
                             "message": "视频下载并解压成功",
@@ -397,111 +1126,345 @@ class VideoDownloadManager:
                 "message": f"视频下载过程失败: {str(e)}"
             }
     
-    def _extract_zip_file(self, zip_path: str, extract_dir: str) -> Dict[str, str]:
-        """解压ZIP文件"""
+    def _order_video_files(self, sample: Dict) -> List[str]:
+        """排列下载顺序：ego视角（aria*）优先，其次 best_exo 视角，其余保持原顺序"""
+        best_exo = (sample.get('egoexo4d_metadata') or {}).get('best_exo') or ''
+        filenames = self.get_sample_video_filenames(None, sample)
+        
+        def rank(filename: str) -> int:
+            stem = os.path.splitext(filename)[0]
+            if filename.lower().startswith('aria'):
+                return 0
+            if best_exo and (stem == best_exo or stem.startswith(best_exo)):
+                return 1
+            return 2
+        
+        return sorted(filenames, key=rank)
+    
+    def download_huggingface_files(self, dataset_name: str, sample: Dict,
+                                   job: Optional[DownloadJob] = None) -> Dict[str, str]:
+        """逐文件并发下载多视角样本，下载完成的视角立即可用；仓库中没有单独文件时回退到压缩包"""
+        sample_name = sample.get('id')
+        target_dir = os.path.join(self.base_video_dir, dataset_name, sample_name)
+        os.makedirs(target_dir, exist_ok=True)
+        
+        filenames = [
+            filename for filename in self._order_video_files(sample)
+            if not self.check_video_exists(dataset_name, sample_name, filename)
+        ]
+        if job:
+            for filename in filenames:
+                job.update_file_progress(filename, status='queued')
+        
+        # 按优先级顺序提交，线程池有界，ego/best_exo 视角最先开始
+        futures = {
+            filename: self._file_download_pool.submit(
+                self._download_huggingface_file, dataset_name, sample_name, filename, target_dir, job
+            )
+            for filename in filenames
+        }
+        
+        downloaded_files = []
+        failed = {}
+        for filename, future in futures.items():
+            result = future.result()
+            if result['success']:
+                downloaded_files.append({
+                    "filename": filename,
+                    "path": result['path'],
+                    "size": self.format_file_size(os.path.getsize(result['path']))
+                })
+            else:
+                failed[filename] = result['message']
+        
+        self._remove_empty_dirs(os.path.join(target_dir, 'videos', dataset_name, sample_name), target_dir)
+        
+        if job and job.is_cancelled():
+            return self._cancelled_result()
+        
+        if failed and not downloaded_files and len(failed) == len(filenames):
+            logger.warning(f"逐文件下载失败，回退到压缩包下载: {dataset_name}/{sample_name}")
+            return self.download_huggingface_video(dataset_name, sample_name, job=job)
+        
+        if failed:
+            return {
+                "success": False,
+                "message": f"{len(failed)} 个视频下载失败: {', '.join(failed)}",
+                "failed_files": failed,
+                "extracted_files": downloaded_files,
+                "path": target_dir
+            }
+        
+        # 下载成功时清除异常状态
+        if self.dataset_manager:
+            try:
+                self.dataset_manager.set_sample_exception_status(sample_name, False)
+                logger.info(f"已清除样本 {sample_name} 的异常状态")
+            except Exception as status_error:
+                logger.error(f"清除异常状态失败: {status_error}")
+        
+        return {
+            "success": True,
+            "message": f"视频下载成功，共 {len(downloaded_files)} 个视频文件",
+            "extracted_files": downloaded_files,
+            "path": target_dir
+        }
+    
+    def _download_huggingface_file(self, dataset_name: str, sample_name: str, filename: str,
+                                   target_dir: str, job: Optional[DownloadJob] = None) -> Dict[str, str]:
+        """下载单个视频文件并移动到样本目录"""
+        if job and job.is_cancelled():
+            job.update_file_progress(filename, status='cancelled')
+            return self._cancelled_result()
+        
         try:
-            extracted_files = []
+            if job:
+                job.update_file_progress(filename, status='downloading')
+            download_kwargs = {}
+            if job and self._hf_supports_tqdm_class():
+                download_kwargs['tqdm_class'] = self._make_hf_progress_class(job, filename)
+            
+            downloaded_path = hf_hub_download(
+                repo_id=self.hf_repo,
+                repo_type=self.hf_repo_type,
+                filename=self.hf_file_template.format(dataset=dataset_name, sample=sample_name, filename=filename),
+                local_dir=target_dir,
+                **download_kwargs
+            )
+            
+            target_path = os.path.join(target_dir, filename)
+            os.replace(downloaded_path, target_path)
+            
+            # 与YouTube下载相同：校验文件，无效时删除并按失败处理
+            if job:
+                job.update_file_progress(filename, status='validating')
+            validation_result = self._validate_video_file(target_path)
+            if not validation_result["valid"]:
+                logger.warning(f"视频文件验证失败 {target_path}: {validation_result['message']}")
+                os.remove(target_path)
+                self._refresh_cache_entry(dataset_name, sample_name)
+                message = f"视频文件验证失败: {validation_result['message']}"
+                if job:
+                    job.update_file_progress(filename, status='failed', error=message)
+                return {"success": False, "message": message}
+            self._refresh_cache_entry(dataset_name, sample_name)
+            self._record_validation(dataset_name, sample_name, filename, validation_result)
+            if job:
+                job.update_file_progress(filename, status='downloaded')
+            logger.info(f"视频文件下载完成: {dataset_name}/{sample_name}/{filename}")
+            return {"success": True, "path": target_path}
+        
+        except Exception as e:
+            logger.error(f"视频文件下载失败 {dataset_name}/{sample_name}/{filename}: {str(e)}")
+            if job:
+                job.update_file_progress(filename, status='failed', error=str(e))
+            return {"success": False, "message": str(e)}
+    
+    def _hf_supports_tqdm_class(self) -> bool:
+        """旧版本 huggingface_hub 的 hf_hub_download 不支持 tqdm_class 参数"""
+        if not hasattr(self, '_hf_tqdm_supported'):
+            self._hf_tqdm_supported = 'tqdm_class' in inspect.signature(hf_hub_download).parameters
+        return self._hf_tqdm_supported
+    
+    def _make_hf_progress_class(self, job: DownloadJob, filename: Optional[str] = None):
+        """构造把HuggingFace下载字节数写入任务进度的tqdm子类（指定 filename 时按文件记录）"""
+        from tqdm.auto import tqdm
+        
+        class JobProgress(tqdm):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                # 进度条可能被禁用（此时tqdm不累计n），因此自行统计字节数
+                self._job_bytes = kwargs.get('initial', 0) or 0
+                self._job_started = time.monotonic()
             
+            def update(self, n=1):
+                result = super().update(n)
+                self._job_bytes += n or 0
+                elapsed = time.monotonic() - self._job_started
+                speed = self._job_bytes / elapsed if elapsed > 0 else None
+                total = int(self.total) if self.total else None
+                eta = (total - self._job_bytes) / speed if total and speed else None
+                if filename:
+                    job.update_file_progress(
+                        filename, downloaded_bytes=int(self._job_bytes), total_bytes=total, speed=speed, eta=eta
+                    )
+                    return result
+                job.update_progress(
+                    phase=PHASE_DOWNLOAD, downloaded_bytes=int(self._job_bytes),
+                    total_bytes=total, speed=speed, eta=eta
+                )
+                return result
+        
+        return JobProgress
+    
+    # 解压时的读写缓冲区大小
+    EXTRACT_CHUNK_SIZE = 4 * 1024 * 1024
+    
+    def _extract_zip_file(self, zip_path: str, extract_dir: str,
+                          job: Optional[DownloadJob] = None) -> Dict[str, str]:
+        """流式解压ZIP文件：每个成员直接写入目标目录下的扁平文件名；全部解压成功后才删除压缩包，
+        失败时保留压缩包，重试时可直接重新解压（取消时与下载阶段一样删除）"""
+        extracted_files = []
+        written_paths = []
+        try:
             with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                # 获取压缩包中的文件列表
-                file_list = zip_ref.namelist()
+                # 跳过目录和 __MACOSX 垃圾文件，只保留文件名，不保持目录结构
+                members = [
+                    info for info in zip_ref.infolist()
+                    if not info.is_dir() and not info.filename.startswith('__MACOSX/')
+                    and os.path.basename(info.filename)
+                ]
                 
-                # 解压所有文件，只保留文件名，不保持目录结构
-                for file_name in file_list:
-                    # 跳过目录
-                    if file_name.endswith('/'):
-                        continue
-                    
-                    # 只获取文件名，不包含路径
-                    base_filename = os.path.basename(file_name)
-                    
-                    # 解压到目标目录，使用基础文件名
-                    zip_ref.extract(file_name, extract_dir)
+                extracted_bytes = 0
+                total_bytes = sum(info.file_size for info in members)
+                if job:
+                    job.update_progress(phase=PHASE_EXTRACT, downloaded_bytes=0, total_bytes=total_bytes,
+                                        speed=None, eta=None)
+                
+                for info in members:
+                    if job and job.is_cancelled():
+                        raise DownloadCancelled()
                     
-                    # 如果解压后的文件不在目标目录根目录，需要移动
-                    extracted_file_path = os.path.join(extract_dir, file_name)
+                    base_filename = os.path.basename(info.filename)
                     target_file_path = os.path.join(extract_dir, base_filename)
+                    temp_path = target_file_path + '.part'
+                    written_paths.append(temp_path)
                     
-                    # 如果文件不在根目录，移动到根目录
-                    if extracted_file_path != target_file_path:
-                        if os.path.exists(target_file_path):
-                            os.remove(target_file_path)  # 如果目标文件已存在，先删除
-                        shutil.move(extracted_file_path, target_file_path)
-                        extracted_file_path = target_file_path
+                    with zip_ref.open(info) as src, open(temp_path, 'wb') as dst:
+                        while True:
+                            chunk = src.read(self.EXTRACT_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            dst.write(chunk)
+                            if job:
+                                extracted_bytes += len(chunk)
+                                job.update_progress(downloaded_bytes=extracted_bytes)
+                    os.replace(temp_path, target_file_path)
+                    written_paths[-1] = target_file_path
                     
                     # 如果是视频文件，添加到列表
                     if self._is_video_file(base_filename):
                         extracted_files.append({
                             "filename": base_filename,
-                            "path": extracted_file_path,
-                            "size": self.format_file_size(os.path.getsize(extracted_file_path))
+                            "path": target_file_path,
+                            "size": self.format_file_size(info.file_size)
                         })
-                
-                logger.info(f"解压完成，共解压 {len(extracted_files)} 个视频文件")
-                
-                return {
-                    "success": True,
-                    "message": f"解压成功，共 {len(extracted_files)} 个视频文件",
-                    "files": extracted_files
-                }
-                
+            
+            self._remove_files([zip_path])
+            logger.info(f"解压完成，共解压 {len(extracted_files)} 个视频文件，压缩包已删除")
+            
+            return {
+                "success": True,
+                "message": f"解压成功，共 {len(extracted_files)} 个视频文件",
+                "files": extracted_files
+            }
+        
+        except DownloadCancelled:
+            self._remove_files(written_paths + [zip_path])
+            return self._cancelled_result()
         except Exception as e:
-            logger.error(f"解压失败: {str(e)}")
+            logger.error(f"解压失败（已保留压缩包 {zip_path}）: {str(e)}")
+            self._remove_files(written_paths)
             return {
                 "success": False,
                 "message": f"解压失败: {str(e)}"
             }
     
-    def _cleanup_extraction_dirs(self, target_dir: str):
-        """清理解压后产生的多余目录结构"""
-        try:
-            # 查找并删除多余的目录
-            for item in os.listdir(target_dir):
-                item_path = os.path.join(target_dir, item)
-                
-                # 删除 __MACOSX 目录（macOS解压产生的垃圾目录）
-                if item == '__MACOSX':
-                    shutil.rmtree(item_path)
-                    logger.info(f"已删除垃圾目录: {item_path}")
-                    continue
-                
-                # 删除 videos 目录（ZIP内部路径结构）
-                if item == 'videos' and os.path.isdir(item_path):
-                    # 检查videos目录下是否有内容
-                    videos_content = os.listdir(item_path)
-                    if len(videos_content) == 1 and os.path.isdir(os.path.join(item_path, videos_content[0])):
-                        # 如果videos下只有一个目录，且该目录为空或只包含视频文件，则删除整个videos目录
-                        inner_dir = os.path.join(item_path, videos_content[0])
-                        inner_content = os.listdir(inner_dir)
-                        if all(self._is_video_file(f) for f in inner_content):
-                            # 移动视频文件到目标目录
-                            for video_file in inner_content:
-                                src_path = os.path.join(inner_dir, video_file)
-                                dst_path = os.path.join(target_dir, video_file)
-                                if not os.path.exists(dst_path):
-                                    shutil.move(src_path, dst_path)
-                                    logger.info(f"已移动视频文件: {video_file}")
-                            
-                            # 删除整个videos目录结构
-                            shutil.rmtree(item_path)
-                            logger.info(f"已清理多余目录结构: {item_path}")
-                    
-        except Exception as e:
-            logger.warning(f"清理多余目录时出错: {str(e)}")
+    def _remove_empty_dirs(self, directory: str, stop_dir: str):
+        """删除下载压缩包时留下的空目录（如 videos/<dataset>/），直到 stop_dir 为止"""
+        directory = os.path.abspath(directory)
+        stop_dir = os.path.abspath(stop_dir)
+        while directory != stop_dir and directory.startswith(stop_dir + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+    
+    def _remove_files(self, paths: List[str]):
+        """删除文件（不存在的跳过，失败时只记录日志）"""
+        for path in paths:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError as e:
+                logger.warning(f"删除文件失败 {path}: {str(e)}")
     
     def _is_video_file(self, filename: str) -> bool:
         """判断是否为视频文件"""
         video_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm']
         return any(filename.lower().endswith(ext) for ext in video_extensions)
     
-    def _youtube_progress_hook(self, d):
+    # yt-dlp 每行输出一条进度，字段缺失时输出 NA
+    YT_DLP_PROGRESS_PREFIX = '[progress]'
+    YT_DLP_PROGRESS_TEMPLATE = (
+        'download:[progress] %(progress.status)s %(progress.downloaded_bytes)s '
+        '%(progress.total_bytes)s %(progress.total_bytes_estimate)s %(progress.speed)s %(progress.eta)s'
+    )
+    
+    def _run_yt_dlp(self, command: List[str], env: Dict[str, str],
+                    job: Optional[DownloadJob] = None) -> Tuple[int, str]:
+        """运行yt-dlp并逐行解析进度输出，返回 (退出码, 错误输出)"""
+        command = [command[0], '--newline', '--progress-template', self.YT_DLP_PROGRESS_TEMPLATE] + command[1:]
+        process = subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+            text=True, encoding='utf-8', errors='replace'
+        )
+        if job:
+            job.attach_process(process)
+        
+        # 单独线程读取stderr，避免管道写满阻塞子进程
+        stderr_lines = []
+        stderr_thread = threading.Thread(target=lambda: stderr_lines.extend(process.stderr), daemon=True)
+        stderr_thread.start()
+        
+        try:
+            for line in process.stdout:
+                line = line.strip()
+                if line.startswith(self.YT_DLP_PROGRESS_PREFIX):
+                    self._youtube_progress_hook(self._parse_yt_dlp_progress(line), job)
+                elif line.startswith('[Merger]') or line.startswith('[VideoConvertor]'):
+                    if job:
+                        job.update_progress(phase=PHASE_MERGE)
+            process.wait()
+        finally:
+            if job:
+                job.detach_process()
+        stderr_thread.join(timeout=5)
+        return process.returncode, ''.join(stderr_lines).strip()
+    
+    def _parse_yt_dlp_progress(self, line: str) -> Dict:
+        """解析进度模板输出的一行"""
+        fields = line[len(self.YT_DLP_PROGRESS_PREFIX):].split()
+        names = ['status', 'downloaded_bytes', 'total_bytes', 'total_bytes_estimate', 'speed', 'eta']
+        progress = {}
+        for name, value in zip(names, fields):
+            if name == 'status':
+                progress[name] = value
+                continue
+            try:
+                progress[name] = float(value)
+            except ValueError:
+                progress[name] = None
+        return progress
+    
+    def _youtube_progress_hook(self, d, job: Optional[DownloadJob] = None):
         """YouTube下载进度回调"""
         if d['status'] == 'downloading':
-            if 'total_bytes' in d and d['total_bytes']:
-                percent = (d['downloaded_bytes'] / d['total_bytes']) * 100
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            if job:
+                job.update_progress(
+                    phase=PHASE_DOWNLOAD,
+                    downloaded_bytes=int(d.get('downloaded_bytes') or 0),
+                    total_bytes=int(total) if total else None,
+                    speed=d.get('speed'),
+                    eta=d.get('eta')
+                )
+            elif total:
+                percent = ((d.get('downloaded_bytes') or 0) / total) * 100
                 logger.info(f"YouTube下载进度: {percent:.1f}%")
-            elif 'downloaded_bytes' in d:
-                logger.info(f"YouTube已下载: {self.format_file_size(d['downloaded_bytes'])}")
+            elif d.get('downloaded_bytes'):
+                logger.info(f"YouTube已下载: {self.format_file_size(int(d['downloaded_bytes']))}")
         elif d['status'] == 'finished':
             logger.info("YouTube下载完成，正在处理...")
     
@@ -519,22 +1482,62 @@ class VideoDownloadManager:
         return f"{size_bytes:.1f}{size_names[i]}"
     
     def get_sample_video_status(self, dataset_name: str, sample_name: str, 
-                               video_paths: List[str]) -> List[Dict[str, str]]:
-        """获取样本中所有视频的状态"""
+                               video_paths: List[str], record_access: bool = True) -> List[Dict[str, str]]:
+        """获取样本中所有视频的状态（record_access 为 False 时不计入缓存命中统计）"""
         video_statuses = []
+        hit = bool(video_paths)
+        active_job = self.download_jobs.get_active(dataset_name, sample_name)
         
         for video_path in video_paths:
             # 从完整路径中提取文件名
             video_filename = os.path.basename(video_path)
             status = self.get_video_status(dataset_name, sample_name, video_filename)
+            
+            # 逐文件下载中的视角附带下载进度
+            file_status = active_job.get_file_status(video_filename) if active_job else None
+            if file_status and not status['exists']:
+                status['status'] = {'downloading': '下载中', 'failed': '下载失败'}.get(file_status['status'], '等待下载')
+                status['download'] = file_status
             video_statuses.append({
                 "original_path": video_path,
                 "filename": video_filename,
                 **status
             })
+            hit = hit and status['exists']
+        
+        if not record_access:
+            return video_statuses
+        
+        # 统计缓存命中情况
+        with self._cache_lock:
+            self._cache_stats['hits' if hit else 'misses'] += 1
+        if hit:
+            self.touch_sample(dataset_name, sample_name)
         
         return video_statuses
     
+    def get_samples_video_status(self, dataset_name: str, sample_ids: List[str]) -> Dict[str, Dict]:
+        """批量获取一页样本的视频状态，视频路径从数据集中解析"""
+        statuses = {}
+        for sample_id in sample_ids:
+            sample = self._find_sample(dataset_name, sample_id)
+            if sample is None:
+                statuses[sample_id] = {'found': False, 'video_statuses': []}
+                continue
+            
+            if sample.get('type') == 'youtube':
+                video_paths = [f"{sample_id}_youtube.mp4"]
+            else:
+                video_paths = sample.get('video_paths') or ([sample['video_path']] if sample.get('video_path') else [])
+            video_statuses = self.get_sample_video_status(dataset_name, sample_id, video_paths, record_access=False)
+            statuses[sample_id] = {
+                'found': True,
+                'downloaded': bool(video_statuses) and all(status['exists'] for status in video_statuses),
+                'video_statuses': video_statuses,
+                'exception_status': sample.get('exception_status')
+            }
+        return statuses
+    
     def cleanup_temp_files(self, dataset_name: str, sample_name: str):
         """清理临时文件"""
         try:
@@ -556,6 +1559,7 @@ class VideoDownloadManager:
             local_dir = os.path.join(self.base_video_dir, dataset_name, sample_name)
             
             if not os.path.exists(local_dir):
+                self._refresh_cache_entry(dataset_name, sample_name)
                 return {
                     'success': False,
                     'message': f'本地目录不存在: {local_dir}'
@@ -586,10 +1590,17 @@ class VideoDownloadManager:
                         deleted_size += file_size
                         logger.info(f"已删除视频文件: {file_path}")
             
+            # 删除由视频生成的代理文件和片段剪辑
+            for derived_dir in (self.PROXY_DIR, self.CLIP_DIR):
+                derived_path = os.path.join(local_dir, derived_dir)
+                if os.path.isdir(derived_path):
+                    shutil.rmtree(derived_path, ignore_errors=True)
+            
             # 如果目录为空，删除目录
             if not os.listdir(local_dir):
                 os.rmdir(local_dir)
                 logger.info(f"已删除空目录: {local_dir}")
+            self._refresh_cache_entry(dataset_name, sample_name)
             
             if deleted_files:
                 return {
@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from models.atomic_file import write_json_atomic
+from models.locks import InterProcessLock
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_frame_rate(rate: Optional[str]) -> Optional[float]:
+    """解析ffprobe的帧率字符串，如 30000/1001"""
+    if not rate:
+        return None
+    try:
+        if '/' in rate:
+            numerator, denominator = rate.split('/', 1)
+            return round(float(numerator) / float(denominator), 3) if float(denominator) else None
+        return float(rate)
+    except ValueError:
+        return None
+
+
+def parse_ffprobe_output(info: Dict) -> Dict:
+    """从ffprobe的JSON输出中提取时长、分辨率、帧率、编码和流数量"""
+    streams = info.get('streams', [])
+    format_info = info.get('format', {})
+    video_stream = next((s for s in streams if s.get('codec_type') == 'video'), None)
+
+    duration = format_info.get('duration') or (video_stream or {}).get('duration')
+    try:
+        duration = float(duration) if duration is not None else None
+    except ValueError:
+        duration = None
+
+    return {
+        'has_video': video_stream is not None,
+        'duration': duration,
+        'width': (video_stream or {}).get('width'),
+        'height': (video_stream or {}).get('height'),
+        'fps': _parse_frame_rate((video_stream or {}).get('avg_frame_rate') or (video_stream or {}).get('r_frame_rate')),
+        'codec': (video_stream or {}).get('codec_name'),
+        'stream_count': len(streams),
+        'format': format_info.get('format_name')
+    }
+
+
+def _parse_time(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def probe_keyframe_before(path: str, time: float, timeout: float = 30, window: float = 30) -> Optional[float]:
+    """视频流中不晚于 time 秒（相对文件起点）的最后一个关键帧时间，即在 time 处输入定位并流复制得到的剪辑的
+    实际开始时间；只读取 time 之前 window 秒（定位到该处之前的关键帧）。ffprobe不存在时抛出 FileNotFoundError"""
+    cmd = [
+        'ffprobe',
+        '-v', 'quiet',
+        '-print_format', 'json',
+        '-select_streams', 'v:0',
+        '-skip_frame', 'nokey',
+        '-show_entries', 'frame=pts_time,best_effort_timestamp_time:format=start_time',
+        '-read_intervals', f"{max(time - window, 0):.3f}%{time + 0.001:.3f}",
+        path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe检查失败: {result.stderr}")
+
+    info = json.loads(result.stdout)
+    # ffmpeg的输入定位以文件起始时间为零点
+    offset = _parse_time(info.get('format', {}).get('start_time')) or 0.0
+    keyframes = []
+    for frame in info.get('frames', []):
+        pts = _parse_time(frame.get('pts_time'))
+        if pts is None:
+            pts = _parse_time(frame.get('best_effort_timestamp_time'))
+        if pts is not None and pts - offset <= time + 0.001:
+            keyframes.append(pts - offset)
+    return round(max(max(keyframes), 0.0), 3) if keyframes else None
+
+
+class VideoMetadataStore:
+    """持久化的视频元数据缓存，以 (路径, 大小, 修改时间) 为键，文件未变化时不会重复调用ffprobe"""
+
+    def __init__(self, base_dir: str, store_path: str, probe_workers: int = 2, probe_timeout: float = 30):
+        self.base_dir = base_dir
+        self.store_path = store_path
+        self.probe_timeout = probe_timeout
+
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._file_lock = InterProcessLock(store_path + '.lock', store_path + '.stamp')
+        self._pending = set()
+        self._ffprobe_missing = False
+        self._pool = ThreadPoolExecutor(max_workers=probe_workers, thread_name_prefix="video-probe")
+        self._load()
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), os.path.abspath(self.base_dir)).replace(os.sep, '/')
+
+    def _load(self):
+        if not os.path.exists(self.store_path):
+            return
+        try:
+            with open(self.store_path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+            logger.info(f"已加载 {len(self._entries)} 条视频元数据缓存")
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取视频元数据缓存失败，将重新探测: {str(e)}")
+            self._entries = {}
+
+    def save(self):
+        """原子写入缓存文件；多个worker共用同一文件，写入前在跨进程锁内合并其他进程已保存的条目，避免互相覆盖"""
+        with self._save_lock, self._file_lock.locked():
+            self._merge_saved_entries()
+            with self._lock:
+                snapshot = dict(self._entries)
+            write_json_atomic(self.store_path, snapshot, indent=None)
+
+    def _merge_saved_entries(self):
+        """读入文件中本进程没有或更新（修改时间更晚）的条目"""
+        try:
+            with open(self.store_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(saved, dict):
+            return
+        with self._lock:
+            for key, entry in saved.items():
+                current = self._entries.get(key)
+                if current is None or entry.get('mtime', 0) > current.get('mtime', 0):
+                    self._entries[key] = entry
+
+    def get(self, path: str) -> Optional[Dict]:
+        """获取缓存的元数据，文件大小或修改时间变化时视为失效"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get(self._key(path))
+        if entry and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime:
+            return dict(entry['metadata'])
+        return None
+
+    def probe(self, path: str, save: bool = True) -> Dict:
+        """调用ffprobe探测文件并写入缓存；ffprobe不存在时抛出 FileNotFoundError"""
+        stat = os.stat(path)
+        cmd = [
+            'ffprobe',
+            '-v', 'quiet',
+            '-print_format', 'json',
+            '-show_format',
+            '-show_streams',
+            path
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.probe_timeout)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffprobe检查失败: {result.stderr}")
+
+        metadata = parse_ffprobe_output(json.loads(result.stdout))
+        with self._lock:
+            self._entries[self._key(path)] = {
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'metadata': metadata
+            }
+        if save:
+            self.save()
+        return dict(metadata)
+
+    def get_or_probe(self, path: str) -> Dict:
+        """优先返回缓存，没有时同步探测"""
+        metadata = self.get(path)
+        if metadata is not None:
+            return metadata
+        return self.probe(path)
+
+    def schedule(self, paths: Iterable[str]) -> int:
+        """在后台线程池中探测尚无缓存的文件，返回新提交的数量"""
+        if self._ffprobe_missing:
+            return 0
+        submitted = 0
+        for path in paths:
+            if self.get(path) is not None:
+                continue
+            with self._lock:
+                if path in self._pending:
+                    continue
+                self._pending.add(path)
+            self._pool.submit(self._probe_in_background, path)
+            submitted += 1
+        return submitted
+
+    def is_pending(self, path: str) -> bool:
+        with self._lock:
+            return path in self._pending
+
+    def _probe_in_background(self, path: str):
+        try:
+            if os.path.exists(path):
+                self.probe(path, save=False)
+        except FileNotFoundError:
+            if not self._ffprobe_missing:
+                logger.warning("未找到ffprobe，停止后台元数据探测")
+            self._ffprobe_missing = True
+        except Exception as e:
+            logger.warning(f"后台探测视频元数据失败 {path}: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+                idle = not self._pending
+            # 一批后台探测全部结束后再写一次文件
+            if idle:
+                self.save()
+
+    def prune(self, existing_paths: Iterable[str]):
+        """删除已不存在文件的缓存记录"""
+        keep = {self._key(path) for path in existing_paths}
+        with self._lock:
+            stale = [key for key in self._entries if key not in keep]
+            for key in stale:
+                del self._entries[key]
+        if stale:
+            self.save()
+            logger.info(f"已清理 {len(stale)} 条过期的视频元数据")
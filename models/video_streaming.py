@@ -0,0 +1,170 @@
+import io
+import logging
+import mimetypes
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from werkzeug.wrappers import Request, Response
+
+logger = logging.getLogger(__name__)
+
+# 非sendfile服务器上每次读取的块大小
+CHUNK_SIZE = 256 * 1024
+
+
+class StreamLimiter:
+    """限制每个客户端同时进行的视频流数量，超过上限的请求返回429"""
+
+    def __init__(self, max_streams_per_client: int = 8):
+        self.max_streams_per_client = max_streams_per_client
+        self._active: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, client: str) -> bool:
+        with self._lock:
+            if self._active.get(client, 0) >= self.max_streams_per_client:
+                return False
+            self._active[client] = self._active.get(client, 0) + 1
+            return True
+
+    def release(self, client: str):
+        with self._lock:
+            count = self._active.get(client, 0) - 1
+            if count > 0:
+                self._active[client] = count
+            else:
+                self._active.pop(client, None)
+
+    def active_streams(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._active)
+
+
+class _StreamFile(io.FileIO):
+    """关闭时回调的文件对象（WSGI服务器发送完成或客户端断开后都会关闭它）"""
+
+    def __init__(self, path: str, on_close: Callable[[], None]):
+        super().__init__(path, 'rb')
+        self._on_close = on_close
+
+    def close(self):
+        if not self.closed:
+            try:
+                super().close()
+            finally:
+                on_close, self._on_close = self._on_close, None
+                if on_close is not None:
+                    on_close()
+
+
+class _RangeIterator:
+    """在不支持 wsgi.file_wrapper 的服务器（如开发服务器）上按块读取 [start, start+length) 区间"""
+
+    def __init__(self, f: _StreamFile, length: int):
+        self._file = f
+        self._remaining = length
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        if self._remaining <= 0:
+            raise StopIteration
+        data = self._file.read(min(CHUNK_SIZE, self._remaining))
+        if not data:
+            raise StopIteration
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+def video_etag(stat: os.stat_result) -> str:
+    """由文件大小和修改时间生成ETag（文件重新下载后随之变化）"""
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+def _requested_range(request: Request, etag: str, size: int) -> Tuple[Optional[Tuple[int, int]], bool]:
+    """解析Range/If-Range，返回 ((start, stop) 或 None 表示整个文件, 区间是否无法满足)"""
+    if request.range is None or request.range.units != 'bytes':
+        return None, False
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != etag:
+        # If-Range 中的版本已过期，返回完整文件
+        return None, False
+    if if_range.date is not None:
+        return None, False
+    if len(request.range.ranges) != 1:
+        # 浏览器播放视频不会请求多区间，直接返回完整文件
+        return None, False
+    byte_range = request.range.range_for_length(size)
+    if byte_range is None:
+        return None, True
+    return byte_range, False
+
+
+def build_video_response(path: str, request: Request, limiter: Optional[StreamLimiter] = None,
+                         client: str = '', max_age: int = 0) -> Response:
+    """返回支持Range请求的视频响应（206/416/304，Accept-Ranges、ETag、Cache-Control）
+
+    在提供 wsgi.file_wrapper 的服务器（如gunicorn）上直接把定位到区间起点的文件交给服务器，
+    并设置Content-Length为区间长度，由服务器用 os.sendfile 零拷贝发送；否则按块读取。
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = video_etag(stat)
+
+    response = Response(status=200, mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Cache-Control'] = f'public, max-age={max_age}' if max_age else 'no-cache'
+    response.set_etag(etag)
+    response.last_modified = stat.st_mtime
+
+    if etag in request.if_none_match:
+        response.status_code = 304
+        return response
+
+    byte_range, unsatisfiable = _requested_range(request, etag, size)
+    if unsatisfiable:
+        response.status_code = 416
+        response.headers['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, stop = byte_range if byte_range is not None else (0, size)
+    if request.method == 'HEAD':
+        response.content_length = stop - start
+        if byte_range is not None:
+            response.status_code = 206
+            response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+        return response
+
+    if limiter is not None and not limiter.acquire(client):
+        logger.warning(f"客户端 {client} 同时打开的视频流超过上限 {limiter.max_streams_per_client}")
+        busy = Response('同时打开的视频流过多，请稍后重试', status=429, mimetype='text/plain')
+        busy.headers['Retry-After'] = '1'
+        return busy
+
+    try:
+        f = _StreamFile(path, (lambda: limiter.release(client)) if limiter is not None else (lambda: None))
+    except OSError:
+        if limiter is not None:
+            limiter.release(client)
+        raise
+    f.seek(start)
+
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if file_wrapper is not None:
+        body = file_wrapper(f, CHUNK_SIZE)
+    else:
+        body = _RangeIterator(f, stop - start)
+
+    response.response = body
+    response.direct_passthrough = True
+    response.content_length = stop - start
+    if byte_range is not None:
+        response.status_code = 206
+        response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+    return response
+
@@ -21,6 +21,7 @@ class VideoAnnotationApp {
         // 分页相关属性
         this.samplesPageSize = 10;  // 每页显示的样本数量
         this.samplesCurrentPage = 1;  // 当前样本页
+        this.samplesTotal = 0;        // 当前数据集样本总数（服务端分页返回）
         this.segmentsPageSize = 10;   // 每页显示的片段数量
         this.segmentsCurrentPage = 1; // 当前片段页
         this.pendingSegmentSelection = null; // 待选择的片段（用于跨样本导航）
@@ -35,6 +36,19 @@ class VideoAnnotationApp {
         // 统计相关
         this.statisticsData = null;
         
+        // 当前在后端标记为查看中的样本 {dataset, sample}
+        this.openedSample = null;
+        // 后端元数据缓存中的当前样本视频时长（秒）
+        this.currentSampleDuration = null;
+        
+        // 增量同步（/api/changes）：记录已同步到的版本号，只拉取之后修改过的样本和片段
+        this.changeRevision = null;
+        this.changeEpoch = null;       // 服务端进程标识，变化时需重新拉取完整列表
+        this.changeSyncPromise = null; // 串行化同步请求
+        this.changeFeedInterval = null;
+        this.changeFeedPeriod = 5000;  // 轮询间隔（毫秒），用于发现其他标注者的修改
+        this.segmentListSampleId = null; // currentSegmentList 对应的样本
+        
         this.init();
     }
     
@@ -54,6 +68,9 @@ class VideoAnnotationApp {
         // 初始化按钮状态
         this.updateSegmentActionButtons();
         this.updateVideoActionButtons();
+        
+        // 定期同步其他标注者的修改
+        this.startChangeFeed();
     }
     
     bindEvents() {
@@ -331,6 +348,8 @@ class VideoAnnotationApp {
         
         this.currentDataset = { id: datasetId };
         this.currentDatasetName = datasetId;
+        // 在拉取列表之前初始化同步游标，之间发生的修改会在下次同步时（幂等地）再应用一次
+        await this.resetChangeCursor(datasetId);
         this.loadSamples(datasetId);
         
         // 更新按钮状态：选择数据集时隐藏所有操作按钮
@@ -338,17 +357,25 @@ class VideoAnnotationApp {
         this.updateVideoActionButtons();
     }
     
-    async loadSamples(datasetId) {
+    async loadSamples(datasetId, page = this.samplesCurrentPage) {
         try {
             this.showLoading();
             
-            const response = await fetch(`/api/dataset/${datasetId}/samples?annotator=${this.currentAnnotator}`);
-            const samples = await response.json();
+            // 服务端分页：只请求当前页的样本
+            let result = await this.fetchSamplesPage(datasetId, page);
+            const totalPages = Math.max(1, Math.ceil(result.total / this.samplesPageSize));
+            if (page > totalPages) {
+                // 样本数减少导致当前页越界时退回最后一页
+                page = totalPages;
+                result = await this.fetchSamplesPage(datasetId, page);
+            }
             
-            // 保存样本数据供后续使用
-            this.datasetSamples = samples;
+            // 保存当前页样本数据供后续使用
+            this.samplesCurrentPage = page;
+            this.samplesTotal = result.total;
+            this.datasetSamples = result.items;
             
-            this.renderSamples(samples);
+            this.renderSamples(result.items);
         } catch (error) {
             console.error('Error loading samples:', error);
             alert('加载样本失败，请重试');
@@ -357,6 +384,16 @@ class VideoAnnotationApp {
         }
     }
     
+    async fetchSamplesPage(datasetId, page) {
+        const params = new URLSearchParams({
+            annotator: this.currentAnnotator || '',
+            page: page,
+            page_size: this.samplesPageSize
+        });
+        const response = await fetch(`/api/dataset/${datasetId}/samples?${params}`);
+        return await response.json();
+    }
+    
     renderSamples(samples) {
         const container = document.getElementById('sampleList');
         container.innerHTML = '';
@@ -366,23 +403,24 @@ class VideoAnnotationApp {
             return;
         }
         
-        // 计算分页
-        const totalPages = Math.ceil(samples.length / this.samplesPageSize);
-        const startIndex = (this.samplesCurrentPage - 1) * this.samplesPageSize;
-        const endIndex = Math.min(startIndex + this.samplesPageSize, samples.length);
-        const currentPageSamples = samples.slice(startIndex, endIndex);
+        // samples 为服务端返回的当前页样本
+        const totalPages = Math.ceil(this.samplesTotal / this.samplesPageSize);
+        const currentPageSamples = samples;
         
         // 渲染当前页的样本
         currentPageSamples.forEach(sample => {
-            const sampleElement = this.createSampleElement(sample);
+            const sampleElement = this.createSampleElement(sample, false);
             container.appendChild(sampleElement);
         });
         
+        // 一次请求检查整页样本的视频下载状态
+        this.checkVideoDownloadStatusBatch(currentPageSamples);
+        
         // 渲染分页控件
-        this.renderSamplesPagination(samples.length, totalPages);
+        this.renderSamplesPagination(this.samplesTotal, totalPages);
     }
     
-    createSampleElement(sample) {
+    createSampleElement(sample, checkStatus = true) {
         const div = document.createElement('div');
         div.className = 'sample-item';
         div.dataset.sampleId = sample.id;
@@ -404,7 +442,13 @@ class VideoAnnotationApp {
             `;
         }
         
+        // 缩略图由服务端从已下载的视频生成并长期缓存，无需下载视频即可预览内容
+        const thumbnailHtml = sample.thumbnail
+            ? `<img class="sample-thumbnail" src="${sample.thumbnail}" loading="lazy" alt="">`
+            : '';
+        
         div.innerHTML = `
+            ${thumbnailHtml}
             <div class="sample-name" title="${sample.name}">${displayName}</div>
             <div class="sample-meta">
                 <span class="sample-type ${typeClass}">${this.getSampleTypeText(sample.type)}</span>
@@ -427,7 +471,9 @@ class VideoAnnotationApp {
         });
         
         // 检查视频下载状态
-        this.checkVideoDownloadStatus(sample);
+        if (checkStatus) {
+            this.checkVideoDownloadStatus(sample);
+        }
         
         return div;
     }
@@ -469,14 +515,25 @@ class VideoAnnotationApp {
         prevBtn.onclick = () => this.changeSamplesPage(this.samplesCurrentPage - 1);
         buttonContainer.appendChild(prevBtn);
         
-        // 页码按钮
-        for (let i = 1; i <= totalPages; i++) {
+        // 页码按钮：只显示首页、末页和当前页前后两页，页数很多时按钮数量保持不变
+        const pages = [];
+        for (let i = Math.max(1, this.samplesCurrentPage - 2); i <= Math.min(totalPages, this.samplesCurrentPage + 2); i++) {
+            pages.push(i);
+        }
+        if (pages[0] !== 1) pages.unshift(1);
+        if (pages[pages.length - 1] !== totalPages) pages.push(totalPages);
+        pages.forEach((i, index) => {
+            if (index > 0 && i - pages[index - 1] > 1) {
+                const ellipsis = document.createElement('span');
+                ellipsis.textContent = '…';
+                buttonContainer.appendChild(ellipsis);
+            }
             const pageBtn = document.createElement('button');
             pageBtn.className = `btn btn-sm ${i === this.samplesCurrentPage ? 'btn-primary' : 'btn-outline-primary'}`;
             pageBtn.textContent = i;
             pageBtn.onclick = () => this.changeSamplesPage(i);
             buttonContainer.appendChild(pageBtn);
-        }
+        });
         
         // 下一页按钮
         const nextBtn = document.createElement('button');
@@ -490,13 +547,12 @@ class VideoAnnotationApp {
         container.appendChild(paginationContainer);
     }
     
-    changeSamplesPage(page) {
-        if (page < 1 || page > Math.ceil(this.datasetSamples.length / this.samplesPageSize)) {
+    async changeSamplesPage(page) {
+        if (!this.currentDataset || page < 1 || page > Math.ceil(this.samplesTotal / this.samplesPageSize)) {
             return;
         }
         
-        this.samplesCurrentPage = page;
-        this.renderSamples(this.datasetSamples);
+        await this.loadSamples(this.currentDataset.id, page);
         
         // 滚动到列表顶部
         document.getElementById('sampleList').scrollTop = 0;
@@ -594,6 +650,46 @@ class VideoAnnotationApp {
         }
     }
     
+    // 批量检查一页样本的视频下载状态
+    async checkVideoDownloadStatusBatch(samples) {
+        if (samples.length === 0) return;
+        
+        const datasetName = typeof this.currentDataset === 'string'
+            ? this.currentDataset
+            : (this.currentDataset && this.currentDataset.id) || this.currentDatasetName || 'test_dataset';
+        
+        try {
+            const response = await fetch('/api/video/status/batch', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    dataset: datasetName,
+                    samples: samples.map(sample => sample.id)
+                })
+            });
+            if (!response.ok) {
+                throw new Error(`${response.status} ${response.statusText}`);
+            }
+            
+            const result = await response.json();
+            samples.forEach(sample => {
+                const status = result.statuses[sample.id];
+                if (!status || !status.found) {
+                    // 数据集中找不到的样本退回逐个检查
+                    this.checkVideoDownloadStatus(sample);
+                    return;
+                }
+                this.updateDownloadStatusFromAPI(sample.id, status.video_statuses, sample);
+                this.updateSampleExceptionStatusDisplay(sample.id, status.exception_status);
+            });
+        } catch (error) {
+            console.error('批量检查视频下载状态失败:', error);
+            samples.forEach(sample => this.updateDownloadStatus(sample.id, '检查失败', false));
+        }
+    }
+    
     // 检查并更新异常状态
     async checkAndUpdateExceptionStatus(sampleId) {
         try {
@@ -753,8 +849,8 @@ class VideoAnnotationApp {
             
 
             
-            // 调用下载API
-            const response = await fetch('/api/video/download', {
+            // 提交后台下载任务，随后等待任务结束
+            const response = await fetch('/api/video/download/jobs', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -763,9 +859,13 @@ class VideoAnnotationApp {
             });
             
             if (response.ok) {
-                const result = await response.json();
+                const submitResult = await response.json();
+                const job = await this.waitForDownloadJob(submitResult.job.id);
+                const result = job.result || { success: false, message: job.error || '下载失败' };
                 
-                if (result.success) {
+                if (job.status === 'cancelled') {
+                    this.updateDownloadStatus(sampleId, '已取消', true, false);
+                } else if (result.success) {
                     alert(`下载成功！\n\n${result.message}`);
                     
                     // 重新检查下载状态
@@ -801,6 +901,76 @@ class VideoAnnotationApp {
         }
     }
     
+    // 等待下载任务结束：优先通过SSE接收进度推送，不支持时退回轮询
+    waitForDownloadJob(jobId) {
+        if (typeof EventSource === 'undefined') {
+            return this.pollDownloadJob(jobId);
+        }
+        
+        return new Promise((resolve) => {
+            const source = new EventSource(`/api/video/download/jobs/${jobId}/events`);
+            source.onmessage = (event) => {
+                const job = JSON.parse(event.data);
+                this.updateDownloadStatus(job.sample, this.formatDownloadProgress(job), false, false);
+                if (!['queued', 'running'].includes(job.status)) {
+                    source.close();
+                    resolve(job);
+                }
+            };
+            source.onerror = () => {
+                // 连接中断时改为轮询
+                source.close();
+                resolve(this.pollDownloadJob(jobId));
+            };
+        });
+    }
+    
+    // 轮询下载任务直到结束
+    async pollDownloadJob(jobId, intervalMs = 2000) {
+        while (true) {
+            const response = await fetch(`/api/video/download/jobs/${jobId}`);
+            if (!response.ok) {
+                throw new Error('获取下载任务状态失败');
+            }
+            const result = await response.json();
+            const job = result.job;
+            if (!['queued', 'running'].includes(job.status)) {
+                return job;
+            }
+            this.updateDownloadStatus(job.sample, this.formatDownloadProgress(job), false, false);
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
+    }
+    
+    // 格式化下载进度文本
+    formatDownloadProgress(job) {
+        if (job.status === 'queued') {
+            return '排队中...';
+        }
+        
+        const progress = job.progress || {};
+        const phaseText = {
+            download: '下载中',
+            merge: '合并中',
+            extract: '解压中',
+            validate: '校验中',
+            done: '完成'
+        }[progress.phase] || '下载中';
+        
+        let text = phaseText;
+        if (progress.percent !== null && progress.percent !== undefined) {
+            text += ` ${progress.percent.toFixed(1)}%`;
+        }
+        if (progress.phase === 'download' && progress.speed) {
+            text += ` (${this.formatFileSize(progress.speed)}/s`;
+            if (progress.eta !== null && progress.eta !== undefined) {
+                text += `, 剩余 ${this.formatTime(progress.eta)}`;
+            }
+            text += ')';
+        }
+        return text;
+    }
+    
     // 删除视频
     async deleteVideo(sampleId) {
         try {
@@ -893,9 +1063,12 @@ class VideoAnnotationApp {
     
     // 查找样本ById
     findSampleById(sampleId) {
-        // 从当前数据集的所有样本中查找
+        // 从当前页的样本中查找（样本列表为服务端分页，只包含当前页）
         if (this.currentDataset && this.datasetSamples) {
-            return this.datasetSamples.find(sample => sample.id === sampleId);
+            const sample = this.datasetSamples.find(sample => sample.id === sampleId);
+            if (sample) {
+                return sample;
+            }
         }
         
         // 如果当前样本匹配，返回当前样本
@@ -957,6 +1130,15 @@ class VideoAnnotationApp {
         
         this.loadSampleSegments(sample.id);
         
+        // 通知后端当前查看的样本，并预取之后的样本
+        this.openSampleAndPrefetch(sample);
+        
+        // 读取缓存的视频元数据（时长等）
+        this.loadSampleMetadata(sample);
+        
+        // 读取时间轴雪碧图，用于悬停预览
+        this.loadSampleSprites(sample);
+        
         // 延迟更新视频播放器，确保DOM已更新
         // console.log('⏰ 延迟100ms后更新视频播放器...');
         setTimeout(() => {
@@ -981,11 +1163,97 @@ class VideoAnnotationApp {
         }, 100);
     }
     
+    // 从后端元数据缓存读取样本视频时长（取各视角中最长的）
+    async loadSampleMetadata(sample) {
+        this.currentSampleDuration = null;
+        const datasetName = typeof this.currentDataset === 'string'
+            ? this.currentDataset
+            : (this.currentDataset && this.currentDataset.id) || this.currentDatasetName;
+        if (!datasetName) return;
+        
+        try {
+            const params = new URLSearchParams({ dataset: datasetName, sample: sample.id });
+            const response = await fetch(`/api/video/metadata?${params}`);
+            if (!response.ok) return;
+            
+            const result = await response.json();
+            const durations = result.videos
+                .map(video => video.metadata && video.metadata.duration)
+                .filter(duration => duration);
+            if (this.currentSample && this.currentSample.id === sample.id && durations.length > 0) {
+                this.currentSampleDuration = Math.max(...durations);
+            }
+        } catch (error) {
+            console.error('读取视频元数据失败:', error);
+        }
+    }
+    
+    // 读取样本各视角的时间轴雪碧图；尚在生成时稍后重试一次
+    async loadSampleSprites(sample, retry = true) {
+        this.currentSprites = [];
+        try {
+            const response = await fetch(`/api/sample/${sample.id}/sprites`);
+            if (!response.ok) return;
+            
+            const sprites = await response.json();
+            if (!this.currentSample || this.currentSample.id !== sample.id) return;
+            this.currentSprites = sprites;
+            
+            if (retry && sprites.some(sprite => !sprite.url && sprite.status === 'pending')) {
+                setTimeout(() => {
+                    if (this.currentSample && this.currentSample.id === sample.id) {
+                        this.loadSampleSprites(sample, false);
+                    }
+                }, 5000);
+            }
+        } catch (error) {
+            console.error('读取时间轴雪碧图失败:', error);
+        }
+    }
+    
+    // 标记当前样本正在查看（上一个样本取消标记），然后预取接下来的样本
+    async openSampleAndPrefetch(sample) {
+        const datasetName = typeof this.currentDataset === 'string'
+            ? this.currentDataset
+            : (this.currentDataset && this.currentDataset.id) || this.currentDatasetName;
+        if (!datasetName) return;
+        
+        try {
+            await fetch('/api/video/open', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    dataset: datasetName,
+                    sample: sample.id,
+                    previous: this.openedSample
+                })
+            });
+            this.openedSample = { dataset: datasetName, sample: sample.id };
+            
+            await fetch('/api/video/prefetch', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    dataset: datasetName,
+                    annotator: this.currentAnnotator,
+                    sample: sample.id
+                })
+            });
+        } catch (error) {
+            console.error('预取样本失败:', error);
+        }
+    }
+    
     async loadSegments(datasetId) {
         try {
             const response = await fetch(`/api/dataset/${datasetId}/segments`);
             const segments = await response.json();
             
+            this.segmentListSampleId = null;
             this.renderSegments(segments);
         } catch (error) {
             console.error('Error loading segments:', error);
@@ -996,6 +1264,7 @@ class VideoAnnotationApp {
         try {
                     // 如果没有选中视频样本，清空片段列表
         if (!sampleId || !this.currentSample) {
+            this.segmentListSampleId = null;
             this.renderSegments([]);
             this.hideSampleSegmentStats();
             return;
@@ -1004,6 +1273,7 @@ class VideoAnnotationApp {
             const response = await fetch(`/api/sample/${sampleId}/segments`);
             const segments = await response.json();
             
+            this.segmentListSampleId = sampleId;
             this.renderSegments(segments);
             
             // 更新样本片段统计信息
@@ -1011,10 +1281,149 @@ class VideoAnnotationApp {
         } catch (error) {
             console.error('Error loading sample segments:', error);
             // 出错时也清空片段列表
+            this.segmentListSampleId = null;
             this.renderSegments([]);
         }
     }
     
+    startChangeFeed() {
+        if (this.changeFeedInterval) {
+            clearInterval(this.changeFeedInterval);
+        }
+        this.changeFeedInterval = setInterval(() => this.syncChanges(), this.changeFeedPeriod);
+    }
+    
+    async resetChangeCursor(datasetId) {
+        try {
+            const response = await fetch(`/api/changes?dataset=${encodeURIComponent(datasetId)}`);
+            const result = await response.json();
+            this.changeRevision = result.revision;
+            this.changeEpoch = result.epoch;
+        } catch (error) {
+            console.error('初始化同步游标失败:', error);
+            this.changeRevision = null;
+        }
+    }
+    
+    // 增量同步：拉取上次同步之后的修改并合并到当前列表（请求串行执行，可在修改后直接 await）
+    syncChanges() {
+        const run = (this.changeSyncPromise || Promise.resolve()).then(() => this.fetchAndApplyChanges());
+        this.changeSyncPromise = run.catch(error => console.error('同步修改失败:', error));
+        return this.changeSyncPromise;
+    }
+    
+    async fetchAndApplyChanges() {
+        const datasetId = this.currentDataset && this.currentDataset.id;
+        if (!datasetId) {
+            return;
+        }
+        if (this.changeRevision === null) {
+            await this.resetChangeCursor(datasetId);
+            return;
+        }
+        
+        let hasMore = true;
+        while (hasMore) {
+            const params = new URLSearchParams({ since: this.changeRevision, dataset: datasetId });
+            if (this.changeEpoch) {
+                params.set('epoch', this.changeEpoch);
+            }
+            const response = await fetch(`/api/changes?${params}`);
+            if (!response.ok) {
+                return;
+            }
+            const result = await response.json();
+            if (!this.currentDataset || this.currentDataset.id !== datasetId) {
+                return;  // 同步期间切换了数据集
+            }
+            this.changeRevision = result.revision;
+            this.changeEpoch = result.epoch;
+            
+            if (result.reset || result.changes.some(change => change.type === 'dataset')) {
+                // 修改记录已过期或数据集被其他进程整体重新加载，无法增量合并
+                await this.reloadCurrentLists(datasetId);
+                return;
+            }
+            this.applyChanges(result.changes);
+            hasMore = result.has_more;
+        }
+    }
+    
+    async reloadCurrentLists(datasetId) {
+        await this.loadSamples(datasetId);
+        if (this.currentSample) {
+            await this.loadSampleSegments(this.currentSample.id);
+        }
+    }
+    
+    applyChanges(changes) {
+        let segmentsChanged = false;
+        changes.forEach(change => {
+            if (change.type === 'sample') {
+                this.applySampleChange(change);
+            } else if (change.type === 'segment') {
+                segmentsChanged = this.applySegmentChange(change) || segmentsChanged;
+            }
+        });
+        
+        if (segmentsChanged) {
+            this.renderSegments(this.currentSegmentList);
+            this.updateSegmentActionButtons();
+            this.updateSampleSegmentStats();
+        }
+    }
+    
+    applySampleChange(change) {
+        // 只更新当前页上的样本，不改变列表顺序（顺序在下次翻页或刷新时更新）
+        const samples = [this.findSampleById(change.id), this.currentSample]
+            .filter(sample => sample && sample.id === change.id);
+        samples.forEach(sample => Object.assign(sample, change.data));
+        
+        const sampleElement = document.querySelector(`[data-sample-id="${change.id}"]`);
+        const statusElement = sampleElement && sampleElement.querySelector('.review-status');
+        if (statusElement && change.data) {
+            statusElement.textContent = change.data.review_status;
+            statusElement.className = `review-status ${this.getReviewStatusClass(change.data.review_status)}`;
+        }
+    }
+    
+    applySegmentChange(change) {
+        // 只关心当前样本的片段列表
+        const segment = change.data || {};
+        if (!this.currentSample || this.segmentListSampleId !== this.currentSample.id ||
+            segment.sample_id !== this.currentSample.id) {
+            return false;
+        }
+        
+        const list = this.currentSegmentList || [];
+        const index = list.findIndex(s => s.id === change.id);
+        if (change.action === 'delete') {
+            if (index === -1) {
+                return false;
+            }
+            list.splice(index, 1);
+            if (this.currentSegment && this.currentSegment.id === change.id) {
+                this.currentSegment = null;
+            }
+        } else if (index !== -1) {
+            Object.assign(list[index], segment);
+            if (this.currentSegment && this.currentSegment.id === change.id && this.currentSegment !== list[index]) {
+                Object.assign(this.currentSegment, segment);
+            }
+        } else {
+            // 新片段按状态顺序插入：待抉择 -> 选用 -> 弃用
+            const statusOrder = { '待抉择': 0, '选用': 1, '弃用': 2 };
+            const rank = s => statusOrder[s.status] ?? 0;
+            let position = list.length;
+            while (position > 0 && rank(list[position - 1]) > rank(segment)) {
+                position--;
+            }
+            list.splice(position, 0, segment);
+        }
+        this.currentSegmentList = list;
+        return true;
+    }
+    
     renderSegments(segments) {
         const container = document.getElementById('segmentList');
         container.innerHTML = '';
@@ -1075,7 +1484,12 @@ class VideoAnnotationApp {
         
         const statusClass = this.getSegmentStatusClass(segment.status);
         
+        const thumbnailHtml = segment.thumbnail
+            ? `<img class="segment-thumbnail" src="${segment.thumbnail}" loading="lazy" alt="">`
+            : '';
+        
         div.innerHTML = `
+            ${thumbnailHtml}
             <div class="segment-header">
                 <div class="segment-time">
                     ${this.formatTime(segment.start_time)} - ${this.formatTime(segment.end_time)}
@@ -1215,6 +1629,7 @@ class VideoAnnotationApp {
     
     // 暂停当前播放的视频
     pauseCurrentVideo() {
+        this.stopSegmentClip();
         if (this.currentVideoElement && !this.currentVideoElement.paused) {
             this.currentVideoElement.pause();
             console.log('⏸️ 已暂停当前播放的视频');
@@ -1442,7 +1857,7 @@ class VideoAnnotationApp {
     }
     
     // 选择下一个样本
-    selectNextSample() {
+    async selectNextSample() {
         console.log('🔄 selectNextSample 被调用');
         console.log('当前样本:', this.currentSample);
         console.log('样本列表长度:', this.datasetSamples?.length);
@@ -1471,9 +1886,17 @@ class VideoAnnotationApp {
             return;
         }
         
+        let nextSample = null;
         if (currentIndex < this.datasetSamples.length - 1) {
+            nextSample = this.datasetSamples[currentIndex + 1];
+        } else if (this.samplesCurrentPage * this.samplesPageSize < this.samplesTotal) {
+            // 当前页的最后一个样本：加载下一页后选择其第一个样本
+            await this.changeSamplesPage(this.samplesCurrentPage + 1);
+            nextSample = this.datasetSamples[0];
+        }
+        
+        if (nextSample) {
             // 选择下一个样本
-            const nextSample = this.datasetSamples[currentIndex + 1];
             console.log(`🔄 切换到下一个样本: ${nextSample.id}`);
             this.selectSample(nextSample);
             
@@ -1487,7 +1910,7 @@ class VideoAnnotationApp {
     }
     
     // 选择上一个样本
-    selectPreviousSample() {
+    async selectPreviousSample() {
         if (!this.datasetSamples || this.datasetSamples.length === 0) {
             alert('没有可用的样本');
             return;
@@ -1509,9 +1932,17 @@ class VideoAnnotationApp {
             return;
         }
         
+        let prevSample = null;
         if (currentIndex > 0) {
+            prevSample = this.datasetSamples[currentIndex - 1];
+        } else if (this.samplesCurrentPage > 1) {
+            // 当前页的第一个样本：加载上一页后选择其最后一个样本
+            await this.changeSamplesPage(this.samplesCurrentPage - 1);
+            prevSample = this.datasetSamples[this.datasetSamples.length - 1];
+        }
+        
+        if (prevSample) {
             // 选择上一个样本
-            const prevSample = this.datasetSamples[currentIndex - 1];
             console.log(`🔄 切换到上一个样本: ${prevSample.id}`);
             this.selectSample(prevSample);
             
@@ -1622,13 +2053,13 @@ class VideoAnnotationApp {
     
     // 验证时间范围是否超出视频时长
     validateTimeRange(startTime, endTime) {
-        if (!this.currentVideoElement || !this.currentVideoElement.duration) {
+        // 视频尚未加载完成时使用后端缓存的元数据时长
+        const videoDuration = (this.currentVideoElement && this.currentVideoElement.duration) || this.currentSampleDuration;
+        if (!videoDuration) {
             console.warn('⚠️ 无法获取视频时长，跳过时间范围验证');
             return { valid: true, message: '' };
         }
         
-        const videoDuration = this.currentVideoElement.duration;
-        
         if (startTime < 0) {
             return { 
                 valid: false, 
@@ -1701,8 +2132,8 @@ class VideoAnnotationApp {
             if (response.ok) {
                 const result = await response.json();
                 if (result.success) {
-                    // 重新加载片段列表以确保数据同步
-                    this.loadSampleSegments(this.currentSample.id);
+                    // 增量同步新建的片段
+                    await this.syncChanges();
                     
                     // 更新样本片段统计信息
                     this.updateSampleSegmentStats();
@@ -1723,6 +2154,31 @@ class VideoAnnotationApp {
         }
     }
     
+    // 调用批量接口一次性创建片段（全部校验通过才会写入）
+    async submitBatchSegments(segments) {
+        const response = await fetch('/api/segments/batch_create', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ segments })
+        });
+        
+        if (!response.ok) {
+            throw new Error('批量创建片段请求失败');
+        }
+        
+        const result = await response.json();
+        if (!result.success) {
+            const firstError = result.errors && result.errors.length > 0 ? result.errors[0] : null;
+            const detail = firstError ? `第 ${firstError.index + 1} 个片段: ${firstError.error}` : '未知错误';
+            throw new Error(`批量创建片段失败（${detail}）`);
+        }
+        
+        console.log(`✅ 批量创建 ${result.created} 个片段`);
+        return result.segments;
+    }
+    
     // 批量创建片段
     async batchCreateSegments() {
         if (!this.currentSample) {
@@ -1786,48 +2242,27 @@ class VideoAnnotationApp {
         try {
             this.showLoading();
             
-            // 批量创建片段
-            const createdSegments = [];
+            // 构造全部片段，一次请求批量创建
+            const batchTimestamp = Date.now();
+            const newSegments = [];
             for (let i = 0; i < segmentCount; i++) {
                 const segmentStartTime = rangeStartTime + (i * segmentDuration);
                 const segmentEndTime = segmentStartTime + segmentDuration;
                 
-                const newSegment = {
-                    id: 'segment_' + Date.now() + '_' + i,
+                newSegments.push({
+                    id: 'segment_' + batchTimestamp + '_' + i,
                     video_paths: this.currentSample.type === 'single_video' ? [this.currentSample.video_path] : this.currentSample.video_paths,
                     start_time: segmentStartTime,
                     end_time: segmentEndTime,
                     status: '待抉择',
                     sample_id: this.currentSample.id
-                };
-                
-                // 调用后端API创建片段
-                const response = await fetch('/api/segment/create', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify(newSegment)
                 });
-                
-                if (response.ok) {
-                    const result = await response.json();
-                    if (result.success) {
-                        createdSegments.push(newSegment);
-                        console.log(`✅ 批量片段 ${i + 1}/${segmentCount} 已创建:`, newSegment);
-                    } else {
-                        throw new Error(`创建第 ${i + 1} 个片段失败`);
-                    }
-                } else {
-                    throw new Error(`创建第 ${i + 1} 个片段请求失败`);
-                }
-                
-                // 添加小延迟避免过快的请求
-                await new Promise(resolve => setTimeout(resolve, 100));
             }
             
-            // 重新加载片段列表
-            this.loadSampleSegments(this.currentSample.id);
+            const createdSegments = await this.submitBatchSegments(newSegments);
+            
+            // 增量同步新建的片段
+            await this.syncChanges();
             
             // 更新样本片段统计信息
             this.updateSampleSegmentStats();
@@ -1887,48 +2322,27 @@ class VideoAnnotationApp {
         try {
             this.showLoading();
             
-            // 批量创建片段
-            const createdSegments = [];
+            // 构造全部片段，一次请求批量创建
+            const batchTimestamp = Date.now();
+            const newSegments = [];
             for (let i = 0; i < segmentCount; i++) {
                 const segmentStartTime = rangeStartTime + (i * intervalSeconds);
                 const segmentEndTime = segmentStartTime + intervalSeconds;
                 
-                const newSegment = {
-                    id: 'segment_' + Date.now() + '_' + i,
+                newSegments.push({
+                    id: 'segment_' + batchTimestamp + '_' + i,
                     video_paths: this.currentSample.type === 'single_video' ? [this.currentSample.video_path] : this.currentSample.video_paths,
                     start_time: segmentStartTime,
                     end_time: segmentEndTime,
                     status: '待抉择',
                     sample_id: this.currentSample.id
-                };
-                
-                // 调用后端API创建片段
-                const response = await fetch('/api/segment/create', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify(newSegment)
                 });
-                
-                if (response.ok) {
-                    const result = await response.json();
-                    if (result.success) {
-                        createdSegments.push(newSegment);
-                        console.log(`✅ 预设间隔片段 ${i + 1}/${segmentCount} 已创建:`, newSegment);
-                    } else {
-                        throw new Error(`创建第 ${i + 1} 个片段失败`);
-                    }
-                } else {
-                    throw new Error(`创建第 ${i + 1} 个片段请求失败`);
-                }
-                
-                // 添加小延迟避免过快的请求
-                await new Promise(resolve => setTimeout(resolve, 100));
             }
             
-            // 重新加载片段列表
-            this.loadSampleSegments(this.currentSample.id);
+            const createdSegments = await this.submitBatchSegments(newSegments);
+            
+            // 增量同步新建的片段
+            await this.syncChanges();
             
             alert(`按 ${intervalSeconds} 秒间隔批量创建成功！共创建了 ${createdSegments.length} 个片段`);
             console.log('✅ 预设间隔批量创建片段完成:', createdSegments);
@@ -2098,10 +2512,15 @@ class VideoAnnotationApp {
         }
         
         try {
-            // 获取当前样本的片段列表
-            const response = await fetch(`/api/sample/${this.currentSample.id}/segments`);
-            if (response.ok) {
-                const segments = await response.json();
+            // 获取当前样本的片段列表（本地列表已同步时直接使用）
+            let segments = null;
+            if (this.segmentListSampleId === this.currentSample.id && this.currentSegmentList) {
+                segments = this.currentSegmentList;
+            } else {
+                const response = await fetch(`/api/sample/${this.currentSample.id}/segments`);
+                segments = response.ok ? await response.json() : null;
+            }
+            if (segments) {
                 
                 // 只统计选用状态的片段
                 const selectedSegments = segments.filter(segment => segment.status === '选用');
@@ -2273,11 +2692,8 @@ class VideoAnnotationApp {
             });
             
             if (response.ok) {
-                // 重新加载片段列表
-                this.loadSegments(datasetId);
-                if (this.currentSample) {
-                    this.loadSampleSegments(this.currentSample.id);
-                }
+                // 增量同步被删除的片段
+                await this.syncChanges();
                 alert('弃用片段删除成功');
                 console.log(`✅ 数据集 ${datasetId} 的弃用片段删除成功`);
             } else {
@@ -2456,6 +2872,9 @@ class VideoAnnotationApp {
         // 设置时间轴标记拖动事件
         this.setupTimelineDrag();
         
+        // 鼠标悬停在时间轴上时显示雪碧图中对应时间的画面
+        this.setupTimelinePreview();
+        
         // 初始化时隐藏视频播放区域和时间轴
         this.hideVideoPlayer();
         
@@ -2504,7 +2923,7 @@ class VideoAnnotationApp {
             this.setupSingleVideo(localVideoPath);
         } else if (sample.type === 'multiple_videos') {
             // console.log('🎬 设置多视频同步播放');
-            this.setupMultipleVideos(sample.video_paths);
+            this.setupMultipleVideos(sample.video_paths, sample.proxy_paths || []);
         } else {
             // console.log('🎥 设置单视频');
             this.setupSingleVideo(sample.video_path);
@@ -2574,6 +2993,7 @@ class VideoAnnotationApp {
         // 保存引用
         this.currentVideoElement = video;
         this.videoElements = [video];
+        this.currentViewIndex = 0;
         
         // 强制加载视频
         video.load();
@@ -2582,9 +3002,10 @@ class VideoAnnotationApp {
         console.log('🎯 当前DOM结构:', this.videoPlayer.innerHTML.substring(0, 200));
     }
     
-    // 设置多视频选择播放器
-    setupMultipleVideos(videoPaths) {
+    // 设置多视频选择播放器：各视角按钮内播放低分辨率代理视频，选中的视角播放全分辨率视频
+    setupMultipleVideos(videoPaths, proxyPaths = []) {
         console.log('📁 多视频路径: ' + videoPaths);
+        this.proxyPreviewElements = [];
         
         // 检查容器是否存在
         if (!this.videoPlayer) {
@@ -2620,7 +3041,27 @@ class VideoAnnotationApp {
         videoPaths.forEach((videoPath, index) => {
             const videoButton = document.createElement('button');
             videoButton.className = 'video-select-button';
-            videoButton.textContent = this.extractVideoFilename(videoPath);
+            
+            // 代理视频预览：低分辨率、静音，跟随选中视角同步播放
+            const proxyPath = proxyPaths[index];
+            if (proxyPath) {
+                const preview = document.createElement('video');
+                preview.src = proxyPath;
+                preview.muted = true;
+                preview.playsInline = true;
+                preview.preload = 'metadata';
+                preview.style.width = '100%';
+                preview.style.display = 'block';
+                preview.style.marginBottom = '8px';
+                preview.style.borderRadius = '4px';
+                preview.style.backgroundColor = '#000';
+                preview.style.pointerEvents = 'none';
+                videoButton.appendChild(preview);
+                this.proxyPreviewElements.push(preview);
+            }
+            const videoLabel = document.createElement('div');
+            videoLabel.textContent = this.extractVideoFilename(videoPath);
+            videoButton.appendChild(videoLabel);
             videoButton.style.padding = '12px 16px';
             videoButton.style.border = '2px solid #e9ecef';
             videoButton.style.borderRadius = '8px';
@@ -2744,6 +3185,8 @@ class VideoAnnotationApp {
         // 设置当前视频引用
         this.currentVideoElement = video;
         this.videoElements = [video];
+        this.currentViewIndex = index;
+        this.syncProxyPreviews(video);
         
         // 加载视频
         video.load();
@@ -2756,6 +3199,32 @@ class VideoAnnotationApp {
         console.log(`✅ 视频${index + 1}开始播放，时间轴状态恢复中...`);
     }
     
+    // 代理预览跟随选中视角的播放、暂停、跳转和倍速
+    syncProxyPreviews(focusedVideo) {
+        const previews = this.proxyPreviewElements || [];
+        if (previews.length === 0) {
+            return;
+        }
+        
+        const syncTime = () => previews.forEach(preview => {
+            if (Math.abs(preview.currentTime - focusedVideo.currentTime) > 0.5) {
+                preview.currentTime = focusedVideo.currentTime;
+            }
+        });
+        focusedVideo.addEventListener('play', () => {
+            syncTime();
+            previews.forEach(preview => preview.play().catch(() => {}));
+        });
+        focusedVideo.addEventListener('pause', () => {
+            previews.forEach(preview => preview.pause());
+            syncTime();
+        });
+        focusedVideo.addEventListener('seeked', syncTime);
+        focusedVideo.addEventListener('ratechange', () => previews.forEach(preview => {
+            preview.playbackRate = focusedVideo.playbackRate;
+        }));
+    }
+    
     // 获取当前开始时间
     getCurrentStartTime() {
         // 尝试多种方式获取开始时间
@@ -3482,6 +3951,11 @@ class VideoAnnotationApp {
         
         console.log(`🎬 播放片段: ${startTime}s - ${endTime}s`);
         
+        // 时间轴与已保存片段一致且服务端已剪好该视角的片段时，直接播放短剪辑，无需在长视频中定位
+        if (this.playSegmentClip(startTime, endTime)) {
+            return;
+        }
+        
         // 设置所有视频的开始时间
         if (this.videoElements && this.videoElements.length > 0) {
             // 多视频同步播放优化
@@ -3499,6 +3973,86 @@ class VideoAnnotationApp {
         this.setupEndTimeCheck(endTime);
     }
     
+    // 播放当前片段在当前视角上的剪辑（覆盖在主视频上方），暂停或结束后主视频定位到对应时间；无可用剪辑时返回false
+    playSegmentClip(startTime, endTime) {
+        const segment = this.currentSegment;
+        if (!segment || !segment.clip_paths || !segment.clip_range) {
+            return false;
+        }
+        const [clipStart, clipEnd] = segment.clip_range;
+        if (Math.abs(clipStart - startTime) > 0.001 || Math.abs(clipEnd - endTime) > 0.001
+            || segment.start_time !== clipStart || segment.end_time !== clipEnd) {
+            return false;
+        }
+        const viewIndex = this.currentViewIndex || 0;
+        const clipPath = segment.clip_paths[viewIndex];
+        // 流复制的剪辑从片段开始前最近的关键帧开始，clip_starts 为剪辑0秒对应的原视频时间
+        const clipOrigin = segment.clip_starts ? segment.clip_starts[viewIndex] : null;
+        const mainVideo = this.currentVideoElement;
+        if (!clipPath || typeof clipOrigin !== 'number' || !mainVideo || !mainVideo.parentNode) {
+            return false;
+        }
+        
+        this.stopSegmentClip();
+        mainVideo.pause();
+        
+        const clip = document.createElement('video');
+        clip.className = 'segment-clip-video';
+        clip.controls = true;
+        clip.style.cssText = mainVideo.style.cssText;
+        clip.src = clipPath;
+        clip.playbackRate = mainVideo.playbackRate;
+        clip.addEventListener('loadedmetadata', () => {
+            clip.currentTime = Math.max(startTime - clipOrigin, 0);
+        }, { once: true });
+        mainVideo.parentNode.insertBefore(clip, mainVideo);
+        this.segmentClipMainDisplay = mainVideo.style.display;
+        mainVideo.style.display = 'none';
+        
+        const restore = () => {
+            if (this.segmentClipElement !== clip) {
+                return;
+            }
+            const resumeTime = Math.min(Math.max(clipOrigin + clip.currentTime, startTime), endTime);
+            this.stopSegmentClip();
+            mainVideo.currentTime = resumeTime;
+        };
+        clip.addEventListener('pause', restore);
+        clip.addEventListener('ended', restore);
+        clip.addEventListener('error', () => {
+            // 剪辑不可用（如已被清理）时退回在原视频中播放
+            if (this.segmentClipElement !== clip) {
+                return;
+            }
+            console.warn('⚠️ 片段剪辑加载失败，改为播放原视频:', clipPath);
+            segment.clip_paths = null;
+            this.stopSegmentClip();
+            this.playSegment();
+        });
+        
+        this.segmentClipElement = clip;
+        this.segmentClipMainVideo = mainVideo;
+        clip.play().catch(e => console.warn('⚠️ 片段剪辑播放失败:', e));
+        console.log(`🎞️ 播放片段剪辑: ${clipPath}`);
+        return true;
+    }
+    
+    // 移除片段剪辑覆盖层并恢复主视频
+    stopSegmentClip() {
+        const clip = this.segmentClipElement;
+        if (!clip) {
+            return;
+        }
+        this.segmentClipElement = null;
+        clip.pause();
+        clip.removeAttribute('src');
+        clip.remove();
+        if (this.segmentClipMainVideo) {
+            this.segmentClipMainVideo.style.display = this.segmentClipMainDisplay || '';
+            this.segmentClipMainVideo = null;
+        }
+    }
+    
     // 多视频片段播放优化
     playSegmentMultipleVideos(startTime, endTime) {
         console.log('🎬 多视频同步播放片段');
@@ -3656,6 +4210,44 @@ class VideoAnnotationApp {
         document.getElementById('loadingIndicator').style.display = 'none';
     }
     
+    // 时间轴悬停预览：从当前视角的雪碧图中取对应时间的画面，不需要在视频中定位
+    setupTimelinePreview() {
+        const timeline = document.querySelector('.timeline');
+        if (!timeline) return;
+        
+        const preview = document.createElement('div');
+        preview.className = 'timeline-preview';
+        preview.style.display = 'none';
+        timeline.appendChild(preview);
+        
+        timeline.addEventListener('mousemove', (e) => {
+            const sprite = (this.currentSprites || [])[this.currentViewIndex || 0];
+            const duration = this.currentVideoElement && this.currentVideoElement.duration;
+            if (!sprite || !sprite.url || !duration || !isFinite(duration)) {
+                preview.style.display = 'none';
+                return;
+            }
+            
+            const rect = timeline.getBoundingClientRect();
+            const x = Math.max(0, Math.min(rect.width, e.clientX - rect.left));
+            const time = (x / rect.width) * duration;
+            const index = Math.min(Math.floor(time / sprite.interval), sprite.columns * sprite.rows - 1);
+            const column = index % sprite.columns;
+            const row = Math.floor(index / sprite.columns);
+            
+            preview.style.width = sprite.tile_width + 'px';
+            preview.style.height = sprite.tile_height + 'px';
+            preview.style.backgroundImage = `url("${sprite.url}")`;
+            preview.style.backgroundPosition = `-${column * sprite.tile_width}px -${row * sprite.tile_height}px`;
+            preview.style.left = Math.max(0, Math.min(rect.width - sprite.tile_width, x - sprite.tile_width / 2)) + 'px';
+            preview.dataset.time = this.formatTime(time);
+            preview.style.display = 'block';
+        });
+        timeline.addEventListener('mouseleave', () => {
+            preview.style.display = 'none';
+        });
+    }
+    
     // 时间轴拖动功能
     setupTimelineDrag() {
         let isDragging = false;
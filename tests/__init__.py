@@ -0,0 +1 @@
+# Tests for video annotation tool
@@ -0,0 +1,202 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from models.video_streaming import StreamLimiter
+
+_tmp = None
+app_module = None
+
+
+def setUpModule():
+    # 在导入 app 之前把数据、视频和缩略图目录指向临时目录
+    global _tmp, app_module
+    _tmp = tempfile.TemporaryDirectory()
+    data_dir = os.path.join(_tmp.name, 'data')
+    os.makedirs(data_dir)
+    dataset = {
+        'id': 'demo',
+        'name': 'demo',
+        'samples': [{'id': 'sample_1', 'name': 'sample_1', 'type': 'single_video',
+                     'assigned_to': 'annotator_1', 'review_status': '未审阅'}]
+    }
+    segments = {'segments': [
+        {'id': 'seg_1', 'sample_id': 'sample_1', 'start_time': 0.0, 'end_time': 1.0, 'status': '选用'}
+    ]}
+    with open(os.path.join(data_dir, 'demo.json'), 'w', encoding='utf-8') as f:
+        json.dump(dataset, f)
+    with open(os.path.join(data_dir, 'demo_segments.json'), 'w', encoding='utf-8') as f:
+        json.dump(segments, f)
+    os.environ['ANNOTATION_DATA_DIR'] = data_dir
+    os.environ['ANNOTATION_VIDEO_DIR'] = os.path.join(_tmp.name, 'videos')
+    os.environ['ANNOTATION_THUMBNAIL_DIR'] = os.path.join(_tmp.name, 'thumbnails')
+    import app
+    app_module = app
+
+
+def tearDownModule():
+    app_module.thumbnail_service.shutdown()
+    app_module.dataset_manager.close()
+    _tmp.cleanup()
+
+
+class StatisticsCheckTest(unittest.TestCase):
+    """统计一致性检查与修复"""
+
+    def setUp(self):
+        self.client = app_module.app.test_client()
+        manager = app_module.dataset_manager
+        manager.get_sample('sample_1')
+        # 制造一处增量计数偏差
+        manager.statistics.add_segment('demo', {'id': 'phantom', 'status': '弃用'}, 'annotator_1')
+
+    def test_get_is_read_only(self):
+        response = self.client.get('/api/statistics/check')
+        self.assertEqual(200, response.status_code)
+        self.assertFalse(response.get_json()['consistent'])
+
+        response = self.client.get('/api/statistics/check?repair=1')
+        self.assertEqual(400, response.status_code)
+        self.assertFalse(self.client.get('/api/statistics/check').get_json()['consistent'])
+
+    def test_post_repairs(self):
+        response = self.client.post('/api/statistics/repair')
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.get_json()['repaired'])
+        self.assertTrue(self.client.get('/api/statistics/check').get_json()['consistent'])
+
+
+class SampleSegmentsTest(unittest.TestCase):
+    """样本片段列表只读取剪辑和缩略图清单"""
+
+    def test_listing_does_not_schedule(self):
+        client = app_module.app.test_client()
+        with mock.patch.object(app_module.video_download_manager, 'schedule_sample_clips') as clips, \
+                mock.patch.object(app_module.thumbnail_service, 'schedule_segment_thumbnails') as thumbnails, \
+                mock.patch.object(app_module.thumbnail_service.processor, 'submit') as submit:
+            response = client.get('/api/sample/sample_1/segments')
+        self.assertEqual(200, response.status_code)
+        segment = response.get_json()[0]
+        self.assertEqual(([], [], None), (segment['clip_paths'], segment['clip_starts'], segment['thumbnail']))
+        clips.assert_not_called()
+        thumbnails.assert_not_called()
+        submit.assert_not_called()
+
+
+class ServeVideoTest(unittest.TestCase):
+    """视频路由的Range请求、缓存验证和并发流限制"""
+
+    url = '/static/videos/demo/sample_1/cam01.mp4'
+
+    def setUp(self):
+        self.client = app_module.app.test_client()
+        self.content = bytes(range(256)) * 4
+        self.path = os.path.join(app_module.video_download_manager.base_video_dir, 'demo', 'sample_1', 'cam01.mp4')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'wb') as f:
+            f.write(self.content)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_range_request(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=100-199'})
+        self.assertEqual(206, response.status_code)
+        self.assertEqual('bytes 100-199/1024', response.headers['Content-Range'])
+        self.assertEqual(self.content[100:200], response.data)
+
+    def test_range_past_end(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=2048-'})
+        self.assertEqual(416, response.status_code)
+        self.assertEqual('bytes */1024', response.headers['Content-Range'])
+
+    def test_matching_etag(self):
+        etag = self.client.get(self.url).headers['ETag']
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b'', response.data)
+
+    def test_path_traversal_rejected(self):
+        # 数据目录与视频目录同级，路径穿越可以指向真实存在的文件
+        self.assertEqual(404, self.client.get('/static/videos/../data/demo.json').status_code)
+        self.assertEqual(404, self.client.get('/static/videos/demo/..%2F..%2Fdata/demo.json').status_code)
+
+    def test_stream_limit_per_client(self):
+        with mock.patch.object(app_module, 'video_stream_limiter', StreamLimiter(2)) as limiter:
+            first = self.client.get(self.url, buffered=False)
+            second = self.client.get(self.url, buffered=False)
+            self.assertEqual(429, self.client.get(self.url).status_code)
+            first.close()
+            third = self.client.get(self.url, buffered=False)
+            self.assertEqual(200, third.status_code)
+            second.close()
+            third.close()
+            self.assertEqual({}, limiter.active_streams())
+
+
+class ChangesTest(unittest.TestCase):
+    """增量同步接口"""
+
+    def setUp(self):
+        self.client = app_module.app.test_client()
+
+    def test_incremental_and_reset(self):
+        cursor = self.client.get('/api/changes').get_json()
+        app_module.dataset_manager.update_segment('seg_1', {'comment': '增量'})
+
+        result = self.client.get(f"/api/changes?since={cursor['revision']}&epoch={cursor['epoch']}").get_json()
+        self.assertFalse(result['reset'])
+        self.assertIn('seg_1', [change['id'] for change in result['changes']])
+
+        result = self.client.get(f"/api/changes?since={cursor['revision']}&epoch=other").get_json()
+        self.assertTrue(result['reset'])
+        self.assertEqual([], result['changes'])
+        self.assertEqual(400, self.client.get('/api/changes?since=abc').status_code)
+
+
+class BatchUpdateSegmentsTest(unittest.TestCase):
+    """批量更新片段接口的请求校验"""
+
+    def setUp(self):
+        self.client = app_module.app.test_client()
+
+    def test_malformed_body_rejected(self):
+        response = self.client.post('/api/segments/batch_update', json=[1, 2])
+        self.assertEqual(400, response.status_code)
+
+    def test_invalid_operations_reported_per_item(self):
+        response = self.client.post('/api/segments/batch_update', json={'operations': [
+            {'id': ['seg_1'], 'patch': {'status': '弃用'}},
+            {'id': 'seg_1', 'patch': {'start_time': 5.0}},
+        ]})
+        self.assertEqual(200, response.status_code)
+        results = response.get_json()['results']
+        self.assertEqual([False, False], [r['success'] for r in results])
+        self.assertEqual('时间范围无效', results[1]['error'])
+
+
+class BatchCreateSegmentsTest(unittest.TestCase):
+    """批量创建片段接口的请求校验"""
+
+    def setUp(self):
+        self.client = app_module.app.test_client()
+
+    def test_malformed_body_rejected(self):
+        response = self.client.post('/api/segments/batch_create', json=[1, 2])
+        self.assertEqual(400, response.status_code)
+
+    def test_field_types_reported_per_index(self):
+        response = self.client.post('/api/segments/batch_create', json={'segments': [
+            {'id': 'seg_new', 'sample_id': ['sample_1'], 'start_time': 0.0, 'end_time': 1.0},
+            {'id': 'seg_new_2', 'sample_id': 'sample_1', 'start_time': '0', 'end_time': 1.0},
+            {'id': 'seg_new_3', 'sample_id': 'sample_1', 'start_time': 0.0, 'end_time': 1.0},
+        ]})
+        self.assertEqual(400, response.status_code)
+        self.assertEqual([0, 1], [e['index'] for e in response.get_json()['errors']])
+        self.assertIsNone(app_module.dataset_manager._find_segment('seg_new_3'))
+
+
+if __name__ == '__main__':
+    unittest.main()
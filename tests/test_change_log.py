@@ -0,0 +1,60 @@
+import unittest
+
+from models.change_log import ChangeLog
+
+
+class ChangeLogSinceTest(unittest.TestCase):
+    """增量同步：版本号游标、epoch 和已淘汰的记录"""
+
+    def setUp(self):
+        self.log = ChangeLog(capacity=3)
+        for i in range(1, 6):
+            self.log.record('segment', 'update', 'demo', f'seg_{i}', {'n': i})
+
+    def _ids(self, result):
+        return [change['id'] for change in result['changes']]
+
+    def test_cursor_without_since(self):
+        result = self.log.since(None)
+        self.assertEqual((5, False, []), (result['revision'], result['reset'], result['changes']))
+        self.assertEqual(self.log.epoch, result['epoch'])
+
+    def test_since_within_retained_window(self):
+        # 保留版本 3..5，since=2 仍然可以增量同步
+        result = self.log.since(2, self.log.epoch)
+        self.assertFalse(result['reset'])
+        self.assertEqual(['seg_3', 'seg_4', 'seg_5'], self._ids(result))
+        self.assertEqual(5, result['revision'])
+        self.assertEqual([], self.log.since(5, self.log.epoch)['changes'])
+
+    def test_since_older_than_retained_window_resets(self):
+        result = self.log.since(1, self.log.epoch)
+        self.assertTrue(result['reset'])
+        self.assertEqual([], result['changes'])
+        self.assertEqual(5, result['revision'])
+
+    def test_since_ahead_of_revision_resets(self):
+        self.assertTrue(self.log.since(9, self.log.epoch)['reset'])
+
+    def test_other_epoch_resets(self):
+        # 服务重启或请求落到其他worker后版本号不可比较
+        other = ChangeLog(capacity=3)
+        result = other.since(2, self.log.epoch)
+        self.assertTrue(result['reset'])
+        self.assertEqual(other.epoch, result['epoch'])
+
+    def test_latest_change_per_record_and_limit(self):
+        self.log.record('segment', 'delete', 'demo', 'seg_4')
+        self.log.record('sample', 'update', 'other', 'sample_1')
+        result = self.log.since(5, self.log.epoch, dataset_id='demo')
+        self.assertEqual([('seg_4', 'delete')], [(c['id'], c['action']) for c in result['changes']])
+        self.assertEqual(7, result['revision'])
+
+        result = self.log.since(4, self.log.epoch, limit=1)
+        self.assertTrue(result['has_more'])
+        self.assertEqual(['seg_5'], self._ids(result))
+        self.assertEqual(5, result['revision'])
+
+
+if __name__ == '__main__':
+    unittest.main()
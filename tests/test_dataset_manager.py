@@ -0,0 +1,243 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from models.dataset_manager import DatasetManager
+from models.segment_journal import SegmentJournal
+
+
+def _write_dataset(data_dir, dataset_id, sample_ids, segments):
+    dataset = {
+        'id': dataset_id,
+        'name': dataset_id,
+        'samples': [{'id': sample_id, 'name': sample_id, 'type': 'single_video'} for sample_id in sample_ids]
+    }
+    with open(os.path.join(data_dir, f"{dataset_id}.json"), 'w', encoding='utf-8') as f:
+        json.dump(dataset, f)
+    with open(os.path.join(data_dir, f"{dataset_id}_segments.json"), 'w', encoding='utf-8') as f:
+        json.dump({'segments': segments}, f)
+
+
+class UpdateSegmentsTest(unittest.TestCase):
+    """批量更新片段"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmp.name
+        _write_dataset(self.data_dir, 'alpha', ['a_1'], [
+            {'id': 'seg_a', 'sample_id': 'a_1', 'start_time': 0.0, 'end_time': 1.0, 'status': '待抉择'}
+        ])
+        _write_dataset(self.data_dir, 'beta', ['b_1'], [
+            {'id': 'seg_b', 'sample_id': 'b_1', 'start_time': 0.0, 'end_time': 1.0, 'status': '待抉择'}
+        ])
+        # 写入清单后重新启动，两个数据集都处于未加载状态
+        DatasetManager(self.data_dir, persist_interval=0).close()
+        self.manager = DatasetManager(self.data_dir, persist_interval=0)
+
+    def tearDown(self):
+        self.manager.close()
+        self.tmp.cleanup()
+
+    def test_invalid_operation_reported_per_item(self):
+        self.manager.get_sample('a_1')
+        results = self.manager.update_segments([
+            'seg_a',
+            {'id': 'seg_a', 'patch': {'status': '选用'}},
+        ])
+        self.assertEqual({'id': None, 'success': False, 'error': '操作格式无效'}, results[0])
+        self.assertTrue(results[1]['success'])
+
+    def test_segment_in_unloaded_dataset_found_without_hint(self):
+        results = self.manager.update_segments([
+            {'id': 'seg_b', 'patch': {'status': '选用'}},
+            {'id': 'seg_missing', 'patch': {'status': '选用'}},
+        ])
+        self.assertTrue(results[0]['success'])
+        self.assertEqual('片段不存在', results[1]['error'])
+        self.assertEqual('选用', self.manager._find_segment('seg_b')[2]['status'])
+
+    def test_invalid_id_and_patch_reported_per_item(self):
+        results = self.manager.update_segments([
+            {'id': ['seg_a'], 'patch': {'status': '选用'}},
+            {'id': 'seg_a', 'patch': {'start_time': 2.0}},
+            {'id': 'seg_a', 'patch': {'end_time': 'later'}},
+            {'id': 'seg_a', 'patch': {'status': '完成'}},
+            {'id': 'seg_a', 'patch': {'start_time': 0.5, 'end_time': 3.0}},
+        ])
+        self.assertEqual([False, False, False, False, True], [r['success'] for r in results])
+        self.assertEqual('时间范围无效', results[1]['error'])
+        segment = self.manager._find_segment('seg_a')[2]
+        self.assertEqual((0.5, 3.0, '待抉择'), (segment['start_time'], segment['end_time'], segment['status']))
+        self.assertFalse(self.manager.update_segment('seg_a', {'end_time': 0.1}))
+
+    def test_sample_hint_loads_owning_dataset_only(self):
+        results = self.manager.update_segments([
+            {'id': 'seg_b', 'sample_id': 'b_1', 'patch': {'status': '弃用'}}
+        ])
+        self.assertTrue(results[0]['success'])
+        self.assertEqual({'beta'}, set(self.manager._loaded))
+        self.assertEqual('弃用', self.manager._find_segment('seg_b')[2]['status'])
+
+
+class ProcessSafeLoadTest(unittest.TestCase):
+    """跨进程同步与日志回放"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmp.name
+        _write_dataset(self.data_dir, 'alpha', ['a_1'], [
+            {'id': 'seg_a', 'sample_id': 'a_1', 'start_time': 0.0, 'end_time': 1.0, 'status': '待抉择'}
+        ])
+        _write_dataset(self.data_dir, 'beta', ['b_1'], [])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_journal_replayed_under_inter_process_lock(self):
+        journal = SegmentJournal(self.data_dir)
+        journal.append('alpha', {'op': 'update', 'id': 'seg_a', 'fields': {'status': '选用'}})
+        with open(journal.journal_path('alpha'), 'ab') as f:
+            f.write(b'{"op": "upd')
+
+        held = []
+        read_ops = SegmentJournal.read_ops
+
+        def checked_read_ops(journal_self, dataset_id):
+            held.append(manager_ref[0]._file_lock(dataset_id)._depth > 0)
+            return read_ops(journal_self, dataset_id)
+
+        manager_ref = []
+        original_init = DatasetManager._load_datasets
+
+        def capture(manager_self):
+            manager_ref.append(manager_self)
+            return original_init(manager_self)
+
+        with mock.patch.object(SegmentJournal, 'read_ops', checked_read_ops), \
+                mock.patch.object(DatasetManager, '_load_datasets', capture):
+            manager = DatasetManager(self.data_dir, persist_interval=0)
+        try:
+            self.assertTrue(held)
+            self.assertTrue(all(held))
+            self.assertEqual('选用', manager._find_segment('seg_a')[2]['status'])
+        finally:
+            manager.close()
+
+    def test_lookup_syncs_only_owning_dataset(self):
+        manager = DatasetManager(self.data_dir, persist_interval=0, lazy_load=False)
+        try:
+            with mock.patch.object(manager, '_sync', wraps=manager._sync) as sync:
+                self.assertEqual('alpha', manager._dataset_of_sample('a_1'))
+                self.assertEqual('alpha', manager._dataset_of_segment('seg_a'))
+            self.assertEqual([mock.call(['alpha']), mock.call(['alpha'])], sync.call_args_list)
+        finally:
+            manager.close()
+
+
+class SegmentJournalTest(unittest.TestCase):
+    """片段修改日志：重启回放、末尾损坏记录和压缩"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmp.name
+        _write_dataset(self.data_dir, 'alpha', ['a_1'], [
+            {'id': 'seg_a', 'sample_id': 'a_1', 'start_time': 0.0, 'end_time': 1.0, 'status': '待抉择'},
+            {'id': 'seg_b', 'sample_id': 'a_1', 'start_time': 2.0, 'end_time': 3.0, 'status': '待抉择'}
+        ])
+        self.journal_path = os.path.join(self.data_dir, 'alpha_segments.journal')
+        self.snapshot_path = os.path.join(self.data_dir, 'alpha_segments.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _open(self):
+        return DatasetManager(self.data_dir, persist_interval=0)
+
+    def _snapshot_ids(self):
+        with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+            return [segment['id'] for segment in json.load(f)['segments']]
+
+    def _write_ops(self, manager):
+        self.assertTrue(manager.create_segment(
+            {'id': 'seg_c', 'sample_id': 'a_1', 'start_time': 4.0, 'end_time': 5.0, 'status': '待抉择'}))
+        self.assertTrue(manager.update_segment('seg_a', {'status': '选用', 'comment': '清晰'}))
+        self.assertTrue(manager.delete_segment('seg_b'))
+
+    def _assert_replayed(self, manager):
+        segments = {segment['id']: segment for segment in manager.get_segments_for_sample('a_1')}
+        self.assertEqual({'seg_a', 'seg_c'}, set(segments))
+        self.assertEqual(('选用', '清晰'), (segments['seg_a']['status'], segments['seg_a']['comment']))
+
+    def test_ops_replayed_after_restart(self):
+        manager = self._open()
+        self._write_ops(manager)
+        manager.close()
+        # 修改只追加到日志，快照文件保持不变
+        self.assertEqual(['seg_a', 'seg_b'], self._snapshot_ids())
+        self.assertGreater(os.path.getsize(self.journal_path), 0)
+
+        manager = self._open()
+        try:
+            self._assert_replayed(manager)
+        finally:
+            manager.close()
+
+    def test_truncated_last_line_ignored(self):
+        manager = self._open()
+        self._write_ops(manager)
+        manager.close()
+        valid_size = os.path.getsize(self.journal_path)
+        with open(self.journal_path, 'ab') as f:
+            f.write(b'{"op": "delete", "id": "se')
+
+        manager = self._open()
+        try:
+            self._assert_replayed(manager)
+            self.assertEqual(valid_size, os.path.getsize(self.journal_path))
+            # 截断后继续追加的记录在下次启动时正常回放
+            self.assertTrue(manager.update_segment('seg_c', {'status': '弃用'}))
+        finally:
+            manager.close()
+
+        manager = self._open()
+        try:
+            segments = {segment['id']: segment for segment in manager.get_segments_for_sample('a_1')}
+            self.assertEqual('弃用', segments['seg_c']['status'])
+        finally:
+            manager.close()
+
+    def test_compacted_into_snapshot_at_threshold(self):
+        manager = self._open()
+        try:
+            self._write_ops(manager)
+            self.assertTrue(os.path.exists(self.journal_path))
+            # 每批约1MB，第4批后日志超过默认的4MB阈值，在后台压缩进快照
+            comment = 'x' * (1024 * 1024)
+            for i in range(4):
+                manager.update_segments([{'id': 'seg_c', 'patch': {'comment': f'{i}{comment}'}}])
+            deadline = time.monotonic() + 10
+            while os.path.getsize(self.journal_path) > 0 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(0, os.path.getsize(self.journal_path))
+        finally:
+            manager.close()
+
+        self.assertEqual(['seg_a', 'seg_c'], self._snapshot_ids())
+        with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+            compacted = {segment['id']: segment for segment in json.load(f)['segments']}
+        self.assertEqual('选用', compacted['seg_a']['status'])
+        self.assertTrue(compacted['seg_c']['comment'].startswith('3x'))
+        self.assertFalse([name for name in os.listdir(self.data_dir) if name.endswith('.tmp')])
+
+        manager = self._open()
+        try:
+            self._assert_replayed(manager)
+        finally:
+            manager.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import threading
+import unittest
+from unittest import mock
+
+from models.download_jobs import (
+    JOB_CANCELLED, JOB_SUCCEEDED, PRIORITY_PREFETCH, PRIORITY_USER, DownloadJobQueue
+)
+
+
+class DownloadJobQueueTest(unittest.TestCase):
+    """下载任务队列：去重、优先级和取消"""
+
+    def setUp(self):
+        self.started = []
+        self.release = {}
+        self.running = threading.Event()
+        # 单个工作线程，任务按出队顺序逐个执行
+        self.queue = DownloadJobQueue(self._run, {'huggingface': 1})
+
+    def tearDown(self):
+        for event in self.release.values():
+            event.set()
+
+    def _run(self, job):
+        self.started.append(job.sample_name)
+        event = self.release.setdefault(job.sample_name, threading.Event())
+        self.running.set()
+        event.wait(5)
+        return {'success': True}
+
+    def _submit(self, sample_name, priority=PRIORITY_USER):
+        self.release.setdefault(sample_name, threading.Event())
+        return self.queue.submit('demo', sample_name, 'single_video', {}, 'huggingface', priority)
+
+    def _block_worker(self):
+        """提交一个占住工作线程的任务，之后提交的任务都在队列中等待"""
+        job, _ = self._submit('blocker')
+        self.assertTrue(self.running.wait(5))
+        return job
+
+    def _drain(self, jobs):
+        for job in jobs:
+            self.release[job.sample_name].set()
+        for job in jobs:
+            self.assertTrue(job.wait(5))
+
+    def test_duplicate_submit_shares_job(self):
+        first, created = self._submit('sample_1')
+        second, created_again = self._submit('sample_1')
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertIs(first, second)
+        self._drain([first])
+        self.assertEqual(['sample_1'], self.started)
+
+        # 任务结束后再次提交会新建任务
+        third, created = self._submit('sample_1')
+        self.assertTrue(created)
+        self.assertIsNot(first, third)
+        self._drain([third])
+
+    def test_runs_by_priority_then_submission_order(self):
+        blocker = self._block_worker()
+        prefetch_a, _ = self._submit('prefetch_a', PRIORITY_PREFETCH)
+        prefetch_b, _ = self._submit('prefetch_b', PRIORITY_PREFETCH)
+        user, _ = self._submit('user', PRIORITY_USER)
+        # 用户请求提前已排队的预取任务，排在之前提交的同优先级任务之后
+        promoted, created = self._submit('prefetch_b', PRIORITY_USER)
+        self.assertFalse(created)
+        self.assertEqual(PRIORITY_USER, promoted.priority)
+
+        self._drain([blocker, prefetch_a, prefetch_b, user])
+        self.assertEqual(['blocker', 'user', 'prefetch_b', 'prefetch_a'], self.started)
+
+    def test_cancel_queued_job(self):
+        blocker = self._block_worker()
+        job, _ = self._submit('sample_1')
+        self.assertTrue(self.queue.cancel(job.id))
+        self.assertEqual(JOB_CANCELLED, job.status)
+        self.assertTrue(job.is_finished())
+        self.assertIsNone(self.queue.get_active('demo', 'sample_1'))
+        self.assertFalse(self.queue.cancel(job.id))
+
+        self._drain([blocker])
+        next_job, _ = self._submit('sample_2')
+        self._drain([next_job])
+        self.assertEqual(['blocker', 'sample_2'], self.started)
+
+    def test_cancel_running_job(self):
+        job = self._block_worker()
+        process = mock.Mock()
+        process.poll.return_value = None
+        job.attach_process(process)
+
+        self.assertTrue(self.queue.cancel(job.id))
+        process.terminate.assert_called_once()
+        self._drain([job])
+        self.assertEqual(JOB_CANCELLED, job.status)
+
+        other, _ = self._submit('sample_1')
+        self._drain([other])
+        self.assertEqual(JOB_SUCCEEDED, other.status)
+
+
+if __name__ == '__main__':
+    unittest.main()
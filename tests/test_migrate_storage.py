@@ -0,0 +1,58 @@
+import json
+import os
+import tempfile
+import unittest
+
+from migrate_storage import import_json
+from models.dataset_manager import DatasetManager
+from models.storage import SqliteStorageBackend
+
+
+class ImportJsonTest(unittest.TestCase):
+    """JSON数据目录导入SQLite"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_dir = os.path.join(self.tmp.name, 'data')
+        os.makedirs(self.data_dir)
+        dataset = {
+            'id': 'demo',
+            'name': 'demo',
+            'samples': [
+                {'id': 'sample_1', 'name': 'sample_1', 'type': 'single_video',
+                 'assigned_to': 'annotator_1', 'review_status': '未审阅'},
+                {'id': 'sample_2', 'name': 'sample_2', 'type': 'single_video',
+                 'assigned_to': 'annotator_2', 'review_status': '已审阅'},
+            ]
+        }
+        segments = {'segments': [
+            {'id': 'seg_1', 'sample_id': 'sample_1', 'start_time': 0.0, 'end_time': 1.0, 'status': '选用'},
+            {'id': 'seg_2', 'sample_id': 'sample_2', 'start_time': 2.0, 'end_time': 3.0, 'status': '弃用'},
+        ]}
+        with open(os.path.join(self.data_dir, 'demo.json'), 'w', encoding='utf-8') as f:
+            json.dump(dataset, f)
+        with open(os.path.join(self.data_dir, 'demo_segments.json'), 'w', encoding='utf-8') as f:
+            json.dump(segments, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_import_after_manifest_written(self):
+        # 先正常启动一次，写入按需加载清单
+        DatasetManager(self.data_dir, persist_interval=0).close()
+        self.assertTrue(os.path.exists(os.path.join(self.data_dir, DatasetManager.MANIFEST_FILENAME)))
+
+        database_path = os.path.join(self.tmp.name, 'annotations.db')
+        import_json(self.data_dir, database_path)
+
+        backend = SqliteStorageBackend(database_path)
+        backend.initialize()
+        datasets, segments = backend.load(None)
+        backend.close()
+        self.assertEqual(['demo'], list(datasets))
+        self.assertEqual(2, len(datasets['demo']['samples']))
+        self.assertEqual({'seg_1', 'seg_2'}, {segment['id'] for segment in segments['demo']['segments']})
+
+
+if __name__ == '__main__':
+    unittest.main()
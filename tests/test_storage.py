@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from models.segment_journal import SegmentJournal
+from models.storage import write_json_atomic
+
+
+class WriteJsonAtomicTest(unittest.TestCase):
+    """原子写入JSON文件"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, '.manifest.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_concurrent_writers(self):
+        errors = []
+
+        def writer(index):
+            try:
+                for i in range(50):
+                    write_json_atomic(self.path, {'writer': index, 'i': i, 'payload': 'x' * 4096})
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=writer, args=(index,)) for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(49, json.load(f)['i'])
+        self.assertEqual(['.manifest.json'], os.listdir(self.tmp.name))
+
+    def test_keeps_regular_file_permissions(self):
+        write_json_atomic(self.path, {})
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(0o666 & ~umask, os.stat(self.path).st_mode & 0o777)
+
+
+class DiscardPrefixTest(unittest.TestCase):
+    """压缩后截断片段日志"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = SegmentJournal(self.tmp.name)
+
+    def tearDown(self):
+        self.journal.close()
+        self.tmp.cleanup()
+
+    def test_keeps_later_records_without_fixed_temp_file(self):
+        self.journal.append('demo', {'op': 'delete', 'id': 'seg_1'})
+        offset = self.journal.size('demo')
+        self.journal.append('demo', {'op': 'delete', 'id': 'seg_2'})
+        path = self.journal.journal_path('demo')
+        # 其他进程正在使用的固定临时文件名不能被覆盖
+        with open(path + '.tmp', 'w') as f:
+            f.write('other writer')
+
+        self.journal.discard_prefix('demo', offset)
+
+        self.assertEqual([{'op': 'delete', 'id': 'seg_2'}], self.journal.read_ops('demo'))
+        with open(path + '.tmp') as f:
+            self.assertEqual('other writer', f.read())
+        self.assertEqual(sorted([os.path.basename(path), os.path.basename(path) + '.tmp']),
+                         sorted(os.listdir(self.tmp.name)))
+
+
+if __name__ == '__main__':
+    unittest.main()
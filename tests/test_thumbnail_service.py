@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from models.thumbnail_service import ThumbnailService
+
+
+class SpriteLayoutTest(unittest.TestCase):
+    """雪碧图布局文件"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.service = ThumbnailService(mock.Mock(dataset_manager=None), base_dir=self.tmp.name)
+
+    def tearDown(self):
+        self.service.shutdown()
+        self.tmp.cleanup()
+
+    def test_layout_written_atomically(self):
+        sprite_path = os.path.join(self.tmp.name, 'sprite_cam01.jpg')
+        layout_path = os.path.join(self.tmp.name, 'sprite_cam01.json')
+        # 其他进程正在使用的固定临时文件名不能被覆盖
+        with open(layout_path + '.tmp', 'w') as f:
+            f.write('other writer')
+
+        self.service._write_layout(sprite_path, {'columns': 10, 'rows': 10}, True)
+
+        self.assertEqual({'columns': 10, 'rows': 10}, self.service._read_layout(sprite_path))
+        with open(layout_path + '.tmp') as f:
+            self.assertEqual('other writer', f.read())
+        self.assertEqual(['sprite_cam01.json', 'sprite_cam01.json.tmp'], sorted(os.listdir(self.tmp.name)))
+
+
+class SegmentThumbnailTest(unittest.TestCase):
+    """片段缩略图在后台生成，查询只读取清单"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source_path = os.path.join(self.tmp.name, 'cam01.mp4')
+        with open(self.source_path, 'wb') as f:
+            f.write(b'\x00')
+        self.sample = {'id': 'sample_1', 'type': 'single_video'}
+        self.segments = [{'id': 'seg_1', 'start_time': 1.0, 'end_time': 3.0},
+                         {'id': 'seg_2', 'start_time': 4.0, 'end_time': 5.0}]
+        video_manager = mock.Mock(dataset_manager=None)
+        video_manager.get_sample_video_filenames.return_value = ['cam01.mp4']
+        video_manager.get_video_path.return_value = self.source_path
+        self.service = ThumbnailService(video_manager, base_dir=os.path.join(self.tmp.name, 'thumbnails'))
+
+    def tearDown(self):
+        self.service.shutdown()
+        self.tmp.cleanup()
+
+    def _fake_submit(self, output_path, args, sources=None, on_done=None, retry=False):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, 'wb') as f:
+            f.write(b'\x00')
+        on_done(output_path, True)
+        return mock.Mock()
+
+    def test_generated_thumbnails_listed_from_manifest(self):
+        self.assertEqual([None, None], self.service.get_segment_thumbnails('demo', self.sample, self.segments))
+        with mock.patch.object(self.service.processor, 'submit', self._fake_submit):
+            self.service._generate_segment_thumbnails('demo', self.sample, self.segments[:1])
+
+        with mock.patch('models.thumbnail_service.os.stat') as stat:
+            urls = self.service.get_segment_thumbnails('demo', self.sample, self.segments)
+        stat.assert_not_called()
+        self.assertTrue(urls[0].startswith('/static/thumbnails/demo/sample_1/segment_1000-3000.jpg?v='))
+        self.assertIsNone(urls[1])
+
+        self.service.prune_segment_thumbnails('demo', self.sample, self.segments[1:])
+        self.assertEqual([None, None], self.service.get_segment_thumbnails('demo', self.sample, self.segments))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import os
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from models.video_download_manager import VideoDownloadManager
+
+
+class ExtractZipTest(unittest.TestCase):
+    """下载压缩包的流式解压"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.manager = VideoDownloadManager(base_video_dir=self.tmp.name)
+        self.sample_dir = os.path.join(self.tmp.name, 'demo', 'sample_1')
+        os.makedirs(self.sample_dir)
+        self.zip_path = os.path.join(self.sample_dir, 'sample_1.zip')
+        with zipfile.ZipFile(self.zip_path, 'w') as archive:
+            archive.writestr('sample_1/cam01.mp4', b'\x00' * 1024)
+            archive.writestr('sample_1/cam02.mp4', b'\x01' * 1024)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_zip_removed_after_success(self):
+        result = self.manager._extract_zip_file(self.zip_path, self.sample_dir)
+        self.assertTrue(result['success'])
+        self.assertEqual(['cam01.mp4', 'cam02.mp4'], sorted(f['filename'] for f in result['files']))
+        self.assertFalse(os.path.exists(self.zip_path))
+
+    def test_zip_kept_when_extraction_fails(self):
+        real_open = open
+
+        def failing_open(path, *args, **kwargs):
+            if str(path).endswith('cam02.mp4.part'):
+                raise OSError('No space left on device')
+            return real_open(path, *args, **kwargs)
+
+        with mock.patch('builtins.open', failing_open):
+            result = self.manager._extract_zip_file(self.zip_path, self.sample_dir)
+        self.assertFalse(result['success'])
+        self.assertTrue(os.path.exists(self.zip_path))
+        self.assertEqual(['sample_1.zip'], os.listdir(self.sample_dir))
+
+        # 重试时直接从保留的压缩包解压
+        self.assertTrue(self.manager._extract_zip_file(self.zip_path, self.sample_dir)['success'])
+
+
+class PerFileDownloadTest(unittest.TestCase):
+    """多视角样本逐文件下载"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dataset_manager = mock.Mock()
+        self.manager = VideoDownloadManager(base_video_dir=self.tmp.name, dataset_manager=self.dataset_manager)
+        self.sample = {
+            'id': 'sample_1',
+            'type': 'multiple_videos',
+            'video_paths': ['/static/videos/demo/sample_1/cam01.mp4', '/static/videos/demo/sample_1/cam02.mp4']
+        }
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _fake_download(self, repo_id, repo_type, filename, local_dir, **kwargs):
+        self.assertNotIn('local_dir_use_symlinks', kwargs)
+        path = os.path.join(local_dir, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'\x00' * 1024)
+        return path
+
+    def _validate(self, path):
+        valid = not path.endswith('cam02.mp4')
+        return {'valid': valid, 'message': 'ok' if valid else '文件损坏'}
+
+    def test_invalid_file_removed_and_reported(self):
+        with mock.patch('models.video_download_manager.hf_hub_download', self._fake_download), \
+                mock.patch.object(self.manager, '_validate_video_file', self._validate):
+            result = self.manager.download_huggingface_files('demo', self.sample)
+        self.assertFalse(result['success'])
+        self.assertEqual(['cam02.mp4'], list(result['failed_files']))
+        self.assertTrue(self.manager.check_video_exists('demo', 'sample_1', 'cam01.mp4'))
+        self.assertFalse(self.manager.check_video_exists('demo', 'sample_1', 'cam02.mp4'))
+        self.dataset_manager.set_sample_exception_status.assert_not_called()
+
+    def test_success_clears_exception_status(self):
+        with mock.patch('models.video_download_manager.hf_hub_download', self._fake_download), \
+                mock.patch.object(self.manager, '_validate_video_file', return_value={'valid': True}):
+            result = self.manager.download_huggingface_files('demo', self.sample)
+        self.assertTrue(result['success'])
+        self.dataset_manager.set_sample_exception_status.assert_called_once_with('sample_1', False)
+
+    def test_per_file_option_must_be_boolean(self):
+        with self.assertRaises(ValueError):
+            self.manager.submit_download('demo', 'sample_1', 'multiple_videos', {'per_file': 'yes'})
+
+
+class SegmentClipManifestTest(unittest.TestCase):
+    """片段剪辑清单"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.sample = {'id': 'sample_1', 'type': 'single_video', 'video_path': '/static/videos/demo/sample_1/cam01.mp4'}
+        self.segments = [{'id': f'seg_{i}', 'sample_id': 'sample_1', 'start_time': float(i), 'end_time': i + 1.0}
+                         for i in range(20)]
+        self.dataset_manager = mock.Mock()
+        self.dataset_manager.get_sample.return_value = ('demo', self.sample)
+        self.dataset_manager.get_segments_for_sample.return_value = self.segments
+        self.manager = VideoDownloadManager(base_video_dir=self.tmp.name, dataset_manager=self.dataset_manager)
+        self.source_path = os.path.join(self.tmp.name, 'demo', 'sample_1', 'cam01.mp4')
+        os.makedirs(os.path.dirname(self.source_path))
+        with open(self.source_path, 'wb') as f:
+            f.write(b'\x00' * 1024)
+        self.manager._refresh_cache_entry('demo', 'sample_1')
+
+    def tearDown(self):
+        self.manager.clip_processor.shutdown()
+        self.tmp.cleanup()
+
+    def _fake_submit(self, output_path, args, sources=None, on_done=None, retry=False):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, 'wb') as f:
+            f.write(b'\x00')
+        on_done(output_path, True)
+        return mock.Mock()
+
+    def _build_clips(self):
+        with mock.patch.object(self.manager.clip_processor, 'submit', self._fake_submit), \
+                mock.patch('models.video_download_manager.probe_keyframe_before', lambda path, time: time - 0.5):
+            self.manager.schedule_segment_clips('demo', self.sample, self.segments, prune=True)
+
+    def test_lookup_reads_only_the_manifest(self):
+        self._build_clips()
+        real_open = open
+        opened = []
+
+        def counting_open(path, *args, **kwargs):
+            opened.append(path)
+            return real_open(path, *args, **kwargs)
+
+        with mock.patch('builtins.open', counting_open), \
+                mock.patch.object(self.manager.clip_processor, 'submit') as submit:
+            clips = self.manager.get_sample_clips('demo', self.sample, self.segments)
+        self.assertEqual(1, len(opened))
+        submit.assert_not_called()
+        self.assertEqual(['/static/videos/demo/sample_1/clips/cam01_3000-4000.mp4'], clips[3][0])
+        self.assertEqual([2.5], clips[3][1])
+
+    def test_redownloaded_source_hides_stale_clips(self):
+        self._build_clips()
+        stat = os.stat(self.source_path)
+        os.utime(self.source_path, (stat.st_atime, stat.st_mtime + 10))
+        self.manager._refresh_cache_entry('demo', 'sample_1')
+        self.assertEqual(([None], [None]), self.manager.get_sample_clips('demo', self.sample, self.segments)[0])
+
+    def test_deleted_segment_clip_removed_from_manifest(self):
+        self._build_clips()
+        self.manager._apply_segment_change({'type': 'segment', 'action': 'delete', 'dataset_id': 'demo',
+                                            'id': 'seg_0', 'data': self.segments[0]})
+        self.assertNotIn('cam01_0-1000.mp4', self.manager._read_clip_manifest('demo', 'sample_1'))
+        self.assertFalse(os.path.exists(os.path.join(os.path.dirname(self.source_path), 'clips', 'cam01_0-1000.mp4')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import json
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from models.video_metadata import VideoMetadataStore, probe_keyframe_before
+
+
+class ProbeKeyframeBeforeTest(unittest.TestCase):
+    """流复制剪辑的实际开始时间"""
+
+    def _probe(self, output, time):
+        completed = subprocess.CompletedProcess([], 0, stdout=json.dumps(output), stderr='')
+        with mock.patch('models.video_metadata.subprocess.run', return_value=completed):
+            return probe_keyframe_before('video.mp4', time)
+
+    def test_last_keyframe_relative_to_file_start(self):
+        output = {
+            'frames': [{'pts_time': '0.040000'}, {'pts_time': '2.040000'}, {'pts_time': '4.040000'}],
+            'format': {'start_time': '0.040000'}
+        }
+        self.assertEqual(2.0, self._probe(output, 3.5))
+        self.assertEqual(4.0, self._probe(output, 4.0))
+
+    def test_no_keyframe(self):
+        self.assertIsNone(self._probe({'frames': [], 'format': {}}, 3.5))
+
+
+class VideoMetadataStoreSaveTest(unittest.TestCase):
+    """多个worker共用的元数据缓存文件"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store_path = os.path.join(self.tmp.name, '.video_metadata.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _probe(self, store, name):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(b'\x00' * 16)
+        output = {'format': {'duration': '5.0'}, 'streams': []}
+        completed = subprocess.CompletedProcess([], 0, stdout=json.dumps(output), stderr='')
+        with mock.patch('models.video_metadata.subprocess.run', return_value=completed):
+            store.probe(path)
+        return path
+
+    def test_concurrent_workers_keep_each_others_entries(self):
+        first = VideoMetadataStore(self.tmp.name, self.store_path)
+        second = VideoMetadataStore(self.tmp.name, self.store_path)
+        path_a = self._probe(first, 'a.mp4')
+        path_b = self._probe(second, 'b.mp4')
+
+        reloaded = VideoMetadataStore(self.tmp.name, self.store_path)
+        self.assertIsNotNone(reloaded.get(path_a))
+        self.assertIsNotNone(reloaded.get(path_b))
+        self.assertFalse([name for name in os.listdir(self.tmp.name) if name.endswith('.tmp')])
+
+
+if __name__ == '__main__':
+    unittest.main()